@@ -0,0 +1,13 @@
+"""
+Admin URLconf.
+
+``base.urls`` mounts this module with ``lazy_include``, so it is only
+imported when a path under ``/admin/`` is resolved or an ``admin:`` URL is
+reversed; that is also when every app's ``admin.py`` is discovered.
+"""
+from django.contrib import admin
+
+admin.autodiscover()
+
+app_name = admin.site.name
+urlpatterns = admin.site.get_urls()
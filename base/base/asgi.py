@@ -2,6 +2,7 @@
 ASGI config for base project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+WebSocket connections to /ws/sync/ are served by user/websocket.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -13,4 +14,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'base.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once the app registry is ready.
+from user.websocket import with_websockets  # noqa: E402
+
+application = with_websockets(django_application)
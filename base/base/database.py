@@ -0,0 +1,85 @@
+"""
+Environment driven database settings.
+
+    DB_ENGINE               django.db.backends.<name>, default sqlite3
+    DB_NAME                 database name or SQLite file path
+    DB_USER / DB_PASSWORD / DB_HOST / DB_PORT
+    DB_CONN_MAX_AGE         seconds to keep a connection open, default 60
+    DB_CONN_HEALTH_CHECKS   ping reused connections before use, default on
+    SQLITE_BUSY_TIMEOUT     milliseconds to wait on a locked SQLite file
+    SQLITE_WAL              switch SQLite to WAL journaling, default off
+    DB_REPLICAS             comma separated replica hosts (SQLite: file paths)
+
+With SQLITE_WAL on, SQLite connections are switched to WAL with
+synchronous=NORMAL so readers no longer block the writer ("database is
+locked" under load). It is off by default because WAL mode is recorded in
+the database file header, which would rewrite the db.sqlite3 checked into
+the repository on every run.
+"""
+
+import os
+
+
+def _env_bool(env, name, default):
+    value = env.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+def database_config(base_dir, env=os.environ):
+    engine = env.get('DB_ENGINE', 'sqlite3')
+    if '.' not in engine:
+        engine = f'django.db.backends.{engine}'
+
+    config = {
+        'ENGINE': engine,
+        'NAME': env.get('DB_NAME', base_dir / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(env.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': _env_bool(env, 'DB_CONN_HEALTH_CHECKS', True),
+    }
+
+    if engine == 'django.db.backends.sqlite3':
+        busy_timeout = int(env.get('SQLITE_BUSY_TIMEOUT', 5000))
+        config['OPTIONS'] = {'timeout': busy_timeout / 1000}
+        config['PRAGMAS'] = {'busy_timeout': busy_timeout}
+        if _env_bool(env, 'SQLITE_WAL', False):
+            config['PRAGMAS'].update(journal_mode='WAL', synchronous='NORMAL')
+    else:
+        config.update({
+            'USER': env.get('DB_USER', ''),
+            'PASSWORD': env.get('DB_PASSWORD', ''),
+            'HOST': env.get('DB_HOST', ''),
+            'PORT': env.get('DB_PORT', ''),
+        })
+
+    return config
+
+
+def replica_configs(primary, env=os.environ):
+    """Return ``{alias: settings}`` for each entry in ``DB_REPLICAS``.
+
+    Replicas share the primary's settings and mirror it under test, so the
+    test runner does not try to create them.
+    """
+    replicas = {}
+    entries = [entry.strip() for entry in env.get('DB_REPLICAS', '').split(',')]
+    for number, entry in enumerate(filter(None, entries), start=1):
+        config = dict(primary, TEST={'MIRROR': 'default'})
+        if primary['ENGINE'] == 'django.db.backends.sqlite3':
+            config['NAME'] = entry
+        else:
+            config['HOST'] = entry
+        replicas[f'replica_{number}'] = config
+    return replicas
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """``connection_created`` receiver applying the ``PRAGMAS`` entry."""
+    if connection.vendor != 'sqlite':
+        return
+
+    pragmas = connection.settings_dict.get('PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
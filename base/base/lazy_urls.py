@@ -0,0 +1,45 @@
+"""
+URLconfs imported on first use.
+
+``include('module')`` imports the module as soon as the root URLconf loads,
+and building the reverse index populates every included resolver, so both
+pull their module in on the first request to any URL. ``lazy_include``
+defers the import until a path under its prefix is resolved or a name in
+its namespace is reversed.
+"""
+from django.urls import URLResolver
+from django.urls.resolvers import RoutePattern
+
+
+class LazyURLResolver(URLResolver):
+    def loaded(self):
+        return 'urlconf_module' in self.__dict__
+
+    def _populate(self):
+        # The parent's _populate calls this for every child. A namespaced
+        # child only needs its namespace and app name there, which are
+        # known without the module; its own lookups come later through
+        # the properties below.
+        if self.loaded():
+            super()._populate()
+
+    @property
+    def reverse_dict(self):
+        self.urlconf_module
+        return super().reverse_dict
+
+    @property
+    def namespace_dict(self):
+        self.urlconf_module
+        return super().namespace_dict
+
+    @property
+    def app_dict(self):
+        self.urlconf_module
+        return super().app_dict
+
+
+def lazy_include(route, urlconf_name, namespace):
+    """``path(route, include((urlconf_name, namespace)))`` without the eager import."""
+    return LazyURLResolver(RoutePattern(route, is_endpoint=False), urlconf_name,
+                           app_name=namespace, namespace=namespace)
@@ -14,6 +14,8 @@ from datetime import timedelta
 import os
 from pathlib import Path
 
+from .database import database_config, replica_configs
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -33,7 +35,9 @@ ALLOWED_HOSTS = []
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    # No autodiscover at startup; base/admin_urls.py loads the admin modules
+    # on the first /admin/ request.
+    'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -44,7 +48,6 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'rest_framework_simplejwt.token_blacklist',
     "corsheaders",
-    'django_filters',
 
     'user',
 ]
@@ -53,7 +56,14 @@ AUTH_USER_MODEL = 'user.CustomUser'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Removes itself unless PROFILING_ENABLED; outermost so it times the rest.
+    'user.profiling.ProfilingMiddleware',
+    # Compresses the final body, so it sits above anything that edits it.
+    'user.middleware.CompressionMiddleware',
+    'user.middleware.TenantMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    # After sessions, so admin users are pinned by user id too.
+    'user.middleware.ReplicaRoutingMiddleware',
 
     "corsheaders.middleware.CorsMiddleware",
 
@@ -88,12 +98,18 @@ WSGI_APPLICATION = 'base.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Configured from DB_* environment variables, see base/database.py.
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
+DATABASES.update(replica_configs(DATABASES['default']))
+
+# Safe-method requests read from a random replica; a client that writes is
+# pinned to the primary for REPLICA_PIN_SECONDS to keep read-your-writes.
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['user.db_routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
 
 
 # Password validation
@@ -114,6 +130,27 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher is used for new passwords; the rest are kept so older
+# hashes still verify and get upgraded on login. Set PASSWORD_HASHER to
+# 'scrypt' or 'argon2' (needs argon2-cffi) for cheaper verification.
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'user.hashers.TunedPBKDF2PasswordHasher',
+    'scrypt': 'user.hashers.TunedScryptPasswordHasher',
+    'argon2': 'user.hashers.TunedArgon2PasswordHasher',
+}
+_preferred_hasher = _PASSWORD_HASHERS[os.environ.get('PASSWORD_HASHER', 'pbkdf2')]
+
+PASSWORD_HASHERS = [_preferred_hasher] + [
+    hasher for hasher in _PASSWORD_HASHERS.values() if hasher != _preferred_hasher
+]
+
+PASSWORD_HASH_COST = {
+    'pbkdf2_iterations': int(os.environ.get('PBKDF2_ITERATIONS', 0)),
+    'scrypt_work_factor': int(os.environ.get('SCRYPT_WORK_FACTOR', 0)),
+    'argon2_time_cost': int(os.environ.get('ARGON2_TIME_COST', 0)),
+    'argon2_memory_cost': int(os.environ.get('ARGON2_MEMORY_COST', 0)),
+}
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -146,12 +183,141 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
 
+    # orjson backed JSON, see user/renderers.py.
+    'DEFAULT_RENDERER_CLASSES': (
+        'user.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'user.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 5
+    'PAGE_SIZE': 5,
+
+    # Used by user.throttling.ScopedSlidingWindowThrottle, keyed by the
+    # view's throttle_scope.
+    'DEFAULT_THROTTLE_CLASSES': (
+        'user.throttling.ScopedSlidingWindowThrottle',
+    ),
+    # Anonymous throttles key on the client address. X-Forwarded-For is only
+    # trusted when set by this many proxies in front of the app; with 0 the
+    # address is REMOTE_ADDR, so clients cannot rotate the header.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '10/min'),
+        'signup': os.environ.get('THROTTLE_SIGNUP_RATE', '5/hour'),
+        'cart': os.environ.get('THROTTLE_CART_RATE', '60/min'),
+    },
 }
 
+# 'local' keeps throttle counters per process; 'cache' shares them through
+# the default cache (point CACHES at Redis/Memcached for that).
+THROTTLE_STORE = os.environ.get('THROTTLE_STORE', 'local')
+
+# Tenant served when neither the host nor the JWT names one (user/tenancy.py),
+# and how often each process reloads the tenant table.
+DEFAULT_TENANT = os.environ.get('DEFAULT_TENANT', 'default')
+TENANT_REFRESH_SECONDS = 60
+
+# Responses smaller than this are sent uncompressed. Brotli (quality 0-11)
+# is used when the `brotli` package is installed and the client accepts it.
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', 1024))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+
 CORS_ALLOW_ALL_ORIGINS = True
 
+# The enrollment, course and blog caches, cache-backed throttles and stored
+# profiles are invalidated and shared through this cache. The default
+# LocMemCache is per process, which is only correct for a single worker;
+# with more, point it at a shared backend, e.g.
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://localhost:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+}
+
+ENROLLMENT_CACHE_SECONDS = 60 * 60
+
+# Reviews embedded in each course payload; the rest are paginated under
+# /api/courses/<id>/reviews/.
+COURSE_REVIEW_PREVIEW_SIZE = 3
+
+# Ids accepted per resource type by POST /api/batch/.
+BATCH_MAX_IDS = 100
+
+# Course detail payloads are cached per course and invalidated on course
+# and review writes; this only bounds staleness of instructor details.
+COURSE_CACHE_SECONDS = 60 * 5
+
+BLOG_CACHE_SECONDS = 60 * 5
+BLOG_EXCERPT_LENGTH = 200
+
+# Neighbours kept per course by `manage.py build_recommendations`. A cart or
+# watchlist add refreshes the course RECOMMENDATIONS_REFRESH_SECONDS later,
+# covering every add in between.
+RECOMMENDATIONS_TOP_K = 10
+RECOMMENDATIONS_REFRESH_SECONDS = 60
+
+# Trending courses: popularity halves every LEADERBOARD_HALF_LIFE_HOURS and
+# each process syncs its in-memory ranking with the table this often.
+LEADERBOARD_HALF_LIFE_HOURS = 72
+LEADERBOARD_FLUSH_SECONDS = 30
+
+# `manage.py archive_carts` moves carts checked out more than
+# CART_ARCHIVE_COMPLETED_DAYS ago and open carts untouched for
+# CART_ABANDONED_DAYS into the archive tables, and deletes watchlists that
+# are still empty WATCHLIST_STALE_DAYS after creation.
+CART_ARCHIVE_COMPLETED_DAYS = 30
+CART_ABANDONED_DAYS = 90
+WATCHLIST_STALE_DAYS = 180
+ARCHIVE_BATCH_SIZE = 500
+
+# Change outbox (user/changes.py): events are served in batches of
+# CHANGES_BATCH_SIZE (a client may ask for up to CHANGES_MAX_BATCH_SIZE),
+# and `tail_changes --prune` drops read events after
+# CHANGES_RETENTION_DAYS.
+CHANGES_BATCH_SIZE = 500
+CHANGES_MAX_BATCH_SIZE = 5000
+CHANGES_RETENTION_DAYS = 7
+
+# Cart and watchlist deltas pushed over /ws/sync/ (user/realtime.py). Use
+# 'user.realtime.RedisBroker' with OPTIONS={'url': ...} when running more
+# than one ASGI worker.
+REALTIME = {
+    'BACKEND': os.environ.get('REALTIME_BACKEND', 'user.realtime.LocalBroker'),
+    'OPTIONS': {},
+}
+
+# Request profiling (user/profiling.py). Off unless PROFILING_ENABLED=1;
+# then requests sending a signed X-Profile token (valid for
+# PROFILE_TOKEN_MAX_AGE seconds) are profiled, plus a PROFILE_SAMPLE_RATE
+# fraction of all requests with PROFILE_ENGINE ('cprofile' or
+# 'pyinstrument'). The last PROFILE_KEEP profiles are kept in the database.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_ENGINE = os.environ.get('PROFILE_ENGINE', 'cprofile')
+PROFILE_TOKEN_MAX_AGE = 600
+PROFILE_KEEP = 20
+
+# Background tasks (see user/taskqueue.py). Use
+# 'user.taskqueue.DatabaseBackend' with `manage.py run_tasks` in production.
+TASKS = {
+    'BACKEND': os.environ.get('TASKS_BACKEND', 'user.taskqueue.ThreadPoolBackend'),
+    'OPTIONS': {},
+}
+
+# A task the run_tasks worker claimed but did not finish within this many
+# seconds is assumed lost with its worker and is queued again. Keep it above
+# the longest task's running time.
+TASK_LEASE_SECONDS = int(os.environ.get('TASK_LEASE_SECONDS', 600))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -14,13 +14,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from .lazy_urls import lazy_include
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    # Imported, with every admin.py, on the first /admin/ request.
+    lazy_include('admin/', 'base.admin_urls', 'admin'),
     path('api/', include('user.urls')),
 ]
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
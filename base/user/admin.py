@@ -1,14 +1,168 @@
 from django.contrib import admin
 
 from .models import *
-# Register your models here.
-admin.site.register(CustomUser)
-admin.site.register(InstructorProfile)
-admin.site.register(StudentProfile)
-admin.site.register(Course)
-admin.site.register(Cart)
-admin.site.register(Cartitems)
-admin.site.register(WatchList)
-admin.site.register(Watchitems)
-admin.site.register(Review)
-admin.site.register(Blog)
+from .pagination import EstimatedCountPaginator
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that grow to millions of rows.
+
+    Counts come from the planner's estimate, the second "N total" count is
+    not run, rows are ordered by primary key and foreign keys are edited as
+    raw ids instead of rendering every related row in a <select>.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ('-pk',)
+
+
+@admin.register(Tenant)
+class TenantAdmin(ScalableAdmin):
+    list_display = ('slug', 'name', 'domain', 'created_at')
+    search_fields = ('^slug', '^domain')
+
+
+@admin.register(CustomUser)
+class CustomUserAdmin(ScalableAdmin):
+    list_display = ('email', 'username', 'tenant', 'is_instructor', 'is_student', 'is_staff')
+    list_select_related = ('tenant',)
+    search_fields = ('=email', '^username')
+
+
+@admin.register(InstructorProfile, StudentProfile)
+class ProfileAdmin(ScalableAdmin):
+    list_display = ('__str__', 'user')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(Course)
+class CourseAdmin(ScalableAdmin):
+    list_display = ('title', 'instructor', 'category', 'price', 'review_count', 'created_at')
+    list_select_related = ('instructor', 'category')
+    raw_id_fields = ('instructor', 'category')
+    filter_horizontal = ('tags',)
+    search_fields = ('^title',)
+
+
+@admin.register(Category)
+class CategoryAdmin(ScalableAdmin):
+    list_display = ('name', 'slug', 'parent', 'path', 'course_count')
+    list_select_related = ('parent',)
+    raw_id_fields = ('parent',)
+    search_fields = ('^slug',)
+    ordering = ('path',)
+
+
+@admin.register(Tag)
+class TagAdmin(ScalableAdmin):
+    list_display = ('name', 'slug', 'course_count')
+    search_fields = ('^slug',)
+
+
+@admin.register(Cart)
+class CartAdmin(ScalableAdmin):
+    list_display = ('id', 'user', 'created', 'updated', 'completed', 'completed_at')
+    list_select_related = ('user',)
+    list_filter = ('completed',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(Cartitems)
+class CartitemsAdmin(ScalableAdmin):
+    list_display = ('id', 'cart', 'course')
+    list_select_related = ('cart__user', 'course')
+    raw_id_fields = ('cart', 'course')
+
+
+@admin.register(ArchivedCart)
+class ArchivedCartAdmin(ScalableAdmin):
+    list_display = ('id', 'user', 'created', 'completed', 'archived_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'order')
+
+
+@admin.register(WatchList)
+class WatchListAdmin(ScalableAdmin):
+    list_display = ('id', 'user', 'created')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+
+@admin.register(Watchitems)
+class WatchitemsAdmin(ScalableAdmin):
+    list_display = ('id', 'watchlist', 'course')
+    list_select_related = ('watchlist__user', 'course')
+    raw_id_fields = ('watchlist', 'course')
+
+
+@admin.register(Order)
+class OrderAdmin(ScalableAdmin):
+    list_display = ('id', 'user', 'total_price', 'created_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'cart')
+
+
+@admin.register(Enrollment)
+class EnrollmentAdmin(ScalableAdmin):
+    list_display = ('id', 'user', 'course', 'price', 'created_at')
+    list_select_related = ('user', 'course')
+    raw_id_fields = ('order', 'user', 'course')
+
+
+@admin.register(Review)
+class ReviewAdmin(ScalableAdmin):
+    list_display = ('id', 'user', 'course', 'rating', 'created_at')
+    list_select_related = ('user', 'course')
+    raw_id_fields = ('user', 'course')
+
+
+@admin.register(Blog)
+class BlogAdmin(ScalableAdmin):
+    list_display = ('title', 'author', 'created_at')
+    list_select_related = ('author',)
+    raw_id_fields = ('author',)
+    ordering = ('-created_at', '-id')
+
+
+@admin.register(Task)
+class TaskAdmin(ScalableAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_after', 'claimed_at', 'created_at')
+    list_filter = ('status',)
+
+
+@admin.register(InstructorStats)
+class InstructorStatsAdmin(ScalableAdmin):
+    list_display = ('instructor', 'course_count', 'review_count', 'students', 'updated_at')
+    list_select_related = ('instructor',)
+    raw_id_fields = ('instructor',)
+
+
+@admin.register(CourseRecommendation)
+class CourseRecommendationAdmin(ScalableAdmin):
+    list_display = ('course', 'rank', 'recommended', 'score')
+    list_select_related = ('course', 'recommended')
+    raw_id_fields = ('course', 'recommended')
+    ordering = ('course', 'rank')
+
+
+@admin.register(CoursePopularity)
+class CoursePopularityAdmin(ScalableAdmin):
+    list_display = ('course', 'log_score', 'updated_at')
+    list_select_related = ('course',)
+    raw_id_fields = ('course',)
+
+
+@admin.register(ChangeEvent)
+class ChangeEventAdmin(ScalableAdmin):
+    list_display = ('id', 'position', 'op', 'model', 'object_id', 'tenant', 'created_at')
+    list_select_related = ('tenant',)
+    list_filter = ('model', 'op')
+    raw_id_fields = ('tenant',)
+
+
+@admin.register(ChangeConsumer)
+class ChangeConsumerAdmin(ScalableAdmin):
+    list_display = ('name', 'position', 'updated_at')
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class UserConfig(AppConfig):
@@ -6,4 +7,7 @@ class UserConfig(AppConfig):
     name = 'user'
 
     def ready(self):
-        import user.signals
\ No newline at end of file
+        import user.signals
+        from base.database import apply_sqlite_pragmas
+
+        connection_created.connect(apply_sqlite_pragmas)
@@ -0,0 +1,135 @@
+"""
+Moving stale carts and watchlists out of the live tables.
+
+Every checkout leaves a completed cart behind and every visitor who never
+checks out leaves an open one, so ``Cart`` and ``Cartitems`` grow forever
+while only the newest open cart per user is ever read. ``archive_carts``
+copies carts checked out long ago and open carts nobody has touched in a
+while (with their items) into ``ArchivedCart``/``ArchivedCartitem`` and
+deletes them from the live tables. Watchlists carry nothing once they are
+empty, so stale empty ones are simply deleted.
+
+Work is done in batches of ``ARCHIVE_BATCH_SIZE`` rows, each in its own
+short transaction that locks only that batch's carts, so checkouts and
+cart edits keep running while it works. Eligibility is checked again under
+the lock: a cart that was touched since the batch was picked stays put.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from . import changes
+from .models import ArchivedCart, ArchivedCartitem, Cart, Cartitems, Order, Tenant, WatchList, Watchitems
+
+
+def cart_policies(now=None):
+    """``[(name, eligibility Q, ordering field), ...]`` for the configured ages."""
+    now = now or timezone.now()
+    return [
+        ('completed', Q(completed=True, completed_at__lt=now - timedelta(days=settings.CART_ARCHIVE_COMPLETED_DAYS)),
+         'completed_at'),
+        ('abandoned', Q(completed=False, updated__lt=now - timedelta(days=settings.CART_ABANDONED_DAYS)),
+         'updated'),
+    ]
+
+
+def keyset_batches(queryset, field, batch_size):
+    """Yield lists of pks ordered by ``(field, pk)``, one page at a time.
+
+    Pages continue after the last row seen rather than re-reading from the
+    start, so rows that could not be moved are not picked up again.
+    """
+    queryset = queryset.order_by(field, 'pk')
+    last = None
+    while True:
+        page = queryset
+        if last is not None:
+            page = page.filter(Q(**{f'{field}__gt': last[0]}) | Q(**{field: last[0], 'pk__gt': last[1]}))
+        rows = list(page.values_list(field, 'pk')[:batch_size])
+        if not rows:
+            return
+        last = rows[-1]
+        yield [pk for _, pk in rows]
+
+
+def _lock(queryset):
+    if connection.features.has_select_for_update_skip_locked:
+        return queryset.select_for_update(skip_locked=True)
+    return queryset.select_for_update()
+
+
+def move_carts(ids, eligible, delete=False):
+    """Archive (or just delete) the carts in ``ids`` still matching ``eligible``."""
+    with transaction.atomic():
+        carts = list(_lock(Cart.all_tenants.filter(eligible, pk__in=ids)))
+        if not carts:
+            return 0
+        ids = [cart.pk for cart in carts]
+
+        if not delete:
+            orders = dict(Order.objects.filter(cart_id__in=ids).values_list('cart_id', 'pk'))
+            ArchivedCart.objects.bulk_create([
+                ArchivedCart(id=cart.pk, tenant_id=cart.tenant_id, user_id=cart.user_id,
+                             order_id=orders.get(cart.pk), created=cart.created,
+                             updated=cart.updated, completed=cart.completed,
+                             completed_at=cart.completed_at)
+                for cart in carts
+            ])
+            ArchivedCartitem.objects.bulk_create([
+                ArchivedCartitem(cart_id=cart_id, course_id=course_id)
+                for cart_id, course_id in Cartitems.objects.filter(cart_id__in=ids).values_list('cart_id', 'course_id')
+            ], batch_size=1000)
+
+        Order.objects.filter(cart_id__in=ids).update(cart=None)
+        with changes.archiving():
+            Cartitems.objects.filter(cart_id__in=ids).delete()
+        Cart.all_tenants.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+def archive_carts(batch_size=None, delete=False, dry_run=False, pause=0, log=None):
+    """Archive stale carts of every tenant. Returns ``{policy: carts}``."""
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    moved = {}
+    for name, eligible, field in cart_policies():
+        moved[name] = 0
+        for tenant_id in Tenant.objects.values_list('pk', flat=True):
+            # Per tenant, so the (tenant, ...) indexes drive the scan.
+            stale = Cart.all_tenants.filter(eligible, tenant_id=tenant_id)
+            if dry_run:
+                moved[name] += stale.count()
+                continue
+            for ids in keyset_batches(stale, field, batch_size):
+                count = move_carts(ids, eligible, delete)
+                moved[name] += count
+                if log:
+                    log(f'{name}: {moved[name]} carts')
+                if pause:
+                    time.sleep(pause)
+    return moved
+
+
+def prune_watchlists(batch_size=None, dry_run=False, pause=0):
+    """Delete empty (or ownerless) watchlists older than WATCHLIST_STALE_DAYS."""
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    before = timezone.now() - timedelta(days=settings.WATCHLIST_STALE_DAYS)
+    eligible = Q(created__lt=before) & (
+        Q(user__isnull=True) | ~Exists(Watchitems.objects.filter(watchlist=OuterRef('pk'))))
+    stale = WatchList.objects.filter(eligible)
+    if dry_run:
+        return stale.count()
+
+    deleted = 0
+    for ids in keyset_batches(stale, 'created', batch_size):
+        with transaction.atomic():
+            ids = list(_lock(WatchList.objects.filter(eligible, pk__in=ids)).values_list('pk', flat=True))
+            Watchitems.objects.filter(watchlist_id__in=ids).delete()
+            deleted += WatchList.objects.filter(pk__in=ids).delete()[1].get(WatchList._meta.label, 0)
+        if pause:
+            time.sleep(pause)
+    return deleted
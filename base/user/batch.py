@@ -0,0 +1,225 @@
+"""
+One request for everything a page reads.
+
+``POST /api/batch/`` takes the ids of each resource type the page needs::
+
+    {"me": true, "courses": [1, 2], "reviews": [7], "users": [3]}
+
+and answers with one map per type, in the shapes the single-resource
+endpoints return (``null`` for ids that do not exist)::
+
+    {"me": {"user": ..., "cart": ..., "watchlist": ...},
+     "courses": {"1": ..., "2": ...}, "reviews": {"7": ...}, "users": {"3": ...}}
+
+Lookups go through ``Loader`` objects in the style of DataLoader: a
+resolver only asks for keys, and each loader then fetches every key asked
+for, by any part of the request, with a single ``IN`` query. Loaders are
+dispatched in dependency order (reviews name courses and users, courses
+name their instructors), so a batch costs one query per type no matter how
+many resources it covers.
+"""
+
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from rest_framework import serializers
+
+from .models import Cart, Cartitems, Course, CustomUser, Review, WatchList, Watchitems
+from .serializers import CartCourseSerializer, CourseSerializer, ReviewSerializer, UserSerializer, WatchItemSerializer
+
+
+class Loader:
+    """Collects keys from many resolvers, then fetches them in one go."""
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.loaded = {}
+        self.pending = set()
+
+    def load(self, keys):
+        self.pending.update(key for key in keys if key not in self.loaded)
+
+    def dispatch(self):
+        if not self.pending:
+            return False
+        keys, self.pending = self.pending, set()
+        found = self.fetch(sorted(keys))
+        self.loaded.update({key: found.get(key) for key in keys})
+        return True
+
+    def get(self, key):
+        return self.loaded.get(key)
+
+
+def prime(instance, field, value):
+    """Attach an already loaded related object so accessing it is free."""
+    type(instance)._meta.get_field(field).set_cached_value(instance, value)
+
+
+class BatchQuerySerializer(serializers.Serializer):
+    me = serializers.BooleanField(required=False, default=False)
+    courses = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    reviews = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    users = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate(self, attrs):
+        for name in ('courses', 'reviews', 'users'):
+            if len(attrs[name]) > settings.BATCH_MAX_IDS:
+                raise serializers.ValidationError(
+                    {name: f'At most {settings.BATCH_MAX_IDS} ids per type.'})
+        return attrs
+
+
+class BatchQuery:
+    def __init__(self, request):
+        self.request = request
+        self.context = {'request': request}
+        self.reviews = Loader(self.fetch_reviews)
+        # Course id -> the preview reviews CourseSerializer embeds.
+        self.previews = Loader(self.fetch_previews)
+        self.courses = Loader(self.fetch_courses)
+        self.users = Loader(self.fetch_users)
+        # Each loader only adds keys to the ones after it.
+        self.loaders = [self.reviews, self.previews, self.courses, self.users]
+
+    # ------------------------------------------------------------ fetching
+
+    def fetch_reviews(self, ids):
+        reviews = {review.pk: review for review in Review.objects.filter(pk__in=ids)}
+        self.want_review_relations(reviews.values())
+        return reviews
+
+    def fetch_previews(self, course_ids):
+        ranked = Window(RowNumber(), partition_by=F('course_id'),
+                        order_by=[F('created_at').desc(), F('id').desc()])
+        rows = (Review.objects.filter(course_id__in=course_ids)
+                .annotate(preview_rank=ranked)
+                .filter(preview_rank__lte=settings.COURSE_REVIEW_PREVIEW_SIZE)
+                .order_by('course_id', 'preview_rank'))
+        previews = {}
+        for review in rows:
+            previews.setdefault(review.course_id, []).append(review)
+            self.want_review_relations([review])
+        return {course_id: previews.get(course_id, []) for course_id in course_ids}
+
+    def fetch_courses(self, ids):
+        courses = {course.pk: course for course in Course.objects.filter(pk__in=ids).prefetch_related('tags')}
+        self.users.load(course.instructor_id for course in courses.values())
+        return courses
+
+    def fetch_users(self, ids):
+        return {user.pk: user for user in CustomUser.objects.filter(pk__in=ids)}
+
+    def want_review_relations(self, reviews):
+        for review in reviews:
+            self.courses.load([review.course_id])
+            self.users.load([review.user_id])
+
+    def run(self):
+        while any([loader.dispatch() for loader in self.loaders]):
+            pass
+
+    # ------------------------------------------------------------ resolving
+
+    def execute(self, query):
+        me = self.load_me() if query['me'] else None
+        self.courses.load(query['courses'])
+        self.previews.load(query['courses'])
+        self.reviews.load(query['reviews'])
+        self.users.load(query['users'])
+        self.run()
+
+        data = {}
+        if query['me']:
+            data['me'] = self.render_me(*me)
+        if query['courses']:
+            data['courses'] = self.render_courses(query['courses'])
+        if query['reviews']:
+            data['reviews'] = self.render_reviews(query['reviews'])
+        if query['users']:
+            data['users'] = self.render_users(query['users'])
+        return data
+
+    def load_me(self):
+        user = self.request.user
+        cart = Cart.objects.open_for(user)
+        cart_course_ids = []
+        if cart is not None:
+            cart_course_ids = list(Cartitems.objects.filter(cart=cart, course__isnull=False)
+                                   .values_list('course_id', flat=True))
+        watchlist = WatchList.objects.filter(user=user).first()
+        watch_items = list(Watchitems.objects.filter(watchlist=watchlist)) if watchlist else []
+
+        self.courses.load(cart_course_ids)
+        self.courses.load(item.course_id for item in watch_items)
+        return cart, cart_course_ids, watchlist, watch_items
+
+    def render_me(self, cart, cart_course_ids, watchlist, watch_items):
+        data = {
+            'user': UserSerializer(self.request.user, context=self.context).data,
+            'cart': None,
+            'watchlist': None,
+        }
+        if cart is not None:
+            # Same shape as CartSerializer.
+            quantities = {}
+            for course_id in cart_course_ids:
+                quantities[course_id] = quantities.get(course_id, 0) + 1
+            items = [
+                {'course': CartCourseSerializer(self.courses.get(course_id), context=self.context).data,
+                 'quantity': quantity}
+                for course_id, quantity in quantities.items() if self.courses.get(course_id)
+            ]
+            data['cart'] = {
+                'id': cart.pk,
+                'items': items,
+                'total_price': sum(self.courses.get(course_id).price for course_id in cart_course_ids
+                                   if self.courses.get(course_id)),
+            }
+        if watchlist is not None:
+            watch_items = [item for item in watch_items if self.courses.get(item.course_id)]
+            for item in watch_items:
+                prime(item, 'course', self.courses.get(item.course_id))
+            data['watchlist'] = {
+                'id': watchlist.pk,
+                'items': WatchItemSerializer(watch_items, many=True, context=self.context).data,
+            }
+        return data
+
+    def attach_review(self, review):
+        """Prime a review's course and user; False if either is not visible."""
+        course = self.courses.get(review.course_id)
+        user = self.users.get(review.user_id)
+        if course is None or user is None:
+            # e.g. a review of another tenant's course.
+            return False
+        prime(review, 'course', course)
+        prime(review, 'user', user)
+        return True
+
+    def render_users(self, ids):
+        users = [user for user in map(self.users.get, dict.fromkeys(ids)) if user is not None]
+        by_id = {row['id']: row for row in UserSerializer(users, many=True, context=self.context).data}
+        return {pk: by_id.get(pk) for pk in ids}
+
+    def render_reviews(self, ids):
+        reviews = [review for review in map(self.reviews.get, dict.fromkeys(ids))
+                   if review is not None and self.attach_review(review)]
+        rendered = ReviewSerializer(reviews, many=True, context=self.context).data
+        by_id = {row['id']: row for row in rendered}
+        return {pk: by_id.get(pk) for pk in ids}
+
+    def render_courses(self, ids):
+        courses = []
+        for pk in dict.fromkeys(ids):
+            course = self.courses.get(pk)
+            if course is None:
+                continue
+            prime(course, 'instructor', self.users.get(course.instructor_id))
+            course.latest_reviews = [review for review in self.previews.get(pk) or []
+                                     if self.attach_review(review)]
+            courses.append(course)
+        # The list serializer answers 'owned' for every course at once.
+        rendered = CourseSerializer(courses, many=True, context=self.context).data
+        by_id = {row['id']: row for row in rendered}
+        return {pk: by_id.get(pk) for pk in ids}
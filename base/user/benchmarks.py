@@ -0,0 +1,286 @@
+import time
+
+from django.contrib.auth.hashers import get_hasher
+
+SCENARIOS = {}
+
+
+def scenario(func):
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+def timed(func, number):
+    """Return the mean wall time of ``func()`` in seconds."""
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - start) / number
+
+
+# ------------------------------------ Auth ------------------------------------
+
+
+@scenario
+def login(number):
+    """Password verifications per second on one core, per hasher."""
+    rows = []
+    for algorithm in ('pbkdf2_sha256', 'scrypt', 'argon2'):
+        try:
+            hasher = get_hasher(algorithm)
+            encoded = hasher.encode('correct horse', hasher.salt())
+        except (ValueError, ImportError):
+            rows.append((f'{algorithm} verify', None, 'unavailable'))
+            continue
+
+        seconds = timed(lambda: hasher.verify('correct horse', encoded), number)
+        rows.append((f'{algorithm} verify', 1 / seconds, 'logins/sec/core'))
+    return rows
+
+
+# ---------------------------------- Database ----------------------------------
+
+
+@scenario
+def db_connection(number):
+    """Per-request cost of reconnecting versus reusing a connection."""
+    import os
+    import tempfile
+
+    from django.db import connections
+
+    connection = connections['default']
+    settings_dict = dict(connection.settings_dict)
+    tmpdir = None
+    if connection.vendor == 'sqlite':
+        # The in-memory test database never really closes; use a file.
+        tmpdir = tempfile.TemporaryDirectory()
+        settings_dict['NAME'] = os.path.join(tmpdir.name, 'bench.sqlite3')
+
+    wrapper = connection.__class__(settings_dict, alias='bench')
+
+    def query():
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+    def reconnecting_request():
+        query()
+        wrapper.close()
+
+    def persistent_request():
+        # CONN_HEALTH_CHECKS pings once per request before reuse.
+        wrapper.is_usable()
+        query()
+
+    try:
+        fresh = timed(reconnecting_request, number)
+        query()
+        reused = timed(persistent_request, number)
+    finally:
+        wrapper.close()
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    return [
+        ('connect per request', fresh * 1000, 'ms/request'),
+        ('persistent connection', reused * 1000, 'ms/request'),
+        ('saved per request', (fresh - reused) * 1000, 'ms/request'),
+    ]
+
+
+# ----------------------------------- Startup -----------------------------------
+
+
+@scenario
+def boot(number):
+    """Cold start of a fresh interpreter up to and including the first request."""
+    from .startup import measure_boot
+
+    runs = [measure_boot()[0] for _ in range(number)]
+    phases = [label for label in runs[0] if label != 'status']
+    return [(label, sum(run[label] for run in runs) / len(runs) * 1000, 'ms')
+            for label in phases]
+
+
+# ---------------------------------- Rendering ----------------------------------
+
+
+@scenario
+def course_list(number):
+    """Render a page of 100 courses with DRF's JSONRenderer versus orjson."""
+    import gzip
+
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIClient
+
+    from .models import Course, CustomUser, Review
+    from .renderers import FastJSONRenderer
+    from .serializers import CourseSerializer, latest_reviews_prefetch
+
+    instructor = CustomUser.objects.create_user(
+        'bench-instructor@example.com', 'x', username='bench', is_instructor=True)
+    students = [CustomUser(email=f'bench-{n}@example.com', username=f'student {n}')
+                for n in range(5)]
+    CustomUser.objects.bulk_create(students)
+    courses = Course.objects.bulk_create(
+        Course(title=f'Course {n}', description='Lorem ipsum dolor sit amet. ' * 20,
+               instructor=instructor, price='49.99', duration_in_hours=12)
+        for n in range(100))
+    Review.objects.bulk_create(
+        Review(user=student, course=course, rating=4, comment='Clear and well paced.')
+        for course in courses for student in students[:3])
+
+    client = APIClient()
+    client.force_authenticate(instructor)
+    queryset = (Course.objects.select_related('instructor')
+                .prefetch_related(latest_reviews_prefetch()))
+    data = CourseSerializer(queryset, many=True, context={'request': None}).data
+
+    drf = JSONRenderer().render(data)
+    fast = FastJSONRenderer().render(data)
+    assert drf == fast, 'FastJSONRenderer output differs from JSONRenderer'
+
+    before = timed(lambda: JSONRenderer().render(data), number)
+    after = timed(lambda: FastJSONRenderer().render(data), number)
+    request = timed(lambda: client.get('/api/courses/'), number)
+
+    rows = [
+        ('JSONRenderer', before * 1000, 'ms/render'),
+        ('FastJSONRenderer', after * 1000, 'ms/render'),
+        ('speedup', before / after, 'x'),
+        ('GET /api/courses/ first page', request * 1000, 'ms/request'),
+        ('body', len(fast) / 1024, 'KiB'),
+        ('gzip', len(gzip.compress(fast)) / 1024, 'KiB'),
+    ]
+    try:
+        import brotli
+    except ImportError:
+        rows.append(('brotli', None, 'unavailable'))
+    else:
+        rows.append(('brotli', len(brotli.compress(fast, quality=5)) / 1024, 'KiB'))
+    return rows
+
+
+@scenario
+def serializers(number):
+    """values() fast path versus the ModelSerializer it mirrors.
+
+    Each pair is rendered to JSON and compared byte for byte first.
+    """
+    from rest_framework.test import APIRequestFactory
+
+    from . import fast_serializers as fast
+    from .models import Course, CourseRecommendation, CustomUser, Review
+    from .renderers import FastJSONRenderer
+    from .serializers import (
+        CartCourseSerializer, CourseRecommendationSerializer, InstructorSerializer,
+        ReviewSerializer, UserSerializer)
+
+    instructor = CustomUser.objects.create_user(
+        'bench-serializers@example.com', 'x', username='bench', name='Bench', is_instructor=True)
+    CustomUser.objects.bulk_create(
+        CustomUser(email=f'student-{n}@example.com', username=f'student {n}',
+                   name=f'Student {n}' if n % 3 else None, is_student=True,
+                   is_instructor=not n % 10, password='!')
+        for n in range(500))
+    courses = Course.objects.bulk_create(
+        Course(title=f'Course {n}', instructor=instructor, price=f'{n}.5',
+               duration_in_hours=n, image='courses/cover.png' if n % 2 else '')
+        for n in range(200))
+    students = list(CustomUser.objects.filter(is_student=True)[:20])
+    Review.objects.bulk_create(
+        Review(user=student, course=course, rating=n % 5 + 1, comment=f'Review {n}')
+        for n, (course, student) in enumerate((c, s) for c in courses[:25] for s in students))
+    CourseRecommendation.objects.bulk_create(
+        CourseRecommendation(course=courses[0], recommended=other, score=1 / rank, rank=rank)
+        for rank, other in enumerate(courses[1:11], start=1))
+
+    context = {'request': APIRequestFactory().get('/api/users/')}
+    render = FastJSONRenderer().render
+    cases = [
+        ('users', UserSerializer, fast.FastUserSerializer,
+         CustomUser.objects.filter(is_student=True)),
+        ('instructors', InstructorSerializer, fast.FastInstructorSerializer,
+         CustomUser.objects.filter(is_instructor=True)),
+        ('reviews', ReviewSerializer, fast.FastReviewSerializer,
+         Review.objects.select_related('user', 'course')),
+        ('cart courses', CartCourseSerializer, fast.FastCartCourseSerializer,
+         Course.objects.all()),
+        ('recommendations', CourseRecommendationSerializer, fast.FastCourseRecommendationSerializer,
+         CourseRecommendation.objects.select_related('recommended')),
+    ]
+
+    rows = []
+    for label, slow_class, fast_class, queryset in cases:
+        slow = lambda: render(slow_class(queryset.all(), many=True, context=context).data)
+        quick = lambda: render(fast_class(queryset.all(), context=context).data)
+        assert slow() == quick(), f'{fast_class.__name__} output differs from {slow_class.__name__}'
+
+        before, after = timed(slow, number), timed(quick, number)
+        rows += [
+            (f'{label} ({queryset.count()} rows) ModelSerializer', before * 1000, 'ms'),
+            (f'{label} values()', after * 1000, 'ms'),
+            (f'{label} speedup', before / after, 'x'),
+        ]
+    return rows
+
+
+# ---------------------------------- Batching ----------------------------------
+
+
+@scenario
+def batch(number):
+    """One POST /api/batch/ versus the requests a course page makes today."""
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIClient
+
+    from .models import Course, CustomUser, Review, StudentProfile
+
+    instructor = CustomUser.objects.create_user(
+        'bench-batch@example.com', 'x', username='bench', name='Bench', is_instructor=True)
+    student = CustomUser.objects.create_user(
+        'bench-student@example.com', 'x', username='student', name='Student')
+    profile = StudentProfile.objects.create(user=student)
+    reviewers = [CustomUser(email=f'batch-{n}@example.com', username=f'reviewer {n}', name=f'R {n}')
+                 for n in range(10)]
+    CustomUser.objects.bulk_create(reviewers)
+    courses = Course.objects.bulk_create(
+        Course(title=f'Course {n}', instructor=instructor, price='19.99', duration_in_hours=3)
+        for n in range(10))
+    reviews = Review.objects.bulk_create(
+        Review(user=reviewer, course=course, rating=5, comment='Great.')
+        for course in courses for reviewer in CustomUser.objects.filter(email__startswith='batch-'))
+
+    client = APIClient()
+    client.force_authenticate(student)
+    for course in courses[:3]:
+        client.post('/api/cart/add_item/', {'course_id': course.pk})
+        client.post('/api/watch-list/add_item/', {'course_id': course.pk})
+    course_ids = [course.pk for course in courses]
+    review_ids = [review.pk for review in reviews[:10]]
+
+    def separate():
+        client.get(f'/api/user-profile/{profile.pk}/')
+        for pk in course_ids:
+            client.get(f'/api/courses/{pk}/')
+        for pk in review_ids:
+            client.get(f'/api/reviews/{pk}/')
+
+    def batched():
+        client.post('/api/batch/', {'me': True, 'courses': course_ids, 'reviews': review_ids},
+                    format='json')
+
+    rows = []
+    for label, page in (('separate requests', separate), ('batch', batched)):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            page()
+        rows += [
+            (f'{label} queries (cold cache)', len(queries), 'queries'),
+            (f'{label}', timed(page, number) * 1000, 'ms/page'),
+        ]
+    rows.insert(0, ('separate requests round trips', 1 + len(course_ids) + len(review_ids), 'requests'))
+    rows.insert(3, ('batch round trips', 1, 'requests'))
+    return rows
@@ -0,0 +1,46 @@
+from django.core.cache import cache
+
+from .tenancy import current_tenant_id
+
+
+def make_key(*parts):
+    return ':'.join(str(part) for part in parts)
+
+
+def get_version(namespace):
+    return cache.get(make_key('version', namespace)) or 1
+
+
+def bump_version(namespace):
+    """Invalidate every key built with ``versioned_key(namespace, ...)``."""
+    key = make_key('version', namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def versioned_key(namespace, *parts):
+    """Key for the active tenant's copy of ``namespace`` data.
+
+    Version counters are not per tenant: they are bumped by workers and
+    signals that often run with no tenant active, so namespaces for
+    tenant-wide data include the tenant id themselves (see ``blog_cache_key``).
+    """
+    return make_key(f'tenant-{current_tenant_id()}', namespace, get_version(namespace), *parts)
+
+
+def course_cache_key(course_id):
+    return versioned_key(f'course:{course_id}', 'detail')
+
+
+def invalidate_course(course_id):
+    bump_version(f'course:{course_id}')
+
+
+def blog_cache_key(*parts):
+    return versioned_key(f'blog:{current_tenant_id()}', *parts)
+
+
+def invalidate_blog(tenant_id):
+    bump_version(f'blog:{tenant_id}')
@@ -0,0 +1,61 @@
+"""
+Category paths and course counts, maintained incrementally.
+
+A category's ``course_count`` is the number of courses in it or any
+category below it. Counts move with single ``UPDATE`` statements over the
+ids in a path when a course is created, deleted or recategorized, and when
+a subtree moves; tag counts move the same way when tags are linked or
+unlinked. ``manage.py rebuild_categories`` recomputes everything from the
+courses if they ever drift.
+"""
+
+from django.db.models import Count, F, Value
+from django.db.models.functions import Concat, Substr
+
+from .models import Category, Course, Tag, path_ids, subtree_q
+
+
+def adjust_path_counts(path, delta, using=None, exclude=None):
+    """Add ``delta`` to every category on ``path`` (except ``exclude``)."""
+    ids = [pk for pk in path_ids(path) if pk != exclude]
+    if ids and delta:
+        Category.all_tenants.using(using).filter(pk__in=ids).update(
+            course_count=F('course_count') + delta)
+
+
+def move_subtree(old_path, new_path, course_count, using=None):
+    """Re-root every path under ``old_path`` and move its courses' counts."""
+    moved = path_ids(old_path)[-1]
+    for model, field in ((Category, 'path'), (Course, 'category_path')):
+        model.all_tenants.using(using).filter(subtree_q(old_path, field)).update(
+            **{field: Concat(Value(new_path), Substr(field, len(old_path) + 1))})
+    adjust_path_counts(old_path, -course_count, using, exclude=moved)
+    adjust_path_counts(new_path, course_count, using, exclude=moved)
+
+
+def adjust_tag_counts(tag_ids, delta, using=None):
+    if tag_ids and delta:
+        Tag.all_tenants.using(using).filter(pk__in=list(tag_ids)).update(
+            course_count=F('course_count') + delta)
+
+
+def rebuild_counts():
+    """Recompute paths of courses and every category and tag count."""
+    paths = dict(Category.all_tenants.values_list('pk', 'path'))
+    for category_id, path in paths.items():
+        Course.all_tenants.filter(category_id=category_id).exclude(category_path=path).update(category_path=path)
+    Course.all_tenants.filter(category__isnull=True).exclude(category_path='').update(category_path='')
+
+    direct = dict(Course.all_tenants.filter(category__isnull=False)
+                  .values('category_id').annotate(n=Count('id')).values_list('category_id', 'n'))
+    totals = dict.fromkeys(paths, 0)
+    for category_id, count in direct.items():
+        for ancestor in path_ids(paths[category_id]):
+            totals[ancestor] += count
+    for category_id, count in totals.items():
+        Category.all_tenants.filter(pk=category_id).exclude(course_count=count).update(course_count=count)
+
+    tag_totals = dict(Tag.all_tenants.annotate(n=Count('courses')).values_list('pk', 'n'))
+    for tag_id, count in tag_totals.items():
+        Tag.all_tenants.filter(pk=tag_id).exclude(course_count=count).update(course_count=count)
+    return len(totals), len(tag_totals)
@@ -0,0 +1,155 @@
+"""
+Transactional outbox of catalogue, cart and review changes.
+
+Every create, update and delete of a ``Course``, ``Review``, ``Cartitems``
+or ``Watchitems`` row appends a ``ChangeEvent`` in the same transaction as
+the change itself: ``post_save``/``post_delete`` receivers cover views, the
+admin and queryset deletes, and code writing with ``bulk_create`` calls
+``record_many`` itself. Search, analytics and cache layers read the stream
+in id order, via ``GET /api/changes/?after=<id>`` or ``manage.py
+tail_changes``, instead of rescanning the tables.
+
+Events carry the row's key, its tenant and the few fields consumers route
+on, not the whole row; consumers that need more load it by id. Counters
+maintained with ``update()`` (``Course.review_count``, ``rating_total``)
+are not events of their own, they follow from the review events. Cart items
+moved out by ``archive_carts`` are ``archive`` events, not ``delete``.
+
+Ids are handed out at insert time but become visible at commit, so a
+reader can see id 11 before a long transaction holding id 10 commits.
+Consumers therefore read by ``position``, which ``sequence()`` hands out to
+committed events one sequencer at a time: a position is never visible
+before a lower one, however long the transaction that wrote the event ran.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F, Min, prefetch_related_objects
+from django.utils import timezone
+
+from .models import Cartitems, ChangeConsumer, ChangeEvent, ChangeSequence, Course, Review, Watchitems
+from .tenancy import current_tenant_id
+
+_delete_op = ContextVar('change_delete_op', default=ChangeEvent.DELETE)
+
+# Model -> (stream name, fields copied into the event).
+CAPTURED = {
+    Course: ('course', ('instructor_id', 'title', 'price')),
+    Review: ('review', ('course_id', 'user_id', 'rating')),
+    Cartitems: ('cartitem', ('cart_id', 'course_id')),
+    Watchitems: ('watchitem', ('watchlist_id', 'course_id')),
+}
+
+
+def parent_relation(model):
+    """The relation a model without a tenant column takes its tenant from."""
+    return model.tenant_lookup.split('__')[0]
+
+
+def tenant_of(instance):
+    if isinstance(instance, Course):
+        return instance.tenant_id
+    # The cached parent when the caller loaded it, else one query.
+    parent = getattr(instance, parent_relation(type(instance)))
+    return parent.tenant_id if parent is not None else current_tenant_id()
+
+
+def build_event(instance, op):
+    name, fields = CAPTURED[type(instance)]
+    return ChangeEvent(
+        tenant_id=tenant_of(instance),
+        model=name,
+        object_id=str(instance.pk),
+        op=op,
+        data={field: getattr(instance, field) for field in fields},
+    )
+
+
+@contextmanager
+def archiving():
+    """Record deletes inside the block as ``archive`` events."""
+    token = _delete_op.set(ChangeEvent.ARCHIVE)
+    try:
+        yield
+    finally:
+        _delete_op.reset(token)
+
+
+def record(instance, op, using=None):
+    if op == ChangeEvent.DELETE:
+        op = _delete_op.get()
+    build_event(instance, op).save(using=using)
+
+
+def record_many(instances, op, using=None):
+    """Append one event per instance; for paths that bypass signals."""
+    for model in {type(instance) for instance in instances} - {Course}:
+        prefetch_related_objects([i for i in instances if type(i) is model], parent_relation(model))
+    ChangeEvent.objects.using(using).bulk_create(
+        [build_event(instance, op) for instance in instances], batch_size=500)
+
+
+def sequence(using=None):
+    """Give committed events without a position the next positions, in id order.
+
+    Runs in its own short transaction holding the ``ChangeSequence`` row, so
+    only one sequencer hands out positions at a time and it only sees events
+    that already committed. Returns how many events were sequenced.
+    """
+    using = using or router.db_for_write(ChangeEvent)
+    with transaction.atomic(using=using):
+        # Writing first takes the lock on every backend, SQLite included.
+        ChangeSequence.objects.using(using).filter(pk=1).update(position=F('position'))
+        counter = ChangeSequence.objects.using(using).get(pk=1)
+        pending = list(ChangeEvent.objects.using(using).filter(position__isnull=True)
+                       .order_by('pk').only('pk')[:settings.CHANGES_MAX_BATCH_SIZE])
+        if not pending:
+            return 0
+        for counter.position, event in enumerate(pending, start=counter.position + 1):
+            event.position = counter.position
+        ChangeEvent.objects.using(using).bulk_update(pending, ['position'], batch_size=500)
+        counter.save(using=using, update_fields=['position'])
+    return len(pending)
+
+
+def read_changes(after=0, limit=None, models=None, tenant_id=None):
+    """Up to ``limit`` events with a position greater than ``after``."""
+    limit = min(limit or settings.CHANGES_BATCH_SIZE, settings.CHANGES_MAX_BATCH_SIZE)
+    sequence()
+    events = ChangeEvent.objects.filter(position__gt=after)
+    if models:
+        events = events.filter(model__in=models)
+    if tenant_id is not None:
+        events = events.filter(tenant_id=tenant_id)
+    return list(events.order_by('position').values(
+        'id', 'position', 'tenant_id', 'model', 'object_id', 'op', 'data', 'created_at')[:limit])
+
+
+def consumer_position(name):
+    return ChangeConsumer.objects.get_or_create(name=name)[0].position
+
+
+def commit_position(name, position):
+    ChangeConsumer.objects.update_or_create(name=name, defaults={'position': position})
+
+
+def prune_changes():
+    """Delete events past CHANGES_RETENTION_DAYS that every consumer has read."""
+    events = ChangeEvent.objects.filter(
+        position__isnull=False,
+        created_at__lt=timezone.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS))
+    slowest = ChangeConsumer.objects.aggregate(position=Min('position'))['position']
+    if slowest is not None:
+        events = events.filter(position__lte=slowest)
+
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(events.order_by('pk').values_list('pk', flat=True)[:settings.CHANGES_BATCH_SIZE])
+            if not ids:
+                return deleted
+            deleted += ChangeEvent.objects.filter(pk__in=ids).delete()[0]
@@ -0,0 +1,60 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .enrollments import invalidate_enrollments
+from .models import Cart, Cartitems, Enrollment, Order
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def checkout_cart(user, idempotency_key):
+    """Turn the user's open cart into an order. Returns ``(order, created)``.
+
+    Retrying with the same key returns the original order instead of
+    charging twice. Only the cart row is locked, so checkouts by different
+    users never wait on each other.
+    """
+    existing = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+    if existing is not None:
+        return existing, False
+
+    try:
+        with transaction.atomic():
+            cart = Cart.objects.select_for_update().filter(user=user, completed=False).first()
+            if cart is None:
+                raise CheckoutError('There is no open cart to check out.')
+
+            prices = dict(
+                Cartitems.objects.filter(cart=cart, course__isnull=False)
+                .exclude(course__enrollments__user=user)
+                .values_list('course_id', 'course__price')
+            )
+            if not prices:
+                raise CheckoutError('Cart is empty or you already own every course in it.')
+
+            order = Order.objects.create(
+                user=user,
+                cart=cart,
+                idempotency_key=idempotency_key,
+                total_price=sum(prices.values()),
+            )
+            Enrollment.objects.bulk_create([
+                Enrollment(order=order, user=user, course_id=course_id, price=price)
+                for course_id, price in prices.items()
+            ])
+
+            cart.completed = True
+            cart.completed_at = timezone.now()
+            cart.save(update_fields=['completed', 'completed_at'])
+            Cart.objects.create(user=user)
+            transaction.on_commit(lambda: invalidate_enrollments(user.pk))
+    except IntegrityError:
+        # A concurrent request with the same key won the race.
+        existing = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if existing is None:
+            raise
+        return existing, False
+
+    return order, True
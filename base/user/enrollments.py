@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import make_key
+from .models import Enrollment
+
+
+def _key(user_id):
+    return make_key('enrollments', user_id)
+
+
+def owned_course_ids(user, course_ids=None):
+    """Return the ids in ``course_ids`` (or all ids) that ``user`` owns.
+
+    The user's owned set is cached, so a whole page of courses is answered
+    by one cache hit or at most one indexed query.
+    """
+    if user is None or not user.is_authenticated:
+        return set()
+
+    owned = cache.get(_key(user.pk))
+    if owned is None:
+        owned = frozenset(
+            Enrollment.objects.filter(user_id=user.pk).values_list('course_id', flat=True))
+        cache.set(_key(user.pk), owned, settings.ENROLLMENT_CACHE_SECONDS)
+
+    if course_ids is None:
+        return set(owned)
+    return owned.intersection(course_ids)
+
+
+def invalidate_enrollments(user_id):
+    cache.delete(_key(user_id))
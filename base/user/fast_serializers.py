@@ -0,0 +1,166 @@
+"""
+Read-only list serialization straight from ``values()`` rows.
+
+A ``ValuesSerializer`` mirrors an existing ``ModelSerializer``: it walks the
+serializer's fields once per request, turns each into a ``values()`` lookup
+plus a converter, and then maps plain dict rows through that plan. Model
+instances, ``get_attribute`` and per-field ``to_representation`` calls are
+skipped wherever the database value is already what DRF would emit, and
+hyperlinks are built from a URL template reversed once instead of calling
+``reverse()`` per row. The output is the same as the mirrored serializer's
+(``FastSerializerTests`` in user/tests.py checks the rendered bytes).
+
+Fields it cannot compile (``SerializerMethodField``, many-related fields)
+raise ``ImproperlyConfigured``; keep those serializers on the normal path.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import QuerySet
+from rest_framework import relations, serializers
+from rest_framework.reverse import reverse
+
+from .serializers import CartCourseSerializer, CourseRecommendationSerializer, InstructorSerializer, ReviewSerializer, UserSerializer
+
+# Fields whose to_representation() returns database values unchanged.
+PASSTHROUGH = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+    relations.PrimaryKeyRelatedField,
+)
+
+URL_SENTINEL = '__lookup__'
+
+
+def url_template(field, request):
+    """``pk -> absolute url`` for a hyperlinked field, reversing only once."""
+    url = reverse(field.view_name, kwargs={field.lookup_url_kwarg: URL_SENTINEL},
+                  request=request, format=field.context.get('format'))
+    prefix, suffix = url.split(URL_SENTINEL)
+    return lambda value: f'{prefix}{value}{suffix}'
+
+
+def file_url(model_field, request):
+    """``name -> url`` matching DRF's FileField/ImageField output."""
+    storage = model_field.storage
+    base = request.build_absolute_uri('/')[:-1] if request is not None else ''
+
+    def convert(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        if request is None:
+            return url
+        return base + url if url.startswith('/') else request.build_absolute_uri(url)
+    return convert
+
+
+class ValuesSerializer:
+    serializer_class = None
+
+    def __init__(self, rows, context=None):
+        self.rows = rows
+        self.context = context or {}
+
+    @classmethod
+    def values(cls, queryset, *extra):
+        """``queryset.values()`` with every lookup the serializer needs."""
+        return queryset.values(*cls.lookups(), *extra)
+
+    @classmethod
+    def lookups(cls):
+        if '_lookups' not in cls.__dict__:
+            plan = cls.compile(cls.serializer_class(context={}), '', {}, urls=False)
+            cls._lookups = tuple(dict.fromkeys(collect_lookups(plan)))
+        return cls._lookups
+
+    @property
+    def data(self):
+        rows = self.rows
+        if isinstance(rows, QuerySet) and rows._iterable_class is not dict:
+            rows = self.values(rows)
+        plan = self.compile(self.serializer_class(context=self.context), '', self.context)
+        build = builder(plan)
+        return [build(row) for row in rows]
+
+    @classmethod
+    def compile(cls, serializer, prefix, context, urls=True):
+        """Return ``[(name, lookup, convert, nested_plan), ...]``."""
+        request = context.get('request')
+        model = serializer.Meta.model
+        plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            if field.source == '*':
+                if not isinstance(field, relations.HyperlinkedIdentityField):
+                    raise ImproperlyConfigured(f'{type(serializer).__name__}.{name} has no values() fast path.')
+                convert = url_template(field, request) if urls else None
+                plan.append((name, prefix + field.lookup_field, convert, None))
+                continue
+
+            lookup = prefix + field.source.replace('.', '__')
+            if isinstance(field, serializers.ModelSerializer):
+                nested = cls.compile(field, lookup + '__', context, urls)
+                plan.append((name, lookup, None, nested))
+            elif isinstance(field, serializers.FileField):
+                model_field = model._meta.get_field(field.source)
+                plan.append((name, lookup, file_url(model_field, request), None))
+            elif type(field) in PASSTHROUGH:
+                plan.append((name, lookup, None, None))
+            elif isinstance(field, (serializers.SerializerMethodField, serializers.BaseSerializer,
+                                    relations.ManyRelatedField, relations.HyperlinkedRelatedField)):
+                raise ImproperlyConfigured(f'{type(serializer).__name__}.{name} has no values() fast path.')
+            else:
+                plan.append((name, lookup, field.to_representation, None))
+        return plan
+
+
+def collect_lookups(plan):
+    for _, lookup, _, nested in plan:
+        yield lookup
+        if nested:
+            yield from collect_lookups(nested)
+
+
+def builder(plan):
+    nested_builders = {name: builder(nested) for name, _, _, nested in plan if nested}
+
+    def build(row):
+        out = {}
+        for name, lookup, convert, nested in plan:
+            value = row[lookup]
+            if value is None:
+                out[name] = None
+            elif nested:
+                out[name] = nested_builders[name](row)
+            elif convert is None:
+                out[name] = value
+            else:
+                out[name] = convert(value)
+        return out
+    return build
+
+
+class FastUserSerializer(ValuesSerializer):
+    serializer_class = UserSerializer
+
+
+class FastInstructorSerializer(ValuesSerializer):
+    serializer_class = InstructorSerializer
+
+
+class FastReviewSerializer(ValuesSerializer):
+    serializer_class = ReviewSerializer
+
+
+class FastCartCourseSerializer(ValuesSerializer):
+    serializer_class = CartCourseSerializer
+
+
+class FastCourseRecommendationSerializer(ValuesSerializer):
+    serializer_class = CourseRecommendationSerializer
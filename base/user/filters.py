@@ -0,0 +1,55 @@
+from django.db.models import Exists, OuterRef
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Category, Course, Tag, subtree_q
+
+
+class DjangoFilterBackend(BaseFilterBackend):
+    """django-filter's backend, imported on first use instead of at startup.
+
+    The package costs more to import than the rest of the filtering stack,
+    and it is not in INSTALLED_APPS for the same reason; add it there
+    before giving a view ``filterset_fields``, as the browsable API form
+    needs its templates.
+    """
+
+    def __init__(self):
+        from django_filters.rest_framework import DjangoFilterBackend
+        self.backend = DjangoFilterBackend()
+
+    def filter_queryset(self, request, queryset, view):
+        return self.backend.filter_queryset(request, queryset, view)
+
+    def to_html(self, request, queryset, view):
+        return self.backend.to_html(request, queryset, view)
+
+    def get_schema_operation_parameters(self, view):
+        return self.backend.get_schema_operation_parameters(view)
+
+
+class CatalogFilter(BaseFilterBackend):
+    """Course list filters backed by indexes instead of title searches.
+
+    ``?category=<id>`` keeps courses in that category or any below it (one
+    range scan of the courses' copied category path); ``?tag=<slug>`` may be
+    repeated and every tag must match.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        category = request.query_params.get('category')
+        if category:
+            path = Category.objects.filter(pk=category).values_list('path', flat=True).first() \
+                if category.isdigit() else None
+            if path is None:
+                return queryset.none()
+            queryset = queryset.filter(subtree_q(path, 'category_path'))
+
+        slugs = set(request.query_params.getlist('tag'))
+        if slugs:
+            tag_ids = list(Tag.objects.filter(slug__in=slugs).values_list('pk', flat=True))
+            if len(tag_ids) < len(slugs):
+                return queryset.none()
+            links = Course.tags.through.objects.filter(course_id=OuterRef('pk'))
+            for tag_id in tag_ids:
+                queryset = queryset.filter(Exists(links.filter(tag_id=tag_id)))
+        return queryset
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+
+# Each hasher keeps the stock algorithm name, so hashes made with other
+# parameters still verify and Django's must_update() rehashes them to the
+# configured cost on the next successful login.
+
+
+def _cost(name, default):
+    return getattr(settings, 'PASSWORD_HASH_COST', {}).get(name) or default
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        return _cost('pbkdf2_iterations', PBKDF2PasswordHasher.iterations)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    @property
+    def work_factor(self):
+        return _cost('scrypt_work_factor', ScryptPasswordHasher.work_factor)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        return _cost('argon2_time_cost', Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return _cost('argon2_memory_cost', Argon2PasswordHasher.memory_cost)
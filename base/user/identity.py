@@ -0,0 +1,42 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+_jwt = JWTAuthentication()
+
+
+def token_claims(request):
+    """Return the validated access token's claims, or None.
+
+    Only the signature and expiry are checked; the user row is not loaded,
+    so this is safe to call before authentication and from middleware.
+    """
+    header = _jwt.get_header(request)
+    if header is None:
+        return None
+
+    raw_token = _jwt.get_raw_token(header)
+    if raw_token is None:
+        return None
+
+    try:
+        return _jwt.get_validated_token(raw_token)
+    except (InvalidToken, TokenError):
+        return None
+
+
+def request_user_id(request):
+    """Best effort user id for ``request`` before authentication runs.
+
+    JWT clients are identified from the token alone. Session users need
+    SessionMiddleware to have run; their session is loaded here instead of
+    in AuthenticationMiddleware, so it costs no extra query.
+    """
+    claims = token_claims(request)
+    if claims is not None:
+        return claims.get(api_settings.USER_ID_CLAIM)
+
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return session.get('_auth_user_id')
+    return None
@@ -0,0 +1,206 @@
+"""
+Time-decayed course popularity.
+
+A course's score is ``sum(weight * 2 ** (-age / half_life))`` over its cart
+adds, watchlist adds and reviews. Every score decays at the same rate, so
+the ordering only changes when an event arrives: events are stored as
+``log(weight) + rate * (t - EPOCH)`` and combined with ``logaddexp``, which
+keeps the sorted lists valid without periodic re-scoring.
+
+Each process keeps the ranking in sorted lists (``bisect`` gives O(log n)
+rank lookups and top-N slices) and every ``LEADERBOARD_FLUSH_SECONDS`` merges
+its new events into ``CoursePopularity`` and reloads the table, so events
+seen by other workers show up too. There is one board per tenant, holding
+that tenant's courses; ``current()`` returns the active tenant's. Within a
+board, courses are also ranked per top-level category (the group is the
+root id of the course's category path), picked up on each reload.
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Cartitems, CoursePopularity, Review, Watchitems, path_ids
+from .tenancy import current_tenant_id
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+CART_WEIGHT = 3.0
+WATCHLIST_WEIGHT = 1.0
+REVIEW_WEIGHT = 2.0
+
+
+def decay_rate():
+    return math.log(2) / (settings.LEADERBOARD_HALF_LIFE_HOURS * 3600)
+
+
+def log_event(weight, at):
+    return math.log(weight) + decay_rate() * (at - EPOCH).total_seconds()
+
+
+def logaddexp(a, b):
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+class Leaderboard:
+    def __init__(self, tenant_id=None):
+        self.tenant_id = tenant_id
+        self._lock = threading.RLock()
+        self._scores = {}
+        self._groups = {}
+        self._ranked = {None: []}
+        self._pending = {}
+        self._last_sync = None
+
+    # ------------------------------- reads -------------------------------
+
+    def top(self, limit, group=None):
+        """Return ``[(course_id, score), ...]`` for the best ``limit`` courses."""
+        self.sync_if_due()
+        now = timezone.now()
+        with self._lock:
+            ranked = self._ranked.get(group, [])[:limit]
+            return [(course_id, self.current_score(-key, now)) for key, course_id in ranked]
+
+    def rank(self, course_id, group=None):
+        """1-based position of ``course_id`` overall or within ``group``."""
+        self.sync_if_due()
+        with self._lock:
+            score = self._scores.get(course_id)
+            if score is None or (group is not None and self._groups.get(course_id) != group):
+                return None
+            return bisect_left(self._ranked[group], (-score, course_id)) + 1
+
+    def current_score(self, log_score, now=None):
+        now = now or timezone.now()
+        return math.exp(log_score - decay_rate() * (now - EPOCH).total_seconds())
+
+    # ------------------------------- writes -------------------------------
+
+    def record(self, course_id, weight, at=None, group=None):
+        event = log_event(weight, at or timezone.now())
+        with self._lock:
+            if group is not None:
+                self.set_group(course_id, group)
+            self._pending[course_id] = logaddexp(self._pending.get(course_id), event)
+            self._set(course_id, logaddexp(self._scores.get(course_id), event))
+        self.sync_if_due()
+
+    def set_group(self, course_id, group):
+        with self._lock:
+            score = self._scores.get(course_id)
+            if score is not None:
+                self._unlink(course_id, score)
+            self._groups[course_id] = group
+            if score is not None:
+                self._link(course_id, score)
+
+    def _set(self, course_id, score):
+        old = self._scores.get(course_id)
+        if old is not None:
+            self._unlink(course_id, old)
+        self._scores[course_id] = score
+        self._link(course_id, score)
+
+    def _link(self, course_id, score):
+        insort(self._ranked[None], (-score, course_id))
+        group = self._groups.get(course_id)
+        if group is not None:
+            insort(self._ranked.setdefault(group, []), (-score, course_id))
+
+    def _unlink(self, course_id, score):
+        for group in (None, self._groups.get(course_id)):
+            ranked = self._ranked.get(group)
+            if ranked is None:
+                continue
+            index = bisect_left(ranked, (-score, course_id))
+            if index < len(ranked) and ranked[index] == (-score, course_id):
+                del ranked[index]
+
+    # ------------------------------- persistence -------------------------------
+
+    def sync_if_due(self):
+        if self._last_sync is None or time.monotonic() - self._last_sync >= settings.LEADERBOARD_FLUSH_SECONDS:
+            self.sync()
+
+    def sync(self):
+        """Merge this process's new events into the table and reload it."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_sync = time.monotonic()
+
+        if pending:
+            with transaction.atomic():
+                stored = dict(CoursePopularity.objects.select_for_update()
+                              .filter(course_id__in=list(pending))
+                              .values_list('course_id', 'log_score'))
+                CoursePopularity.objects.bulk_create(
+                    [CoursePopularity(course_id=course_id,
+                                      log_score=logaddexp(stored.get(course_id), score))
+                     for course_id, score in pending.items()],
+                    update_conflicts=True, unique_fields=['course'],
+                    update_fields=['log_score', 'updated_at'])
+
+        rows = CoursePopularity.objects.all()
+        if self.tenant_id is not None:
+            rows = rows.filter(course__tenant_id=self.tenant_id)
+        self.load(rows.values_list('course_id', 'log_score', 'course__category_path'))
+
+    def load(self, rows):
+        """Replace the ranking with ``(course_id, log_score, category_path)`` rows."""
+        with self._lock:
+            self._scores = {}
+            self._groups = {}
+            self._ranked = {None: []}
+            for course_id, score, category_path in rows:
+                # Events recorded since the last sync are not stored yet.
+                self._scores[course_id] = logaddexp(self._pending.get(course_id), score)
+                if category_path:
+                    self._groups[course_id] = path_ids(category_path)[0]
+            for course_id, score in self._scores.items():
+                self._link(course_id, score)
+
+
+_boards = {}
+_boards_lock = threading.Lock()
+
+
+def current():
+    """The active tenant's board (all courses when no tenant is active)."""
+    tenant_id = current_tenant_id()
+    board = _boards.get(tenant_id)
+    if board is None:
+        with _boards_lock:
+            board = _boards.setdefault(tenant_id, Leaderboard(tenant_id))
+    return board
+
+
+def rebuild():
+    """Replay every cart add, watchlist add and review into the table."""
+    scores = {}
+
+    def replay(rows, weight):
+        for course_id, at in rows.iterator(chunk_size=2000):
+            scores[course_id] = logaddexp(scores.get(course_id), log_event(weight, at))
+
+    replay(Cartitems.objects.filter(course__isnull=False)
+           .values_list('course_id', 'cart__created'), CART_WEIGHT)
+    replay(Watchitems.objects.values_list('course_id', 'watchlist__created'), WATCHLIST_WEIGHT)
+    replay(Review.objects.values_list('course_id', 'created_at'), REVIEW_WEIGHT)
+
+    with transaction.atomic():
+        CoursePopularity.objects.all().delete()
+        CoursePopularity.objects.bulk_create(
+            [CoursePopularity(course_id=course_id, log_score=score)
+             for course_id, score in scores.items()],
+            batch_size=1000)
+    return len(scores)
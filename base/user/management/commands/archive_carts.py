@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from user.archive import archive_carts, prune_watchlists
+
+
+class Command(BaseCommand):
+    help = 'Move old completed and abandoned carts to the archive tables and prune empty watchlists.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows per transaction (default ARCHIVE_BATCH_SIZE).')
+        parser.add_argument('--delete', action='store_true',
+                            help='Delete stale carts instead of archiving them.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count what would be moved.')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between batches, to let replicas keep up.')
+
+    def handle(self, *args, **options):
+        log = self.stdout.write if options['verbosity'] > 1 else None
+        carts = archive_carts(options['batch_size'], options['delete'], options['dry_run'],
+                              options['pause'], log)
+        watchlists = prune_watchlists(options['batch_size'], options['dry_run'], options['pause'])
+
+        verb = 'Would move' if options['dry_run'] else 'Deleted' if options['delete'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {carts['completed']} completed and {carts['abandoned']} abandoned carts; "
+            f"{'would prune' if options['dry_run'] else 'pruned'} {watchlists} watchlists."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from user.benchmarks import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = 'Run micro benchmarks against a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*',
+                            help=f'Any of: {", ".join(sorted(SCENARIOS))}')
+        parser.add_argument('--number', type=int, default=20,
+                            help='Iterations per measurement.')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or sorted(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        try:
+            for name in names:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                for label, value, unit in SCENARIOS[name](options['number']):
+                    shown = '-' if value is None else f'{value:,.2f}'
+                    self.stdout.write(f'  {label:<40} {shown:>14} {unit}')
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
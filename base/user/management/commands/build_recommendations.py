@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from user.recommendations import build_all
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the course-to-course recommendation table (needs numpy and scipy).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=None,
+                            help='Neighbours kept per course.')
+
+    def handle(self, *args, **options):
+        try:
+            rows = build_all(options['top_k'])
+        except ImportError as exc:
+            raise CommandError(f'build_recommendations needs numpy and scipy: {exc}')
+
+        self.stdout.write(self.style.SUCCESS(f'Stored {rows} recommendations.'))
@@ -0,0 +1,42 @@
+from subprocess import CalledProcessError
+
+from django.core.management.base import BaseCommand, CommandError
+
+from user.startup import measure_boot, package_totals
+
+
+class Command(BaseCommand):
+    help = 'Profile a cold start: import time per module and time to first request.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/courses/',
+                            help='Path of the request served after boot.')
+        parser.add_argument('--limit', type=int, default=25,
+                            help='Rows shown per table.')
+        parser.add_argument('--depth', type=int, default=2,
+                            help='Package depth used for the per-package totals.')
+
+    def handle(self, *args, **options):
+        try:
+            phases, imports = measure_boot(options['path'], importtime=True)
+        except CalledProcessError as exc:
+            raise CommandError(f'Boot failed:\n{exc.stderr}')
+
+        limit = options['limit']
+        status = phases.pop('status')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Phases (GET {options["path"]} -> {status})'))
+        for label, seconds in phases.items():
+            self.stdout.write(f'  {label:<40} {seconds * 1000:>10.1f} ms')
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Packages by self time (depth {options["depth"]})'))
+        for name, self_us in package_totals(imports, options['depth']).most_common(limit):
+            self.stdout.write(f'  {name:<40} {self_us / 1000:>10.1f} ms')
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Top-level imports by cumulative time'))
+        roots = sorted((row for row in imports if row[3] == 0), key=lambda row: -row[2])
+        for name, _, cumulative_us, _ in roots[:limit]:
+            self.stdout.write(f'  {name:<40} {cumulative_us / 1000:>10.1f} ms')
+
+        total = sum(row[1] for row in imports)
+        self.stdout.write(f'\n{len(imports)} modules imported in {total / 1000:.1f} ms')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user.categories import rebuild_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute course category paths and the course counts of every category and tag.'
+
+    def handle(self, *args, **options):
+        categories, tags = rebuild_counts()
+        self.stdout.write(self.style.SUCCESS(f'Recounted {categories} categories and {tags} tags.'))
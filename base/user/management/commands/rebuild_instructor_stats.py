@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user.stats import rebuild_instructor_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the instructor stats table from courses, reviews and carts.'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_instructor_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} instructors.'))
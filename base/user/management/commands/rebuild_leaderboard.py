@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from user.leaderboard import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Replay carts, watchlists and reviews into the course popularity table.'
+
+    def handle(self, *args, **kwargs):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Scored {count} courses.'))
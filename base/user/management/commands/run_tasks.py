@@ -0,0 +1,97 @@
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+
+from user.models import Task
+from user.taskqueue import get_task
+
+
+class Command(BaseCommand):
+    help = 'Run tasks queued by the database task backend.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--sleep', type=float, default=1.0,
+                            help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--lease', type=int, default=None,
+                            help='Seconds before an unfinished claimed task is retried '
+                                 '(default TASK_LEASE_SECONDS).')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit.')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            self.reclaim_expired(options['lease'] or settings.TASK_LEASE_SECONDS,
+                                 options['max_attempts'])
+            processed = self.run_batch(
+                options['batch_size'], options['max_attempts'])
+
+            if options['once'] and not processed:
+                break
+            if not processed:
+                time.sleep(options['sleep'])
+
+    def reclaim_expired(self, lease, max_attempts):
+        """Queue again the tasks of workers that died mid-run.
+
+        The lost run counts as an attempt, so a task that kills its worker
+        every time still ends up FAILED instead of looping forever.
+        """
+        expired = Task.objects.filter(
+            status=Task.RUNNING, claimed_at__lt=timezone.now() - timedelta(seconds=lease))
+        failed = expired.filter(attempts__gte=max_attempts - 1).update(
+            status=Task.FAILED, attempts=F('attempts') + 1, claimed_at=None,
+            last_error='Worker lease expired.')
+        requeued = expired.update(
+            status=Task.PENDING, attempts=F('attempts') + 1, claimed_at=None,
+            last_error='Worker lease expired.', run_after=timezone.now())
+        if failed or requeued:
+            self.stderr.write(f'Reclaimed {requeued} expired tasks, failed {failed}')
+
+    def run_batch(self, batch_size, max_attempts):
+        now = timezone.now()
+        candidates = Task.objects.filter(
+            status=Task.PENDING, run_after__lte=now
+        ).order_by('id').values_list('id', flat=True)[:batch_size]
+
+        processed = 0
+        for task_id in list(candidates):
+            # Claim with a conditional update so several workers can share
+            # the table without row locks.
+            claimed = Task.objects.filter(
+                pk=task_id, status=Task.PENDING
+            ).update(status=Task.RUNNING, claimed_at=timezone.now())
+            if not claimed:
+                continue
+
+            self.run_job(Task.objects.get(pk=task_id), max_attempts)
+            processed += 1
+
+        return processed
+
+    def run_job(self, job, max_attempts):
+        job.attempts += 1
+        try:
+            get_task(job.name)(*job.args, **job.kwargs)
+        except Exception:
+            job.last_error = traceback.format_exc()
+            if job.attempts < max_attempts:
+                job.status = Task.PENDING
+                job.run_after = timezone.now() + timedelta(seconds=2 ** job.attempts)
+            else:
+                job.status = Task.FAILED
+            self.stderr.write(f'{job.name} failed (attempt {job.attempts})')
+        else:
+            job.status = Task.DONE
+            job.last_error = ''
+
+        job.claimed_at = None
+        job.save(update_fields=['status', 'attempts', 'last_error', 'run_after', 'claimed_at'])
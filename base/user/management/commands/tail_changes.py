@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from user.changes import commit_position, consumer_position, prune_changes, read_changes
+from user.renderers import dumps
+
+
+class Command(BaseCommand):
+    help = 'Print change events as JSON lines, in stream order.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--after', type=int, default=None,
+                            help='Start after this position (default 0, or the consumer position).')
+        parser.add_argument('--consumer', default=None,
+                            help='Resume from and save the position of this named consumer.')
+        parser.add_argument('--model', action='append', default=[],
+                            help='Only these streams (course, review, cartitem, watchitem).')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--follow', action='store_true',
+                            help='Keep polling for new events.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds between polls with --follow.')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete read events older than CHANGES_RETENTION_DAYS and exit.')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            deleted = prune_changes()
+            self.stdout.write(self.style.SUCCESS(f'Pruned {deleted} change events.'))
+            return
+
+        consumer = options['consumer']
+        after = options['after']
+        if after is None:
+            after = consumer_position(consumer) if consumer else 0
+
+        while True:
+            events = read_changes(after, options['batch_size'], options['model'])
+            for event in events:
+                self.stdout.write(dumps(event).decode())
+            if events:
+                after = events[-1]['position']
+                # Saved after the batch is written: delivery is at least once.
+                if consumer:
+                    commit_position(consumer, after)
+                continue
+            if not options['follow']:
+                return
+            time.sleep(options['interval'])
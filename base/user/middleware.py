@@ -0,0 +1,102 @@
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from .db_routers import routing
+from .identity import request_user_id
+from .tenancy import resolve_tenant, use_tenant
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'primary_pin'
+
+
+class TenantMiddleware:
+    """Serve each request as its tenant, see user/tenancy.py."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant = resolve_tenant(request)
+        with use_tenant(request.tenant):
+            return self.get_response(request)
+
+
+class ReplicaRoutingMiddleware:
+    """Read safe-method requests from replicas, with read-your-writes.
+
+    A request that writes pins its client to the primary for
+    ``REPLICA_PIN_SECONDS``: by user id in the cache (works for JWT and
+    session users across devices) and by cookie (works for anonymous
+    browsers). Must sit below SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        user_id = request_user_id(request)
+        use_replica = (
+            request.method in SAFE_METHODS
+            and PIN_COOKIE not in request.COOKIES
+            and not (user_id and cache.get(self.pin_key(user_id)))
+        )
+
+        with routing(use_replica) as state:
+            response = self.get_response(request)
+
+        if state.wrote:
+            seconds = settings.REPLICA_PIN_SECONDS
+            user_id = user_id or getattr(getattr(request, 'user', None), 'pk', None)
+            if user_id:
+                cache.set(self.pin_key(user_id), True, seconds)
+            response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True)
+        return response
+
+    def pin_key(self, user_id):
+        return f'replica-pin:{user_id}'
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Compress responses over ``COMPRESSION_MIN_BYTES``.
+
+    Brotli is used for JSON when the client accepts it and the ``brotli``
+    package is installed, gzip otherwise. Brotli has nowhere to put the
+    random bytes GZipMiddleware adds against BREACH, so pages that embed a
+    CSRF token (HTML forms, the admin, the browsable API) always get gzip.
+    Small bodies are left alone; compressing them costs more CPU than the
+    bytes saved are worth.
+    """
+
+    accepts_br = re.compile(r'\bbr\b')
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+        if (brotli is None or response.streaming or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith('application/json')
+                or not self.accepts_br.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
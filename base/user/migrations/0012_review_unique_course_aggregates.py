@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:22
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def drop_duplicate_reviews(apps, schema_editor):
+    # Keep the newest review for each (user, course) pair.
+    Review = apps.get_model('user', 'Review')
+    duplicates = (Review.objects.values('user_id', 'course_id')
+                  .annotate(keep=Max('id'), count=Count('id'))
+                  .filter(count__gt=1))
+    for row in duplicates:
+        Review.objects.filter(
+            user_id=row['user_id'], course_id=row['course_id']
+        ).exclude(id=row['keep']).delete()
+
+
+def backfill_course_aggregates(apps, schema_editor):
+    Course = apps.get_model('user', 'Course')
+    Review = apps.get_model('user', 'Review')
+    aggregates = (Review.objects.values('course_id')
+                  .annotate(count=Count('id'), total=Sum('rating')))
+    for row in aggregates:
+        Course.objects.filter(pk=row['course_id']).update(
+            review_count=row['count'], rating_total=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0010_order_enrollment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='review',
+            name='rating',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.RunPython(drop_duplicate_reviews, migrations.RunPython.noop),
+        migrations.RunPython(backfill_course_aggregates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('user', 'course'), name='review_user_course'),
+        ),
+    ]
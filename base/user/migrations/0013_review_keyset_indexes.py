@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0012_review_unique_course_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='review_course_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['course', 'rating', 'created_at', 'id'], name='review_course_rating_idx'),
+        ),
+    ]
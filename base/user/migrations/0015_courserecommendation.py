@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0014_blog_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='user.course')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='user.course')),
+            ],
+            options={
+                'ordering': ['course', 'rank'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='courserecommendation',
+            constraint=models.UniqueConstraint(fields=('course', 'rank'), name='recommendation_course_rank'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0015_courserecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoursePopularity',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='user.course')),
+                ('log_score', models.FloatField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
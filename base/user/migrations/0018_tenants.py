@@ -0,0 +1,91 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import user.tenancy
+
+TENANT_MODELS = ['blog', 'cart', 'course', 'customuser']
+
+
+def create_default_tenant(apps, schema_editor):
+    # Everything that exists today belongs to the single current deployment.
+    Tenant = apps.get_model('user', 'Tenant')
+    tenant, _ = Tenant.objects.get_or_create(
+        slug=settings.DEFAULT_TENANT, defaults={'name': settings.DEFAULT_TENANT.title()})
+    for model_name in TENANT_MODELS:
+        apps.get_model('user', model_name).objects.update(tenant=tenant)
+
+
+def tenant_field(related_name, null):
+    if null:
+        return models.ForeignKey(
+            null=True, on_delete=django.db.models.deletion.PROTECT,
+            related_name=related_name, to='user.tenant')
+    return models.ForeignKey(
+        default=user.tenancy.default_tenant_id, on_delete=django.db.models.deletion.PROTECT,
+        related_name=related_name, to='user.tenant')
+
+
+RELATED_NAMES = {'blog': 'blogs', 'cart': 'carts', 'course': 'courses', 'customuser': 'users'}
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0017_cart_completed_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tenant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField(unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('domain', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        *[
+            migrations.AddField(
+                model_name=model_name, name='tenant',
+                field=tenant_field(RELATED_NAMES[model_name], null=True))
+            for model_name in TENANT_MODELS
+        ],
+        migrations.RunPython(create_default_tenant, migrations.RunPython.noop),
+        *[
+            migrations.AlterField(
+                model_name=model_name, name='tenant',
+                field=tenant_field(RELATED_NAMES[model_name], null=False))
+            for model_name in TENANT_MODELS
+        ],
+        migrations.RemoveIndex(
+            model_name='blog',
+            name='blog_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cart',
+            name='cart_completed_idx',
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['tenant', 'created_at', 'id'], name='blog_tenant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['tenant', 'completed', 'created'], name='cart_tenant_completed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['tenant', 'created_at'], name='course_tenant_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['tenant', 'is_student'], name='user_tenant_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['tenant', 'is_instructor'], name='user_tenant_instructor_idx'),
+        ),
+    ]
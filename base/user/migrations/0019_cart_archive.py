@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_updated(apps, schema_editor):
+    # Existing carts have no activity record; treat them as last touched
+    # when they were created.
+    Cart = apps.get_model('user', 'Cart')
+    Cart.objects.update(updated=models.F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0018_tenants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCart',
+            fields=[
+                ('id', models.UUIDField(primary_key=True, serialize=False)),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('completed', models.BooleanField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedCartitem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='updated',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(backfill_updated, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['user', '-created'], name='cart_open_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['tenant', 'updated'], name='cart_open_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedcartitem',
+            name='cart',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='user.archivedcart'),
+        ),
+        migrations.AddField(
+            model_name='archivedcartitem',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='user.course'),
+        ),
+        migrations.AddField(
+            model_name='archivedcart',
+            name='order',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_cart', to='user.order'),
+        ),
+        migrations.AddField(
+            model_name='archivedcart',
+            name='tenant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_carts', to='user.tenant'),
+        ),
+        migrations.AddField(
+            model_name='archivedcart',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_carts', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 4.2.30 on 2026-10-19 18:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+import user.tenancy
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0020_change_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(max_length=100)),
+                ('path', models.CharField(default='', editable=False, max_length=255)),
+                ('course_count', models.PositiveIntegerField(default=0, editable=False)),
+            ],
+            options={
+                'verbose_name_plural': 'categories',
+                'ordering': ['path'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('slug', models.SlugField()),
+                ('course_count', models.PositiveIntegerField(default=0, editable=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='category_path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['tenant', 'category_path'], name='course_tenant_category_idx'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='tenant',
+            field=models.ForeignKey(default=user.tenancy.default_tenant_id, on_delete=django.db.models.deletion.PROTECT, related_name='tags', to='user.tenant'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='user.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='tenant',
+            field=models.ForeignKey(default=user.tenancy.default_tenant_id, on_delete=django.db.models.deletion.PROTECT, related_name='categories', to='user.tenant'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='courses', to='user.category'),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='courses', to='user.tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('tenant', 'slug'), name='tag_tenant_slug'),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='category_path_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='category',
+            constraint=models.UniqueConstraint(fields=('tenant', 'slug'), name='category_tenant_slug'),
+        ),
+    ]
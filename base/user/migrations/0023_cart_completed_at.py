@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:12
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_completed_at(apps, schema_editor):
+    # The order was placed when its cart was checked out; carts without one
+    # fall back to their last activity.
+    Cart = apps.get_model('user', 'Cart')
+    Order = apps.get_model('user', 'Order')
+    checked_out = Order.objects.filter(cart=models.OuterRef('pk')).values('created_at')[:1]
+    Cart.objects.filter(completed=True).update(
+        completed_at=Coalesce(models.Subquery(checked_out), models.F('updated')))
+
+
+def archive_duplicate_open_carts(apps, schema_editor):
+    # Only the newest open cart of a user was ever read; archive the others
+    # so the one-open-cart constraint can be added.
+    Cart = apps.get_model('user', 'Cart')
+    Cartitems = apps.get_model('user', 'Cartitems')
+    ArchivedCart = apps.get_model('user', 'ArchivedCart')
+    ArchivedCartitem = apps.get_model('user', 'ArchivedCartitem')
+    users = (Cart.objects.filter(completed=False, user__isnull=False)
+             .values('user').annotate(n=models.Count('pk')).filter(n__gt=1).values_list('user', flat=True))
+    for user_id in users:
+        carts = list(Cart.objects.filter(user_id=user_id, completed=False).order_by('-created')[1:])
+        ids = [cart.pk for cart in carts]
+        ArchivedCart.objects.bulk_create([
+            ArchivedCart(id=cart.pk, tenant_id=cart.tenant_id, user_id=cart.user_id, created=cart.created,
+                         updated=cart.updated, completed=False)
+            for cart in carts
+        ])
+        ArchivedCartitem.objects.bulk_create([
+            ArchivedCartitem(cart_id=cart_id, course_id=course_id)
+            for cart_id, course_id in Cartitems.objects.filter(cart_id__in=ids).values_list('cart_id', 'course_id')
+        ])
+        Cartitems.objects.filter(cart_id__in=ids).delete()
+        Cart.objects.filter(pk__in=ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0022_task_claimed_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='cart',
+            name='cart_tenant_completed_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='cart',
+            name='cart_open_user_idx',
+        ),
+        migrations.AddField(
+            model_name='archivedcart',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_completed_at, migrations.RunPython.noop),
+        migrations.RunPython(archive_duplicate_open_carts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['tenant', 'completed', 'completed_at'], name='cart_tenant_completed_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='cart',
+            constraint=models.UniqueConstraint(condition=models.Q(('completed', False)), fields=('user',), name='cart_one_open_per_user'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:15
+
+from django.db import migrations, models
+
+
+def backfill_positions(apps, schema_editor):
+    # Existing events keep their id as position, so saved consumer
+    # positions stay valid; new positions continue after them.
+    ChangeEvent = apps.get_model('user', 'ChangeEvent')
+    ChangeSequence = apps.get_model('user', 'ChangeSequence')
+    ChangeEvent.objects.update(position=models.F('id'))
+    last = ChangeEvent.objects.aggregate(last=models.Max('id'))['last']
+    ChangeSequence.objects.create(pk=1, position=last or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0023_cart_completed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='changeevent',
+            name='change_model_id_idx',
+        ),
+        migrations.AddField(
+            model_name='changeevent',
+            name='position',
+            field=models.BigIntegerField(blank=True, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='changeevent',
+            name='op',
+            field=models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('archive', 'Archive')], max_length=7),
+        ),
+        migrations.AddIndex(
+            model_name='changeevent',
+            index=models.Index(fields=['model', 'position'], name='change_model_position_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0024_change_positions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.TextField()),
+                ('status', models.PositiveSmallIntegerField()),
+                ('duration_ms', models.FloatField()),
+                ('engine', models.CharField(max_length=32)),
+                ('sampled', models.BooleanField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('summary', models.TextField()),
+                ('data', models.BinaryField()),
+            ],
+        ),
+    ]
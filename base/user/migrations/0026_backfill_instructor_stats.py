@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+
+COUNTERS = ('course_count', 'review_count', 'rating_total', 'students')
+
+
+def backfill_instructor_stats(apps, schema_editor):
+    # What manage.py rebuild_instructor_stats computes; without it the
+    # counters of existing instructors would start from zero.
+    CustomUser = apps.get_model('user', 'CustomUser')
+    Course = apps.get_model('user', 'Course')
+    Review = apps.get_model('user', 'Review')
+    Cartitems = apps.get_model('user', 'Cartitems')
+    ArchivedCartitem = apps.get_model('user', 'ArchivedCartitem')
+    InstructorStats = apps.get_model('user', 'InstructorStats')
+
+    rows = {}
+
+    def collect(field, queryset):
+        for instructor_id, value in queryset:
+            rows.setdefault(instructor_id, dict.fromkeys(COUNTERS, 0))
+            rows[instructor_id][field] += value or 0
+
+    collect('course_count', Course.objects.values('instructor_id')
+            .annotate(value=Count('id')).values_list('instructor_id', 'value'))
+    reviews = (Review.objects.values('course__instructor_id')
+               .annotate(count=Count('id'), total=Sum('rating')))
+    collect('review_count', reviews.values_list('course__instructor_id', 'count'))
+    collect('rating_total', reviews.values_list('course__instructor_id', 'total'))
+    for items in (Cartitems, ArchivedCartitem):
+        collect('students', items.objects.filter(cart__completed=True, course__isnull=False)
+                .values('course__instructor_id')
+                .annotate(value=Count('cart_id', distinct=True))
+                .values_list('course__instructor_id', 'value'))
+
+    instructors = CustomUser.objects.filter(
+        Q(is_instructor=True) | Q(pk__in=list(rows))).values_list('pk', flat=True)
+    InstructorStats.objects.all().delete()
+    InstructorStats.objects.bulk_create([
+        InstructorStats(instructor_id=pk, **rows.get(pk, dict.fromkeys(COUNTERS, 0)))
+        for pk in instructors
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0025_request_profiles'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_instructor_stats, migrations.RunPython.noop),
+    ]
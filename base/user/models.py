@@ -2,10 +2,108 @@
 import uuid
 from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, models, router, transaction
 
+from .tenancy import current_tenant_id, default_tenant_id, use_tenant
 
-class CustomUserManager(BaseUserManager):
+
+class Tenant(models.Model):
+    """A partner academy; see user/tenancy.py."""
+    slug = models.SlugField(unique=True)
+    name = models.CharField(max_length=255)
+    # Requests for this host are served as this tenant.
+    domain = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class TenantQuerySet(models.QuerySet):
+    """Rows of the active tenant.
+
+    The filter is added when the queryset runs, not when it is built, so a
+    queryset built once and reused (a view's class level ``queryset``) is
+    right for every request's tenant. Querysets used as subqueries of
+    another query are not scoped.
+
+    Models without a ``tenant`` column of their own name the path to one in
+    ``tenant_lookup`` (``'course__tenant_id'``) and are scoped through it.
+    """
+
+    scoped_tenant_id = None
+
+    def _tenant_q(self, tenant_id):
+        return models.Q(**{getattr(self.model, 'tenant_lookup', 'tenant_id'): tenant_id})
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.scoped_tenant_id = self.scoped_tenant_id
+        return clone
+
+    def _pending_tenant_id(self):
+        tenant_id = current_tenant_id()
+        return None if tenant_id == self.scoped_tenant_id else tenant_id
+
+    def scoped(self):
+        tenant_id = self._pending_tenant_id()
+        if tenant_id is None:
+            return self
+        clone = self._chain()
+        clone.query.add_q(self._tenant_q(tenant_id))
+        clone.scoped_tenant_id = tenant_id
+        return clone
+
+    def _fetch_all(self):
+        # Results are cached on this queryset, so scoping it in place is fine.
+        tenant_id = self._result_cache is None and self._pending_tenant_id()
+        if tenant_id:
+            self.query.add_q(self._tenant_q(tenant_id))
+            self.scoped_tenant_id = tenant_id
+        super()._fetch_all()
+
+    def iterator(self, *args, **kwargs):
+        return super(TenantQuerySet, self.scoped()).iterator(*args, **kwargs)
+
+    def count(self):
+        return super(TenantQuerySet, self.scoped()).count()
+
+    def exists(self):
+        return super(TenantQuerySet, self.scoped()).exists()
+
+    def aggregate(self, *args, **kwargs):
+        return super(TenantQuerySet, self.scoped()).aggregate(*args, **kwargs)
+
+    def update(self, **kwargs):
+        return super(TenantQuerySet, self.scoped()).update(**kwargs)
+
+    def delete(self):
+        return super(TenantQuerySet, self.scoped()).delete()
+
+
+TenantManager = models.Manager.from_queryset(TenantQuerySet)
+
+
+class TenantUniqueMixin:
+    """Run model unique checks across every tenant.
+
+    ``validate_unique`` queries ``_default_manager``, which is scoped to the
+    active tenant, so a value taken in another tenant would pass validation
+    and then fail in the database with an ``IntegrityError``.
+    """
+
+    def validate_unique(self, exclude=None):
+        with use_tenant(None):
+            super().validate_unique(exclude)
+
+    def validate_constraints(self, exclude=None):
+        with use_tenant(None):
+            super().validate_constraints(exclude)
+
+
+class CustomUserManager(TenantManager, BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('Users must have an email address')
@@ -22,7 +120,9 @@ class CustomUserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class CustomUser(AbstractBaseUser, PermissionsMixin):
+class CustomUser(TenantUniqueMixin, AbstractBaseUser, PermissionsMixin):
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.PROTECT, default=default_tenant_id, related_name='users')
     email = models.EmailField(unique=True)
     name = models.CharField(max_length=30, null=True, blank=True)
     username = models.CharField(max_length=30, null=True, blank=True)
@@ -34,15 +134,23 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     is_staff = models.BooleanField(default=False)
 
     objects = CustomUserManager()
+    all_tenants = BaseUserManager()
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['tenant', 'is_student'], name='user_tenant_student_idx'),
+            models.Index(fields=['tenant', 'is_instructor'], name='user_tenant_instructor_idx'),
+        ]
+
     def __str__(self):
-        return self.username
+        # createsuperuser leaves username empty.
+        return self.username or self.email
 
 
-class InstructorProfile(models.Model):
+class InstructorProfile(TenantUniqueMixin, models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     profile_pics = models.ImageField(
         default='default.png', upload_to='profile_pics')
@@ -52,8 +160,12 @@ class InstructorProfile(models.Model):
         max_length=255, default='', null=True, blank=True)
     account_number = models.CharField(max_length=255, null=True, blank=True)
 
+    tenant_lookup = 'user__tenant_id'
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
     def __str__(self):
-        return self.user.username
+        return str(self.user)
 
     @property
     def imageURL(self):
@@ -64,14 +176,18 @@ class InstructorProfile(models.Model):
         return url
 
 
-class StudentProfile(models.Model):
+class StudentProfile(TenantUniqueMixin, models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE)
     profile_pics = models.ImageField(
         default='default.png', upload_to='profile_pics')
     bio = models.TextField(null=True, blank=True)
 
+    tenant_lookup = 'user__tenant_id'
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
     def __str__(self):
-        return self.user.username
+        return str(self.user)
 
     @property
     def imageURL(self):
@@ -82,7 +198,136 @@ class StudentProfile(models.Model):
         return url
 
 
-class Course(models.Model):
+class CapturedModel(models.Model):
+    """A model whose changes are written to the ``ChangeEvent`` outbox.
+
+    ``save()`` runs in a transaction so the event appended by the
+    ``post_save`` receiver commits or rolls back together with the row;
+    ``delete()`` already sends ``post_delete`` inside its transaction.
+    """
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+
+
+def subtree_q(path, field='path'):
+    """Rows whose materialized ``field`` is ``path`` or below it.
+
+    Paths are ``/<id>/<id>/.../`` built from digits and slashes, and ``0``
+    sorts right after ``/``, so a subtree is one range of an ordinary
+    B-tree index on any backend (``LIKE 'x%'`` is not, on SQLite or on
+    PostgreSQL without a pattern opclass).
+    """
+    return models.Q(**{f'{field}__gte': path, f'{field}__lt': path[:-1] + '0'})
+
+
+def path_ids(path):
+    """``'/1/4/9/'`` -> ``[1, 4, 9]``."""
+    return [int(part) for part in path.strip('/').split('/') if part]
+
+
+class Category(TenantUniqueMixin, models.Model):
+    """A node of the course category tree.
+
+    ``path`` lists the ids from the root down to this node, and courses
+    copy their category's path, so "courses under X, descendants included"
+    is one range scan of ``course_tenant_category_idx``. ``course_count``
+    covers the whole subtree and is kept up to date by user/categories.py.
+    """
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.PROTECT, default=default_tenant_id, related_name='categories')
+    parent = models.ForeignKey(
+        'self', on_delete=models.PROTECT, null=True, blank=True, related_name='children')
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100)
+    path = models.CharField(max_length=255, editable=False, default='')
+    course_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
+    class Meta:
+        verbose_name_plural = 'categories'
+        ordering = ['path']
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'slug'], name='category_tenant_slug'),
+        ]
+        indexes = [
+            models.Index(fields=['path'], name='category_path_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def depth(self):
+        return len(path_ids(self.path)) - 1
+
+    def parent_path(self, using=None):
+        """The parent's stored path; an instance in memory may predate a move."""
+        if not self.parent_id:
+            return '/'
+        return (Category.all_tenants.using(using).filter(pk=self.parent_id)
+                .values_list('path', flat=True).first() or '/')
+
+    def clean(self):
+        # Not imported at module level: views star-import this module.
+        from django.core.exceptions import ValidationError
+
+        if self.pk and self.pk in path_ids(self.parent_path()):
+            raise ValidationError({'parent': 'A category cannot be moved below itself.'})
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            parent_path = self.parent_path(using)
+            if self.pk and self.pk in path_ids(parent_path):
+                raise ValueError('A category cannot be moved below itself.')
+            stored = None
+            if self.pk:
+                stored = (Category.all_tenants.using(using).select_for_update()
+                          .filter(pk=self.pk).values_list('path', 'course_count').first())
+            if stored:
+                # Never write back a stale path or count.
+                self.path, self.course_count = stored
+            super().save(*args, **kwargs)
+
+            old_path, self.path = self.path, f'{parent_path}{self.pk}/'
+            if old_path and self.path != old_path:
+                # Rewrites this node, its descendants and their courses.
+                from .categories import move_subtree
+                move_subtree(old_path, self.path, self.course_count, using)
+            elif not old_path:
+                Category.all_tenants.using(using).filter(pk=self.pk).update(path=self.path)
+
+
+class Tag(TenantUniqueMixin, models.Model):
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.PROTECT, default=default_tenant_id, related_name='tags')
+    name = models.CharField(max_length=50)
+    slug = models.SlugField(max_length=50)
+    course_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'slug'], name='tag_tenant_slug'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Course(TenantUniqueMixin, CapturedModel):
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.PROTECT, default=default_tenant_id, related_name='courses')
     image = models.ImageField(null=True, blank=True)
     title = models.CharField(max_length=255)
     what_you_learn = models.TextField(null=True, blank=True)
@@ -95,13 +340,34 @@ class Course(models.Model):
     duration_in_hours = models.PositiveIntegerField()
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
+    # Denormalized review aggregates, maintained by user/stats.py.
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    category = models.ForeignKey(
+        Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='courses')
+    # Copy of category.path, kept in sync by user/categories.py.
+    category_path = models.CharField(max_length=255, blank=True, default='', editable=False)
+    tags = models.ManyToManyField(Tag, blank=True, related_name='courses')
+
+    objects = TenantManager()
+    all_tenants = models.Manager()
 
     class Meta:
         ordering = ['created_at', 'updated_at']
+        indexes = [
+            models.Index(fields=['tenant', 'created_at'], name='course_tenant_created_idx'),
+            models.Index(fields=['tenant', 'category_path'], name='course_tenant_category_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_total / self.review_count, 2)
+
     @property
     def imageURL(self):
         try:
@@ -111,71 +377,394 @@ class Course(models.Model):
         return url
 
 
-class Cart(models.Model):
+class CartQuerySet(TenantQuerySet):
+    def open_for(self, user):
+        """The user's current cart: the one not checked out yet."""
+        return self.filter(user=user, completed=False).first()
+
+    def open_or_create_for(self, user):
+        cart = self.open_for(user)
+        if cart is not None:
+            return cart
+        try:
+            with transaction.atomic(using=self.db):
+                return self.create(user=user)
+        except IntegrityError:
+            # A concurrent request opened one first.
+            return self.open_for(user)
+
+
+class Cart(TenantUniqueMixin, models.Model):
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.PROTECT, default=default_tenant_id, related_name='carts')
     user = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, null=True, blank=True)
     id = models.UUIDField(default=uuid.uuid4, unique=True, primary_key=True)
     created = models.DateTimeField(auto_now_add=True)
+    # Bumped when items are added or removed; open carts untouched for
+    # CART_ABANDONED_DAYS are archived.
+    updated = models.DateTimeField(auto_now=True)
     completed = models.BooleanField(default=False)
+    # Set at checkout; completed carts are archived CART_ARCHIVE_COMPLETED_DAYS
+    # after it.
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = models.Manager.from_queryset(CartQuerySet)()
+    all_tenants = models.Manager()
+
+    class Meta:
+        indexes = [
+            # Backs the admin's "completed" filter and the archival of old
+            # completed carts.
+            models.Index(fields=['tenant', 'completed', 'completed_at'], name='cart_tenant_completed_idx'),
+            models.Index(fields=['tenant', 'updated'], name='cart_open_updated_idx',
+                         condition=models.Q(completed=False)),
+        ]
+        constraints = [
+            # One open cart per user. Also the index open_for() reads, and
+            # open carts are a small fraction of the table.
+            models.UniqueConstraint(fields=['user'], name='cart_one_open_per_user',
+                                    condition=models.Q(completed=False)),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} Cart"
+        return f"{self.user} Cart" if self.user_id else f"Cart {self.pk}"
 
 
-class Cartitems(models.Model):
+class Cartitems(TenantUniqueMixin, CapturedModel):
     cart = models.ForeignKey(
         Cart, on_delete=models.CASCADE, blank=True, null=True, related_name='items')
     course = models.ForeignKey(
         Course, on_delete=models.CASCADE, blank=True, null=True, related_name='cartitems')
 
+    tenant_lookup = 'cart__tenant_id'
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
     def __str__(self):
-        return f"{self.cart.user.username} items"
+        if self.cart_id and self.cart.user_id:
+            return f"{self.cart.user} items"
+        return f"Cart item {self.pk}"
 
 
-class WatchList(models.Model):
+class Order(TenantUniqueMixin, models.Model):
+    id = models.UUIDField(default=uuid.uuid4, unique=True, primary_key=True)
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name='orders')
+    cart = models.OneToOneField(
+        Cart, on_delete=models.SET_NULL, null=True, blank=True, related_name='order')
+    idempotency_key = models.CharField(max_length=255)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    tenant_lookup = 'user__tenant_id'
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'], name='order_user_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} order {self.id}"
+
+
+class Enrollment(TenantUniqueMixin, models.Model):
+    order = models.ForeignKey(
+        Order, on_delete=models.CASCADE, related_name='enrollments')
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name='enrollments')
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='enrollments')
+    # Price paid, snapshotted at checkout.
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    tenant_lookup = 'user__tenant_id'
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'course'], name='enrollment_user_course'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} enrolled in {self.course}"
+
+
+class ArchivedCart(models.Model):
+    """A cart moved out of ``Cart`` by ``manage.py archive_carts``."""
+    id = models.UUIDField(primary_key=True)
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.PROTECT, related_name='archived_carts')
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_carts')
+    # Order.cart is cleared when its cart is archived; this keeps the link.
+    order = models.OneToOneField(
+        Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_cart')
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    completed = models.BooleanField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived cart {self.id}"
+
+
+class ArchivedCartitem(models.Model):
+    cart = models.ForeignKey(
+        ArchivedCart, on_delete=models.CASCADE, related_name='items')
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+
+    def __str__(self):
+        return f"{self.cart_id} item"
+
+
+class WatchList(TenantUniqueMixin, models.Model):
     user = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, null=True, blank=True)
     id = models.UUIDField(default=uuid.uuid4, unique=True, primary_key=True)
     created = models.DateTimeField(auto_now_add=True)
 
+    tenant_lookup = 'user__tenant_id'
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
     def __str__(self):
-        return f"{self.user.username} WatchList"
+        return f"{self.user} WatchList" if self.user_id else f"WatchList {self.pk}"
 
 
-class Watchitems(models.Model):
+class Watchitems(TenantUniqueMixin, CapturedModel):
     watchlist = models.ForeignKey(WatchList, on_delete=models.CASCADE)
     course = models.ForeignKey(
         Course, on_delete=models.CASCADE)
 
+    tenant_lookup = 'course__tenant_id'
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
     def __str__(self):
-        return f"{self.cart.user.username} items"
+        if self.watchlist.user_id:
+            return f"{self.watchlist.user} items"
+        return f"WatchList item {self.pk}"
 
 
-class Review(models.Model):
+class Review(TenantUniqueMixin, CapturedModel):
     user = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, related_name="reviews")
     course = models.ForeignKey(
         Course, on_delete=models.CASCADE, related_name="reviews")
-    rating = models.PositiveIntegerField()
+    rating = models.PositiveIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    tenant_lookup = 'course__tenant_id'
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
     class Meta:
         ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'course'], name='review_user_course'),
+        ]
+        # Keyset pagination of a course's reviews (see CourseReviewViewSet).
+        indexes = [
+            models.Index(fields=['course', 'created_at', 'id'],
+                         name='review_course_created_idx'),
+            models.Index(fields=['course', 'rating', 'created_at', 'id'],
+                         name='review_course_rating_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user} reviewed {self.course}"
 
 
-class Blog(models.Model):
+class Blog(TenantUniqueMixin, models.Model):
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.PROTECT, default=default_tenant_id, related_name='blogs')
     title = models.CharField(max_length=255)
     content = models.TextField()
     author = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['tenant', 'created_at', 'id'], name='blog_tenant_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class InstructorStats(models.Model):
+    instructor = models.OneToOneField(
+        CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    course_count = models.PositiveIntegerField(default=0)
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    # Completed carts containing at least one of the instructor's courses.
+    students = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.instructor} stats"
+
+    @property
+    def average_rating(self):
+        if not self.review_count:
+            return None
+        return round(self.rating_total / self.review_count, 2)
+
+
+class CourseRecommendation(TenantUniqueMixin, models.Model):
+    course = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(
+        Course, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    tenant_lookup = 'course__tenant_id'
+    objects = TenantManager()
+    all_tenants = models.Manager()
+
+    class Meta:
+        ordering = ['course', 'rank']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['course', 'rank'], name='recommendation_course_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.course} -> {self.recommended}"
+
+
+class CoursePopularity(models.Model):
+    course = models.OneToOneField(
+        Course, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    # Decayed score in log space, see user/leaderboard.py.
+    log_score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.course} popularity"
+
+
+class Task(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=255)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    run_after = models.DateTimeField(default=timezone.now)
+    # When a worker took the task; RUNNING tasks whose lease ran out belong
+    # to a worker that died and are queued again.
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'],
+                         name='task_status_run_after_idx'),
+            models.Index(fields=['status', 'claimed_at'],
+                         name='task_status_claimed_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class RequestProfile(models.Model):
+    """One profiled request (see user/profiling.py)."""
+    method = models.CharField(max_length=10)
+    path = models.TextField()
+    status = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    engine = models.CharField(max_length=32)
+    sampled = models.BooleanField()
+    created = models.DateTimeField(auto_now_add=True)
+    summary = models.TextField()
+    data = models.BinaryField()
+
+    def __str__(self):
+        return f"#{self.id} {self.method} {self.path}"
+
+
+class ChangeEvent(models.Model):
+    """One row of the change outbox (see user/changes.py)."""
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    # Moved to the archive tables by ``manage.py archive_carts``.
+    ARCHIVE = 'archive'
+    OP_CHOICES = [
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+        (ARCHIVE, 'Archive'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    # Consumers read in position order. Positions are handed out after the
+    # event commits, see changes.sequence(); null until then.
+    position = models.BigIntegerField(null=True, blank=True, unique=True)
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    model = models.CharField(max_length=32)
+    object_id = models.CharField(max_length=64)
+    op = models.CharField(max_length=7, choices=OP_CHOICES)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'position'], name='change_model_position_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.op} {self.model} {self.object_id}"
+
+
+class ChangeSequence(models.Model):
+    """The last position handed out; one row, locked while sequencing."""
+    position = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Change sequence @ {self.position}"
+
+
+class ChangeConsumer(models.Model):
+    """Last event a named consumer has processed (``tail_changes --consumer``)."""
+    name = models.SlugField(unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
@@ -0,0 +1,211 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+from urllib.parse import urlsplit, urlunsplit
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def relative_url(url):
+    """``url`` without its scheme and host, for payloads shared across hosts."""
+    parts = urlsplit(url)
+    return urlunsplit(('', '', parts.path, parts.query, parts.fragment))
+
+
+class KeysetPagination(BasePagination):
+    """Forward-only keyset pagination over a unique ordering tuple.
+
+    Unlike offset pagination the cost of a page does not grow with its
+    depth: the cursor holds the last row's ordering values and the next
+    page is ``WHERE (a, b, id) > (x, y, z)`` served from an index. Each
+    ordering must end with a unique field (normally ``id``).
+    """
+
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    base_url = None
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    orderings = {'newest': ('-created_at', '-id')}
+    default_ordering = 'newest'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        ordering_name, values = self.decode_cursor(request, queryset.model)
+        return self.page(queryset, ordering_name, values)
+
+    def page(self, queryset, ordering_name=None, values=None):
+        """Return one page of ``queryset``.
+
+        Outside a request (e.g. embedding page one in another payload), set
+        ``base_url`` to the list endpoint first to get a next link.
+        """
+        self.ordering_name = ordering_name or self.default_ordering
+        fields = self.orderings[self.ordering_name]
+
+        if values is not None:
+            queryset = queryset.filter(self.after(fields, values))
+
+        rows = list(queryset.order_by(*fields)[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.last_values = (
+            [self.field_value(rows[-1], field) for field in fields] if rows else None)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_next_link(self):
+        if not self.has_next or self.base_url is None:
+            return None
+        url = remove_query_param(self.base_url, self.ordering_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor())
+
+    # ------------------------------- cursors -------------------------------
+
+    def encode_cursor(self):
+        # Full precision isoformat; DjangoJSONEncoder drops microseconds.
+        payload = json.dumps(
+            [self.ordering_name, self.last_values],
+            default=lambda value: value.isoformat() if hasattr(value, 'isoformat') else str(value))
+        return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request, model):
+        """``(ordering name, values)`` from the request; values converted to Python."""
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            name = request.query_params.get(self.ordering_query_param, self.default_ordering)
+            if name not in self.orderings:
+                raise NotFound(f'Unknown ordering, use one of: {", ".join(self.orderings)}.')
+            return name, None
+
+        try:
+            padded = raw + '=' * (-len(raw) % 4)
+            name, values = json.loads(urlsafe_b64decode(padded))
+            fields = self.orderings[name]
+            if len(values) != len(fields):
+                raise ValueError
+            values = [model._meta.get_field(field.lstrip('-')).to_python(value)
+                      for field, value in zip(fields, values)]
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound('Invalid cursor.')
+        return name, values
+
+    # ------------------------------- filtering -------------------------------
+
+    def field_value(self, obj, field):
+        # Rows may be model instances or values() dicts.
+        if isinstance(obj, dict):
+            return obj[field.lstrip('-')]
+        return getattr(obj, field.lstrip('-'))
+
+    def after(self, fields, values):
+        """``Q`` for rows strictly after ``values`` in ``fields`` order."""
+        clauses = []
+        equal = {}
+        for field, value in zip(fields, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': value}))
+            equal[name] = value
+        return reduce(or_, clauses)
+
+
+class ReviewPagination(KeysetPagination):
+    orderings = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+        'highest': ('-rating', '-created_at', '-id'),
+        'lowest': ('rating', '-created_at', '-id'),
+    }
+
+
+class BlogPagination(KeysetPagination):
+    page_size = 10
+
+
+# ------------------------------- admin -------------------------------
+
+
+def estimated_row_count(model, using='default'):
+    """The planner's row estimate for ``model``'s table, or ``None``.
+
+    PostgreSQL and MySQL keep one in their catalogs; SQLite only has one
+    after ``ANALYZE`` has filled ``sqlite_stat1``.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables '
+                'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+
+    if row is None or row[0] is None:
+        return None
+    estimate = int(str(row[0]).split()[0])
+    # PostgreSQL reports -1 for a table that was never analyzed.
+    return estimate if estimate >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Django paginator that skips ``COUNT(*)`` on large unfiltered tables.
+
+    A full count scans the whole table (or index) on every changelist page.
+    Without filters the catalog estimate is used instead, unless it is small
+    enough that an exact count is cheap anyway.
+    """
+
+    exact_below = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
@@ -0,0 +1,182 @@
+"""
+Profiling live requests without a redeploy.
+
+``ProfilingMiddleware`` is dropped from the stack at startup (Django's
+``MiddlewareNotUsed``) unless ``PROFILING_ENABLED`` is set, so requests pay
+nothing while it is off. When it is on, a request is profiled if
+
+* it carries an ``X-Profile`` header holding a token from
+  ``POST /api/profiles/token/`` (signed with ``SECRET_KEY``, valid for
+  ``PROFILE_TOKEN_MAX_AGE`` seconds, naming the engine to use), or
+* it is picked at random at ``PROFILE_SAMPLE_RATE``, with ``PROFILE_ENGINE``.
+
+Engines are ``cprofile`` (deterministic, standard library; downloads as a
+``.prof`` file for ``pstats`` or snakeviz) and ``pyinstrument``
+(statistical and cheaper on deep call stacks; downloads as HTML; needs the
+``pyinstrument`` package).
+
+The last ``PROFILE_KEEP`` profiles are kept in the ``RequestProfile``
+table, so every worker sees the same ones (the default cache is per
+process), and listed and downloaded by staff from ``/api/profiles/``. The response to a profiled request names its
+profile in ``X-Profile-Id``. A streaming response is profiled up to the
+point its body starts.
+"""
+
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+
+from .models import RequestProfile
+
+HEADER = 'HTTP_X_PROFILE'
+SALT = 'user.profiling'
+LISTED_FIELDS = ('id', 'method', 'path', 'status', 'duration_ms', 'engine', 'sampled', 'created')
+
+
+class CProfileEngine:
+    name = 'cprofile'
+    content_type = 'application/octet-stream'
+    extension = 'prof'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def output(self):
+        # What pstats.Stats.dump_stats() writes.
+        return marshal.dumps(pstats.Stats(self.profiler).stats)
+
+    def summary(self):
+        stream = io.StringIO()
+        pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(40)
+        return stream.getvalue()
+
+
+class PyinstrumentEngine:
+    name = 'pyinstrument'
+    content_type = 'text/html'
+    extension = 'html'
+
+    def __init__(self):
+        from pyinstrument import Profiler
+        self.profiler = Profiler()
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def output(self):
+        return self.profiler.output_html().encode()
+
+    def summary(self):
+        return self.profiler.output_text()
+
+
+ENGINES = {engine.name: engine for engine in (CProfileEngine, PyinstrumentEngine)}
+
+
+def available_engines():
+    names = ['cprofile']
+    try:
+        import pyinstrument  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        names.append('pyinstrument')
+    return names
+
+
+def make_token(engine='cprofile'):
+    """A value for the ``X-Profile`` header."""
+    return signing.TimestampSigner(salt=SALT).sign(engine)
+
+
+def token_engine(token):
+    """The engine a valid, unexpired token asks for, or None."""
+    try:
+        name = signing.TimestampSigner(salt=SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return name if name in available_engines() else None
+
+
+# ------------------------------- storage -------------------------------
+
+def store(entry):
+    """Save ``entry``, drop all but the newest PROFILE_KEEP, return its id."""
+    profile = RequestProfile.objects.create(**entry)
+    RequestProfile.objects.filter(pk__lte=profile.pk - settings.PROFILE_KEEP).delete()
+    return profile.pk
+
+
+def recent():
+    """Stored profiles without their summary and data, newest first."""
+    return list(RequestProfile.objects.order_by('-pk').values(*LISTED_FIELDS))
+
+
+def get(profile_id):
+    entry = RequestProfile.objects.filter(pk=profile_id).values().first()
+    if entry is not None:
+        # Some backends return a memoryview.
+        entry['data'] = bytes(entry['data'])
+    return entry
+
+
+class ProfilingMiddleware:
+    """Profile requests that ask for it or are sampled; see the module docstring."""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        if settings.PROFILE_ENGINE not in available_engines():
+            raise ImproperlyConfigured(f'PROFILE_ENGINE {settings.PROFILE_ENGINE!r} is not available.')
+        self.get_response = get_response
+
+    def __call__(self, request):
+        engine = self.engine_for(request)
+        if engine is None:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        engine.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            engine.stop()
+        duration = time.perf_counter() - started
+
+        profile_id = store({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'engine': engine.name,
+            'sampled': HEADER not in request.META,
+            'summary': engine.summary(),
+            'data': engine.output(),
+        })
+        response['X-Profile-Id'] = str(profile_id)
+        return response
+
+    def engine_for(self, request):
+        token = request.META.get(HEADER)
+        if token:
+            name = token_engine(token)
+            return ENGINES[name]() if name else None
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return ENGINES[settings.PROFILE_ENGINE]()
+        return None
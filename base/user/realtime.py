@@ -0,0 +1,156 @@
+"""
+Pushing cart and watchlist changes to a user's open connections.
+
+Receivers in signals.py publish a small delta for every cart or watchlist
+item that is added or deleted on its own, and for every checkout, once the
+transaction commits. Rows removed by queryset deletes and cascades
+(archival, a course being deleted) are not pushed. The broker hands it to each WebSocket that user has
+open (see user/websocket.py), so other tabs and devices stay in sync
+without polling.
+
+Brokers are configured like the task queue::
+
+    REALTIME = {'BACKEND': 'user.realtime.LocalBroker', 'OPTIONS': {}}
+
+``LocalBroker`` only reaches sockets served by the same process, which is
+enough for a single ASGI worker. ``RedisBroker`` publishes through Redis
+so every worker delivers to its own sockets; it needs the ``redis``
+package. Other backends implement ``publish()`` and feed ``deliver()``.
+"""
+
+import asyncio
+import logging
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+_broker = None
+_broker_lock = threading.Lock()
+
+# Sent instead of the dropped messages when a client falls too far behind;
+# the client should reload its cart and watchlist.
+RESYNC = dumps({'type': 'resync'}).decode()
+
+
+class Subscription:
+    """One connection's queue, filled from any thread, read in its loop."""
+
+    def __init__(self, user_id, size):
+        self.user_id = str(user_id)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size)
+
+    def put(self, text):
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class LocalBroker:
+    """Fan-out to the connections of this process."""
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        # str(user id) -> subscriptions; JWTs carry the id as a string.
+        self._subscriptions = {}
+
+    def subscribe(self, user_id):
+        """Call from the connection's event loop."""
+        subscription = Subscription(user_id, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(subscription.user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_id, message):
+        self.deliver(user_id, dumps(message).decode())
+
+    def deliver(self, user_id, text):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(str(user_id), ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, text)
+            except RuntimeError:
+                # The connection's loop is gone; it unsubscribes on its way out.
+                pass
+
+
+class RedisBroker(LocalBroker):
+    """Publish through Redis; one listener thread per process delivers locally."""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='realtime', queue_size=100):
+        super().__init__(queue_size)
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBroker needs the redis package.')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._listener = None
+
+    def subscribe(self, user_id):
+        if self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self.listen, name='realtime-redis', daemon=True)
+                    self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, message):
+        self.client.publish(f'{self.prefix}:{user_id}', dumps(message))
+
+    def listen(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(f'{self.prefix}:*')
+        for message in pubsub.listen():
+            try:
+                user_id = message['channel'].rsplit(b':', 1)[1].decode()
+                self.deliver(user_id, message['data'].decode())
+            except Exception:
+                logger.exception('Dropped realtime message %r', message)
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = getattr(settings, 'REALTIME', {})
+                broker_class = import_string(config.get('BACKEND', 'user.realtime.LocalBroker'))
+                _broker = broker_class(**config.get('OPTIONS', {}))
+    return _broker
+
+
+def publish_on_commit(user_id, message):
+    """Send ``message`` to ``user_id``'s connections if the transaction commits."""
+    if user_id is None:
+        return
+
+    def send():
+        try:
+            get_broker().publish(user_id, message)
+        except Exception:
+            # Clients resync on reconnect; a lost delta must not fail the request.
+            logger.exception('Could not publish %s to user %s', message.get('type'), user_id)
+    transaction.on_commit(send)
@@ -0,0 +1,183 @@
+"""
+Item-to-item recommendations from carts, watchlists and reviews.
+
+Every (user, course) pair gets the weight of its strongest signal. Two
+courses are scored by the cosine similarity of their user-weight vectors
+and each course keeps its top K neighbours in ``CourseRecommendation``.
+``build_all`` computes the whole table with NumPy/SciPy sparse matrices
+and ``refresh_course`` recomputes a single course in plain Python, giving
+the same scores, then patches the lists of the courses it is similar to.
+"""
+
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Cartitems, CourseRecommendation, Review, Watchitems
+
+CART_WEIGHT = 1.0
+WATCHLIST_WEIGHT = 0.5
+
+
+def interactions(user_ids=None, course_ids=None):
+    """Return ``{(user_id, course_id): weight}``, optionally filtered."""
+    carts = Cartitems.objects.filter(cart__user__isnull=False, course__isnull=False)
+    watchitems = Watchitems.objects.filter(watchlist__user__isnull=False)
+    reviews = Review.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(cart__user_id__in=user_ids)
+        watchitems = watchitems.filter(watchlist__user_id__in=user_ids)
+        reviews = reviews.filter(user_id__in=user_ids)
+    if course_ids is not None:
+        carts = carts.filter(course_id__in=course_ids)
+        watchitems = watchitems.filter(course_id__in=course_ids)
+        reviews = reviews.filter(course_id__in=course_ids)
+
+    weights = {}
+
+    def add(rows, weight_of):
+        for user_id, course_id, *extra in rows.iterator(chunk_size=2000):
+            key = (user_id, course_id)
+            weights[key] = max(weights.get(key, 0.0), weight_of(*extra))
+
+    add(carts.values_list('cart__user_id', 'course_id'), lambda: CART_WEIGHT)
+    add(watchitems.values_list('watchlist__user_id', 'course_id'), lambda: WATCHLIST_WEIGHT)
+    add(reviews.values_list('user_id', 'course_id', 'rating'), lambda rating: rating / 5)
+    return weights
+
+
+def build_all(top_k=None):
+    """Rebuild the whole neighbour table. Returns the number of rows."""
+    import numpy as np
+    from scipy import sparse
+
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    weights = interactions()
+    if not weights:
+        save_neighbours({}, replace_all=True)
+        return 0
+
+    user_index = {}
+    course_ids = []
+    course_index = {}
+    rows, cols, values = [], [], []
+    for (user_id, course_id), weight in weights.items():
+        rows.append(user_index.setdefault(user_id, len(user_index)))
+        if course_id not in course_index:
+            course_index[course_id] = len(course_ids)
+            course_ids.append(course_id)
+        cols.append(course_index[course_id])
+        values.append(weight)
+
+    matrix = sparse.csr_matrix(
+        (values, (rows, cols)), shape=(len(user_index), len(course_ids)))
+    co = (matrix.T @ matrix).tocsr()
+    norms = np.sqrt(co.diagonal())
+    co.setdiag(0)
+    co.eliminate_zeros()
+
+    neighbours = {}
+    for row in range(co.shape[0]):
+        start, end = co.indptr[row], co.indptr[row + 1]
+        if start == end:
+            continue
+        cols_ = co.indices[start:end]
+        scores = co.data[start:end] / (norms[row] * norms[cols_])
+        best = np.argsort(-scores, kind='stable')[:top_k]
+        neighbours[course_ids[row]] = [
+            (course_ids[cols_[i]], float(scores[i])) for i in best]
+
+    return save_neighbours(neighbours, replace_all=True)
+
+
+def refresh_course(course_id, top_k=None):
+    """Recompute one course's neighbours, and its place in theirs.
+
+    A change to ``course_id``'s interactions only moves the scores of pairs
+    that include it, so every other list is patched in place: ``course_id``
+    is re-ranked with its new score. Only a list that was full and whose
+    last place ``course_id`` now vacates is recomputed, as the course that
+    should move up is not known.
+    """
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    scores = course_scores(course_id)
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    neighbours = {course_id: ranked[:top_k]}
+
+    current = {}
+    for owner, other, score in (CourseRecommendation.objects
+                                .filter(Q(course_id__in=list(scores)) | Q(recommended_id=course_id))
+                                .exclude(course_id=course_id)
+                                .values_list('course_id', 'recommended_id', 'score')):
+        current.setdefault(owner, []).append((other, score))
+
+    recompute = []
+    for owner in set(scores) | set(current):
+        old = current.get(owner, [])
+        old_score = dict(old).get(course_id)
+        new_score = scores.get(owner)
+        if (old_score is not None and len(old) >= top_k
+                and (new_score is None or new_score < min(score for _, score in old))):
+            recompute.append(owner)
+            continue
+        merged = [(other, score) for other, score in old if other != course_id]
+        if new_score is not None:
+            merged.append((course_id, new_score))
+        neighbours[owner] = sorted(merged, key=lambda item: -item[1])[:top_k]
+
+    for owner in recompute:
+        neighbours[owner] = sorted(course_scores(owner).items(), key=lambda item: -item[1])[:top_k]
+    return save_neighbours(neighbours)
+
+
+def course_scores(course_id):
+    """``{other_course_id: cosine similarity}`` for every co-interacted course."""
+    own = interactions(course_ids=[course_id])
+    user_weights = {user_id: weight for (user_id, _), weight in own.items()}
+
+    dots = {}
+    for (user_id, other), weight in interactions(user_ids=list(user_weights)).items():
+        if other != course_id:
+            dots[other] = dots.get(other, 0.0) + user_weights[user_id] * weight
+
+    norms = {}
+    for (_, other), weight in interactions(course_ids=list(dots)).items():
+        norms[other] = norms.get(other, 0.0) + weight * weight
+    own_norm = math.sqrt(sum(weight * weight for weight in user_weights.values()))
+    return {other: dot / (own_norm * math.sqrt(norms[other])) for other, dot in dots.items()}
+
+
+def refresh_key(course_id):
+    return f'recommendations-refresh:{course_id}'
+
+
+def schedule_refresh(course_id):
+    """Refresh ``course_id`` once its burst of changes has settled.
+
+    The first change in a window schedules a refresh for the end of it;
+    later ones find it pending and are picked up by it (trailing debounce).
+    """
+    from . import tasks
+
+    window = settings.RECOMMENDATIONS_REFRESH_SECONDS
+    # Outlives the countdown; the task clears it when it starts.
+    if cache.add(refresh_key(course_id), True, window * 10):
+        tasks.refresh_recommendations.delay_for(window, course_id)
+
+
+def save_neighbours(neighbours, replace_all=False):
+    rows = [
+        CourseRecommendation(course_id=course_id, recommended_id=other, score=score, rank=rank)
+        for course_id, ranked in neighbours.items()
+        for rank, (other, score) in enumerate(ranked, start=1)
+    ]
+    with transaction.atomic():
+        stale = CourseRecommendation.objects.all()
+        if not replace_all:
+            stale = stale.filter(course_id__in=list(neighbours))
+        stale.delete()
+        CourseRecommendation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,68 @@
+"""
+JSON rendering through orjson, falling back to the stdlib.
+
+``FastJSONRenderer`` produces the same bytes as DRF's ``JSONRenderer`` for
+the payloads serializers return (compact separators, UTF-8, ``Z`` for UTC
+datetimes, U+2028/U+2029 escaped) in a fraction of the time. Values the
+serializers did not already turn into strings are handled the same way by
+both code paths:
+
+    Decimal     string, or float when COERCE_DECIMAL_TO_STRING is off,
+                matching what a serializer DecimalField would return
+    UUID        canonical string (Cart and WatchList ids)
+    datetime    ISO 8601, ``Z`` suffix for UTC
+    anything else DRF's encoder knows (lazy strings, timedelta, querysets)
+"""
+
+import decimal
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+class JSONEncoder(encoders.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, decimal.Decimal):
+            return str(obj) if api_settings.COERCE_DECIMAL_TO_STRING else float(obj)
+        return super().default(obj)
+
+
+_encoder = JSONEncoder()
+
+
+def dumps(data):
+    """Compact UTF-8 JSON bytes for ``data``."""
+    if orjson is None:
+        body = json.dumps(data, cls=JSONEncoder, ensure_ascii=False,
+                          allow_nan=False, separators=(',', ':')).encode()
+    else:
+        body = orjson.dumps(data, default=_encoder.default,
+                            option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    # Keep the output a strict JavaScript subset, like DRF does.
+    for raw, escaped in LINE_SEPARATORS:
+        if raw in body:
+            body = body.replace(raw, escaped)
+    return body
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in ``JSONRenderer``; indented output still goes through DRF."""
+
+    encoder_class = JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (self.get_indent(accepted_media_type, renderer_context or {}) is not None
+                or self.ensure_ascii or not self.compact):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,73 @@
+from django.db import transaction
+
+from .cache import invalidate_course
+from .models import ChangeEvent, Course, Review
+from . import changes, leaderboard, tasks
+
+
+def upsert_reviews(user, rows):
+    """Create or update one review per ``(user, course)``.
+
+    ``rows`` are validated ``ReviewWriteSerializer`` dicts; a row's
+    ``user_id`` (staff imports) overrides ``user``. Everything is written
+    with one ``bulk_create`` upsert and the aggregates are adjusted by a
+    single task for the whole batch. Returns ``(created, updated)``.
+    """
+    reviews = {}
+    for row in rows:
+        user_id = row.get('user_id') or user.pk
+        # Later rows for the same pair win, like repeated single upserts.
+        reviews[(user_id, row['course_id'])] = Review(
+            user_id=user_id, course_id=row['course_id'],
+            rating=row['rating'], comment=row['comment'])
+    if not reviews:
+        return 0, 0
+
+    user_ids = {user_id for user_id, _ in reviews}
+    course_ids = {course_id for _, course_id in reviews}
+    with transaction.atomic():
+        # Reviews that do not exist yet cannot be locked, so two first
+        # reviews of the same pair would both count as created. Locking the
+        # courses serializes writers per course; the existing ratings read
+        # below are then exactly what the upsert is about to overwrite.
+        instructors = dict(Course.objects.select_for_update().filter(pk__in=course_ids)
+                           .order_by('pk').values_list('pk', 'instructor_id'))
+        previous = {
+            (user_id, course_id): rating
+            for user_id, course_id, rating in Review.objects
+            .filter(user_id__in=user_ids, course_id__in=course_ids)
+            .values_list('user_id', 'course_id', 'rating')
+            if (user_id, course_id) in reviews
+        }
+
+        Review.objects.bulk_create(
+            reviews.values(), batch_size=500, update_conflicts=True,
+            unique_fields=['user', 'course'], update_fields=['rating', 'comment'])
+        # bulk_create sends no signals and upserts don't return ids, so the
+        # change events are appended here.
+        pks = {(user_id, course_id): pk for user_id, course_id, pk in
+               Review.objects.filter(user_id__in=user_ids, course_id__in=course_ids)
+               .values_list('user_id', 'course_id', 'pk')}
+        for key, review in reviews.items():
+            review.pk = pks[key]
+        changes.record_many([review for key, review in reviews.items() if key not in previous],
+                            ChangeEvent.CREATE)
+        changes.record_many([reviews[key] for key in previous], ChangeEvent.UPDATE)
+
+        deltas = []
+        for (user_id, course_id), review in reviews.items():
+            old_rating = previous.get((user_id, course_id))
+            if old_rating is None:
+                deltas.append([course_id, instructors[course_id], 1, review.rating])
+                transaction.on_commit(lambda course_id=course_id: leaderboard.current().record(
+                    course_id, leaderboard.REVIEW_WEIGHT))
+            elif review.rating != old_rating:
+                deltas.append([course_id, instructors[course_id], 0, review.rating - old_rating])
+        if deltas:
+            tasks.update_review_stats.delay(deltas)
+        # Comment-only edits move no counters but still change the payload.
+        for course_id in course_ids:
+            transaction.on_commit(lambda course_id=course_id: invalidate_course(course_id))
+
+    updated = len(previous)
+    return len(reviews) - updated, updated
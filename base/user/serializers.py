@@ -1,7 +1,13 @@
+from django.conf import settings
+from django.db.models import Prefetch
+from django.urls import reverse
 from rest_framework.serializers import ModelSerializer, SerializerMethodField
 from rest_framework import serializers
+from rest_framework.validators import UniqueValidator
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
+from user.enrollments import owned_course_ids
+from user.pagination import ReviewPagination
 from user.models import *
 
 
@@ -11,6 +17,8 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         token = super().get_token(user)
 
         token['username'] = user.username
+        # Lets TenantMiddleware pick the tenant on shared API hosts.
+        token['tenant'] = user.tenant_id
 
         return token
 
@@ -32,15 +40,15 @@ class UserSerializer(ModelSerializer):
             'url',
             'is_student',
         ]
+        # Emails are unique across tenants, not just within the active one.
+        extra_kwargs = {
+            'email': {'validators': [UniqueValidator(CustomUser.all_tenants.all())]},
+            'password': {'write_only': True},
+        }
 
     def create(self, validated_data):
-        password = validated_data.pop('password')
-
-        user = super().create(validated_data)
-        user.set_password(password)
-        user.save()
-
-        return user
+        # create_user hashes the password before the first and only save.
+        return CustomUser.objects.create_user(**validated_data)
 
 
 class UserProfileSerializer(ModelSerializer):
@@ -60,7 +68,7 @@ class UserProfileSerializer(ModelSerializer):
         ]
 
     def get_cart(self, student_profile):
-        cart = Cart.objects.filter(user=student_profile.user).first()
+        cart = Cart.objects.open_for(student_profile.user)
         if cart:
             return CartSerializer(cart, context=self.context).data
         return None
@@ -89,19 +97,32 @@ class InstructorSerializer(ModelSerializer):
             'url',
             'is_instructor',
         ]
+        # Emails are unique across tenants, not just within the active one.
+        extra_kwargs = {
+            'email': {'validators': [UniqueValidator(CustomUser.all_tenants.all())]},
+            'password': {'write_only': True},
+        }
 
     def create(self, validated_data):
-        password = validated_data.pop('password')
+        # create_user hashes the password before the first and only save.
+        return CustomUser.objects.create_user(**validated_data)
 
-        user = super().create(validated_data)
-        user.set_password(password)
-        user.save()
 
-        return user
+class InstructorStatsSerializer(ModelSerializer):
+    class Meta:
+        model = InstructorStats
+        fields = [
+            'course_count',
+            'review_count',
+            'average_rating',
+            'students',
+            'updated_at',
+        ]
 
 
 class InstructorProfileSerializer(ModelSerializer):
     user = InstructorSerializer(many=False, read_only=True)
+    stats = serializers.SerializerMethodField(method_name='get_stats')
     courses = serializers.SerializerMethodField(method_name='get_course')
     cart = serializers.SerializerMethodField(method_name='get_cart')
     watchlist = serializers.SerializerMethodField(method_name='get_watchlist')
@@ -118,11 +139,12 @@ class InstructorProfileSerializer(ModelSerializer):
             'bank_name',
             'account_name',
             'account_number',
+            'stats',
             'courses',
         ]
 
     def get_cart(self, instructor_profile):
-        cart = Cart.objects.filter(user=instructor_profile.user).first()
+        cart = Cart.objects.open_for(instructor_profile.user)
         if cart:
             return CartSerializer(cart, context=self.context).data
         return None
@@ -134,17 +156,45 @@ class InstructorProfileSerializer(ModelSerializer):
             return WatchListSerializer(watchlist, context=self.context).data
         return None
 
+    def get_stats(self, instructor_profile):
+        # Served from the precomputed row; select_related('user__stats')
+        # on the queryset makes this free.
+        try:
+            stats = instructor_profile.user.stats
+        except InstructorStats.DoesNotExist:
+            stats = InstructorStats(instructor=instructor_profile.user)
+        return InstructorStatsSerializer(stats, context=self.context).data
+
     def get_course(self, instructor_profile):
-        courses = Course.objects.filter(instructor=instructor_profile.user)
+        courses = Course.objects.filter(
+            instructor=instructor_profile.user).select_related('instructor').prefetch_related(latest_reviews_prefetch(), 'tags')
         return CourseSerializer(courses, many=True, context=self.context).data
 
 
 # ------------------------------ Course -----------------------
 
+class CourseListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        courses = list(data.all() if hasattr(data, 'all') else data)
+
+        # One ownership lookup for the whole page, read by the children.
+        request = self.context.get('request')
+        self.owned_course_ids = owned_course_ids(
+            getattr(request, 'user', None), [course.pk for course in courses])
+
+        return super().to_representation(courses)
+
+
 class CourseSerializer(ModelSerializer):
+    # Set from the requesting user by CourseViewSet.perform_create.
     instructor = serializers.CharField(
-        source='instructor.name')
+        source='instructor.name', read_only=True)
     reviews = serializers.SerializerMethodField(method_name='get_reviews')
+    owned = serializers.SerializerMethodField(method_name='get_owned')
+    category = serializers.PrimaryKeyRelatedField(
+        queryset=Category.objects.all(), allow_null=True, required=False)
+    tags = serializers.SlugRelatedField(
+        slug_field='slug', many=True, queryset=Tag.objects.all(), required=False)
 
     class Meta:
         model = Course
@@ -159,13 +209,82 @@ class CourseSerializer(ModelSerializer):
             'instructor',
             'price',
             'duration_in_hours',
+            'review_count',
+            'average_rating',
+            'category',
+            'tags',
             'reviews',
+            'owned',
         ]
+        read_only_fields = ['review_count']
+        list_serializer_class = CourseListSerializer
+
+    def get_owned(self, course):
+        owned = getattr(self.parent, 'owned_course_ids', None)
+        if owned is None:
+            request = self.context.get('request')
+            owned = owned_course_ids(getattr(request, 'user', None), [course.pk])
+        return course.pk in owned
 
     def get_reviews(self, course):
-        reviews = Review.objects.filter(course=course)
+        # Only the latest few; the full list is paginated separately.
+        reviews = getattr(course, 'latest_reviews', None)
+        if reviews is None:
+            reviews = latest_reviews(course.reviews.all())
         return ReviewSerializer(reviews, many=True, context=self.context).data
 
+
+class CourseInstructorSerializer(ModelSerializer):
+    profile_pics = serializers.ImageField(
+        source='instructorprofile.profile_pics', read_only=True, default=None)
+
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'name', 'username', 'profile_pics']
+
+
+class CourseDetailSerializer(CourseSerializer):
+    instructor = CourseInstructorSerializer(read_only=True)
+    reviews = serializers.SerializerMethodField(method_name='get_review_page')
+
+    class Meta(CourseSerializer.Meta):
+        pass
+
+    def get_review_page(self, course):
+        # The next link is relative: this payload is cached for every host,
+        # and CourseViewSet.retrieve makes it absolute per request.
+        paginator = ReviewPagination()
+        paginator.base_url = reverse('course-reviews-list', kwargs={'course_pk': course.pk})
+
+        reviews = paginator.page(Review.objects.filter(
+            course=course).select_related('user', 'course'))
+        return {
+            'next': paginator.get_next_link(),
+            'results': ReviewSerializer(reviews, many=True, context=self.context).data,
+        }
+
+
+def latest_reviews(queryset):
+    size = settings.COURSE_REVIEW_PREVIEW_SIZE
+    return queryset.select_related('user', 'course').order_by('-created_at', '-id')[:size]
+
+
+def latest_reviews_prefetch():
+    """Prefetch the preview reviews of many courses in one query."""
+    return Prefetch('reviews', queryset=latest_reviews(Review.objects.all()),
+                    to_attr='latest_reviews')
+
+class CategorySerializer(ModelSerializer):
+    class Meta:
+        model = Category
+        fields = ['id', 'name', 'slug', 'parent', 'path', 'depth', 'course_count']
+
+
+class TagSerializer(ModelSerializer):
+    class Meta:
+        model = Tag
+        fields = ['id', 'name', 'slug', 'course_count']
+
 # ---------------------------- Cart------------------------------
 
 
@@ -182,6 +301,14 @@ class CartCourseSerializer(ModelSerializer):
         ]
 
 
+class CourseRecommendationSerializer(ModelSerializer):
+    course = CartCourseSerializer(source='recommended')
+
+    class Meta:
+        model = CourseRecommendation
+        fields = ['course', 'score']
+
+
 class CartSerializer(ModelSerializer):
     items = serializers.SerializerMethodField(method_name='get_items')
     total_price = serializers.SerializerMethodField(
@@ -198,8 +325,10 @@ class CartSerializer(ModelSerializer):
 
         # Create a dictionary to hold item quantities by course
         item_quantities = {}
+        courses = {}
         for item in items:
             course_id = item.course.id
+            courses[course_id] = item.course
             if course_id in item_quantities:
                 item_quantities[course_id] += 1
             else:
@@ -209,7 +338,7 @@ class CartSerializer(ModelSerializer):
         serialized_items = []
         for course_id, quantity in item_quantities.items():
             course_item = {
-                'course': CartCourseSerializer(item.course).data,
+                'course': CartCourseSerializer(courses[course_id], context=self.context).data,
                 'quantity': quantity
             }
             serialized_items.append(course_item)
@@ -234,6 +363,19 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = Cartitems
         fields = '__all__'
 
+class EnrollmentSerializer(ModelSerializer):
+    class Meta:
+        model = Enrollment
+        fields = ['course', 'price']
+
+
+class OrderSerializer(ModelSerializer):
+    enrollments = EnrollmentSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'total_price', 'created_at', 'enrollments']
+
 # -------------------------------------- WatchList -------------------------
 
 
@@ -275,3 +417,77 @@ class ReviewSerializer(ModelSerializer):
             'rating',
             'comment',
         ]
+
+
+class ReviewWriteListSerializer(serializers.ListSerializer):
+    def validate(self, attrs):
+        # One existence query for the whole batch instead of one per row.
+        course_ids = {row['course_id'] for row in attrs}
+        found = set(Course.objects.filter(
+            pk__in=course_ids).values_list('pk', flat=True))
+        missing = sorted(course_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                {'course_id': f'Unknown course ids: {missing}'})
+
+        user_ids = {row['user_id'] for row in attrs if row.get('user_id')}
+        found = set(CustomUser.objects.filter(
+            pk__in=user_ids).values_list('pk', flat=True))
+        missing = sorted(user_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                {'user_id': f'Unknown user ids: {missing}'})
+        return attrs
+
+
+class ReviewWriteSerializer(serializers.Serializer):
+    course_id = serializers.IntegerField()
+    rating = serializers.IntegerField(min_value=1, max_value=5)
+    comment = serializers.CharField(allow_blank=True)
+    # Only honoured for staff importing legacy reviews.
+    user_id = serializers.IntegerField(required=False)
+
+    class Meta:
+        list_serializer_class = ReviewWriteListSerializer
+
+    def validate_course_id(self, value):
+        if self.parent is None and not Course.objects.filter(pk=value).exists():
+            raise serializers.ValidationError('Course not found.')
+        return value
+
+    def validate_user_id(self, value):
+        if self.parent is None and not CustomUser.objects.filter(pk=value).exists():
+            raise serializers.ValidationError('User not found.')
+        return value
+
+
+# ---------------------------------------- Blog ------------------------------------
+
+class BlogListSerializer(ModelSerializer):
+    author = serializers.CharField(source='author.name', read_only=True)
+    # Annotated by the feed queryset, so 'content' is never loaded.
+    excerpt = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Blog
+        fields = [
+            'id',
+            'title',
+            'excerpt',
+            'author',
+            'created_at',
+        ]
+
+
+class BlogSerializer(ModelSerializer):
+    author = serializers.CharField(source='author.name', read_only=True)
+
+    class Meta:
+        model = Blog
+        fields = [
+            'id',
+            'title',
+            'content',
+            'author',
+            'created_at',
+        ]
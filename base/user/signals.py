@@ -1,31 +1,282 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from django.contrib.auth.models import Group
 
-from .models import *
+from .cache import invalidate_blog, invalidate_course
+from .enrollments import invalidate_enrollments
+from . import categories, changes, leaderboard, recommendations
+from .realtime import publish_on_commit
+from .models import Blog, Cart, Cartitems, Category, ChangeEvent, Course, CustomUser, Enrollment, Review, Tenant, Watchitems
+from .serializers import CartCourseSerializer
+from . import tasks
+from .tenancy import registry
 
+
+@receiver(post_save, sender=Tenant)
+@receiver(post_delete, sender=Tenant)
+def reload_tenants(sender, instance, **kwargs):
+    registry.clear()
+
+
+# Run inline rather than queued: the signup response and the user's next
+# request (e.g. creating a course, which checks the Instructor group) need
+# the profile and groups to exist already.
 @receiver(post_save, sender=CustomUser)
 def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        if instance.is_instructor:
-            InstructorProfile.objects.create(user=instance)
-        elif instance.is_student:
-            StudentProfile.objects.create(user=instance)
+    if created and (instance.is_instructor or instance.is_student):
+        tasks.create_user_profile(instance.pk)
 
-@receiver(post_save, sender=CustomUser)
-def save_user_profile(sender, instance, **kwargs):
-    if instance.is_instructor:
-        instance.instructorprofile.save()
-    elif instance.is_student:
-        instance.studentprofile.save()
 
 @receiver(post_save, sender=CustomUser)
 def assign_user_roles(sender, instance, created, **kwargs):
+    if created and (instance.is_instructor or instance.is_student):
+        tasks.assign_user_roles(instance.pk)
+
+# ------------------------------- Course and instructor stats -------------------------------
+
+
+@receiver(post_save, sender=Course)
+def count_course_created(sender, instance, created, **kwargs):
     if created:
-        if instance.is_student:
-            student_group, _ = Group.objects.get_or_create(name='Student')
-            student_group.user_set.add(instance)
+        tasks.update_instructor_stats.delay(instance.instructor_id, course_count=1)
+    else:
+        invalidate_course(instance.pk)
+
+
+@receiver(post_delete, sender=Course)
+def count_course_deleted(sender, instance, **kwargs):
+    invalidate_course(instance.pk)
+    tasks.update_instructor_stats.delay(instance.instructor_id, course_count=-1)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_rating(sender, instance, **kwargs):
+    if instance.pk and not instance._state.adding:
+        instance._previous_rating = Review.objects.filter(
+            pk=instance.pk).values_list('rating', flat=True).first()
+
+
+@receiver(post_save, sender=Review)
+def count_review_saved(sender, instance, created, **kwargs):
+    # The aggregates task invalidates again once the counters move.
+    invalidate_course(instance.course_id)
+    instructor_id = instance.course.instructor_id
+    if created:
+        tasks.update_review_stats.delay(
+            [[instance.course_id, instructor_id, 1, instance.rating]])
+    elif getattr(instance, '_previous_rating', None) is not None:
+        delta = instance.rating - instance._previous_rating
+        if delta:
+            tasks.update_review_stats.delay(
+                [[instance.course_id, instructor_id, 0, delta]])
+
+
+@receiver(post_delete, sender=Review)
+def count_review_deleted(sender, instance, **kwargs):
+    invalidate_course(instance.course_id)
+    # Runs before the course row goes away when a course delete cascades.
+    tasks.update_review_stats.delay(
+        [[instance.course_id, instance.course.instructor_id, -1, -instance.rating]])
+
+
+@receiver(pre_save, sender=Cart)
+def detect_cart_completion(sender, instance, **kwargs):
+    instance._completing = (
+        instance.completed
+        and not instance._state.adding
+        and Cart.objects.filter(pk=instance.pk, completed=False).exists()
+    )
+
+
+@receiver(post_save, sender=Cart)
+def count_cart_completed(sender, instance, **kwargs):
+    if getattr(instance, '_completing', False):
+        tasks.record_cart_completed.delay(str(instance.pk))
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def forget_enrollment(sender, instance, **kwargs):
+    # Also after commit, or a read in between could cache the old set again.
+    invalidate_enrollments(instance.user_id)
+    transaction.on_commit(lambda: invalidate_enrollments(instance.user_id))
+
+
+@receiver(post_save, sender=Blog)
+@receiver(post_delete, sender=Blog)
+def forget_blog_pages(sender, instance, **kwargs):
+    invalidate_blog(instance.tenant_id)
+
+
+# ------------------------------- Recommendations -------------------------------
+
+
+@receiver(post_save, sender=Cartitems)
+@receiver(post_save, sender=Watchitems)
+def refresh_course_recommendations(sender, instance, created, **kwargs):
+    if created and instance.course_id:
+        # After commit, so a pending refresh that skips this event is sure
+        # to read it.
+        transaction.on_commit(lambda: recommendations.schedule_refresh(instance.course_id))
+
+
+# ------------------------------- Trending -------------------------------
+
+
+@receiver(post_save, sender=Cartitems)
+@receiver(post_save, sender=Watchitems)
+@receiver(post_save, sender=Review)
+def record_popularity(sender, instance, created, **kwargs):
+    if not created or not instance.course_id:
+        return
+
+    weight = {
+        Cartitems: leaderboard.CART_WEIGHT,
+        Watchitems: leaderboard.WATCHLIST_WEIGHT,
+        Review: leaderboard.REVIEW_WEIGHT,
+    }[sender]
+    transaction.on_commit(
+        lambda: leaderboard.current().record(instance.course_id, weight))
+
+
+# ------------------------------- Change events -------------------------------
+
+
+def capture_save(sender, instance, created, raw=False, using=None, **kwargs):
+    if not raw:
+        changes.record(instance, ChangeEvent.CREATE if created else ChangeEvent.UPDATE, using)
+
+
+def capture_delete(sender, instance, using=None, **kwargs):
+    changes.record(instance, ChangeEvent.DELETE, using)
+
+
+for captured in changes.CAPTURED:
+    post_save.connect(capture_save, sender=captured, dispatch_uid=f'capture_save_{captured.__name__}')
+    post_delete.connect(capture_delete, sender=captured, dispatch_uid=f'capture_delete_{captured.__name__}')
+
+
+# ------------------------------- Realtime sync -------------------------------
+
+
+@receiver(post_save, sender=Cartitems)
+def push_cart_item_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.cart_id and instance.course_id:
+        publish_on_commit(instance.cart.user_id, {
+            'type': 'cart.item_added',
+            'cart': instance.cart_id,
+            'course': CartCourseSerializer(instance.course).data,
+        })
+
+
+# Removals are pushed for single deletes only. Queryset deletes and cascades
+# (archive_carts, a course or cart going away) would cost a message per row;
+# clients pick those up when they reload.
+@receiver(post_delete, sender=Cartitems)
+def push_cart_item_removed(sender, instance, origin=None, **kwargs):
+    if origin is instance and instance.cart_id and instance.course_id:
+        publish_on_commit(instance.cart.user_id, {
+            'type': 'cart.item_removed',
+            'cart': instance.cart_id,
+            'course_id': instance.course_id,
+        })
+
+
+@receiver(post_save, sender=Cart)
+def push_cart_checked_out(sender, instance, **kwargs):
+    if getattr(instance, '_completing', False):
+        publish_on_commit(instance.user_id, {'type': 'cart.checked_out', 'cart': instance.pk})
+
+
+@receiver(post_save, sender=Watchitems)
+def push_watchlist_item_added(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        publish_on_commit(instance.watchlist.user_id, {
+            'type': 'watchlist.item_added',
+            'watchlist': instance.watchlist_id,
+            'item': instance.pk,
+            'course': CartCourseSerializer(instance.course).data,
+        })
+
+
+@receiver(post_delete, sender=Watchitems)
+def push_watchlist_item_removed(sender, instance, origin=None, **kwargs):
+    if origin is instance:
+        publish_on_commit(instance.watchlist.user_id, {
+            'type': 'watchlist.item_removed',
+            'watchlist': instance.watchlist_id,
+            'item': instance.pk,
+            'course_id': instance.course_id,
+        })
+
+
+# ------------------------------- Categories and tags -------------------------------
+
+
+@receiver(pre_save, sender=Course)
+def track_course_category(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._old_category_path = None
+    if raw or (update_fields is not None and 'category' not in update_fields):
+        return
+    if not instance._state.adding:
+        instance._old_category_path = (
+            Course.all_tenants.filter(pk=instance.pk).values_list('category_path', flat=True).first())
+    instance.category_path = ''
+    if instance.category_id:
+        # Not instance.category.path: the cached category may predate a move.
+        instance.category_path = (Category.all_tenants.filter(pk=instance.category_id)
+                                  .values_list('path', flat=True).first() or '')
+
+
+@receiver(post_save, sender=Course)
+def count_course_category(sender, instance, created, raw=False, using=None, **kwargs):
+    old = '' if created else getattr(instance, '_old_category_path', None)
+    if raw or old is None or old == instance.category_path:
+        return
+    categories.adjust_path_counts(old, -1, using)
+    categories.adjust_path_counts(instance.category_path, 1, using)
+
+
+@receiver(pre_delete, sender=Course)
+def uncount_course(sender, instance, using=None, **kwargs):
+    path = (Course.all_tenants.using(using).filter(pk=instance.pk)
+            .values_list('category_path', flat=True).first())
+    categories.adjust_path_counts(path or '', -1, using)
+    categories.adjust_tag_counts(instance.tags.values_list('pk', flat=True), -1, using)
+
+
+@receiver(pre_delete, sender=Category)
+def uncount_category(sender, instance, using=None, **kwargs):
+    # Children are protected, so only courses filed directly here remain;
+    # their category is cleared by SET_NULL.
+    Course.all_tenants.using(using).filter(category=instance).update(category_path='')
+    path, count = (Category.all_tenants.using(using).filter(pk=instance.pk)
+                   .values_list('path', 'course_count').get())
+    categories.adjust_path_counts(path, -count, using, exclude=instance.pk)
+
+
+@receiver(m2m_changed, sender=Course.tags.through)
+def count_course_tags(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    own, other = ('tag', 'course') if reverse else ('course', 'tag')
+    if action in ('pre_remove', 'pre_clear'):
+        # post_remove's pk_set is what was asked for, not what was linked.
+        links = sender.objects.using(using).filter(**{own: instance.pk})
+        if pk_set is not None:
+            links = links.filter(**{f'{other}_id__in': pk_set})
+        instance._unlinked = list(links.values_list(f'{other}_id', flat=True))
+        return
+    if action == 'post_add':
+        changed, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        changed, delta = instance._unlinked, -1
+    else:
+        return
 
-        if instance.is_instructor:
-            instructor_group, _ = Group.objects.get_or_create(name='Instructor')
-            instructor_group.user_set.add(instance)
\ No newline at end of file
+    if reverse:
+        categories.adjust_tag_counts([instance.pk], delta * len(changed), using)
+        course_ids = changed
+    else:
+        categories.adjust_tag_counts(changed, delta, using)
+        course_ids = [instance.pk]
+    for course_id in course_ids if changed else ():
+        transaction.on_commit(lambda course_id=course_id: invalidate_course(course_id))
@@ -0,0 +1,96 @@
+"""
+Cold start measurements.
+
+``measure_boot`` starts a fresh interpreter, boots Django, loads the WSGI
+handler and serves one request in process, reporting how long each phase
+took. With ``importtime=True`` the child runs under ``python -X importtime``
+and the per-module import costs are returned as well.
+"""
+
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+
+BOOT_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+
+import django
+django.setup()
+setup = time.perf_counter()
+
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+handler = time.perf_counter()
+
+def request():
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+        'SERVER_NAME': sys.argv[2], 'SERVER_PORT': '80', 'HTTP_HOST': sys.argv[2],
+        'wsgi.url_scheme': 'http', 'wsgi.input': __import__('io').BytesIO(),
+        'wsgi.errors': sys.stderr,
+    }
+    statuses = []
+    body = application(environ, lambda status, headers: statuses.append(status))
+    b''.join(body)
+    body.close()
+    return statuses[0]
+
+status = request()
+first = time.perf_counter()
+request()
+second = time.perf_counter()
+
+print(json.dumps({
+    'status': status,
+    'django.setup()': setup - start,
+    'WSGI handler': handler - setup,
+    'first request': first - handler,
+    'second request': second - first,
+}))
+'''
+
+
+def measure_boot(path='/api/courses/', importtime=False):
+    """Return ``(phases, imports)`` for one cold start.
+
+    ``phases`` maps phase name to seconds; ``imports`` is a list of
+    ``(module, self_us, cumulative_us, depth)`` when ``importtime`` is set.
+    """
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    command += ['-c', BOOT_SCRIPT, path, host]
+
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+        'DJANGO_SETTINGS_MODULE', 'base.settings'))
+    result = subprocess.run(command, cwd=settings.BASE_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    phases = json.loads(result.stdout.strip().splitlines()[-1])
+    return phases, parse_importtime(result.stderr) if importtime else []
+
+
+def parse_importtime(output):
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # header
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def package_totals(imports, depth=1):
+    """Sum self time per package, e.g. ``django.db`` for ``depth=2``."""
+    totals = Counter()
+    for name, self_us, _, _ in imports:
+        totals['.'.join(name.split('.')[:depth])] += self_us
+    return totals
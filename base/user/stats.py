@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .cache import invalidate_course
+from .models import ArchivedCartitem, Cartitems, Course, CustomUser, InstructorStats, Review
+
+INSTRUCTOR_COUNTERS = ('course_count', 'review_count', 'rating_total', 'students')
+
+
+def adjust_instructor_stats(instructor_id, **deltas):
+    """Apply counter deltas with a single UPDATE, creating the row if needed."""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if not InstructorStats.objects.filter(instructor_id=instructor_id).update(**updates):
+        InstructorStats.objects.get_or_create(instructor_id=instructor_id)
+        InstructorStats.objects.filter(instructor_id=instructor_id).update(**updates)
+
+
+def apply_review_deltas(deltas):
+    """Apply ``[(course_id, instructor_id, review_count, rating_total), ...]``.
+
+    Deltas are summed per course and per instructor first, so a batch of
+    reviews costs one UPDATE per touched course and instructor.
+    """
+    per_course = {}
+    per_instructor = {}
+    for course_id, instructor_id, count, total in deltas:
+        for totals, key in ((per_course, course_id), (per_instructor, instructor_id)):
+            current = totals.setdefault(key, [0, 0])
+            current[0] += count
+            current[1] += total
+
+    for course_id, (count, total) in per_course.items():
+        Course.objects.filter(pk=course_id).update(
+            review_count=F('review_count') + count,
+            rating_total=F('rating_total') + total)
+        invalidate_course(course_id)
+
+    for instructor_id, (count, total) in per_instructor.items():
+        adjust_instructor_stats(instructor_id, review_count=count, rating_total=total)
+
+
+def cart_instructor_ids(cart_id):
+    return list(
+        Cartitems.objects.filter(cart_id=cart_id, course__isnull=False)
+        .values_list('course__instructor_id', flat=True)
+        .distinct()
+    )
+
+
+def rebuild_instructor_stats():
+    """Recompute every row from the source tables. Returns the row count."""
+    rows = {}
+
+    def collect(field, queryset):
+        for instructor_id, value in queryset:
+            rows.setdefault(instructor_id, dict.fromkeys(INSTRUCTOR_COUNTERS, 0))
+            rows[instructor_id][field] += value or 0
+
+    collect('course_count', Course.objects.values('instructor_id')
+            .annotate(value=Count('id')).values_list('instructor_id', 'value'))
+    reviews = (Review.objects.values('course__instructor_id')
+               .annotate(count=Count('id'), total=Sum('rating')))
+    collect('review_count', reviews.values_list('course__instructor_id', 'count'))
+    collect('rating_total', reviews.values_list('course__instructor_id', 'total'))
+    collect('students', Cartitems.objects.filter(cart__completed=True, course__isnull=False)
+            .values('course__instructor_id')
+            .annotate(value=Count('cart_id', distinct=True))
+            .values_list('course__instructor_id', 'value'))
+    # A cart is either live or archived, so the two counts add up.
+    collect('students', ArchivedCartitem.objects.filter(cart__completed=True, course__isnull=False)
+            .values('course__instructor_id')
+            .annotate(value=Count('cart_id', distinct=True))
+            .values_list('course__instructor_id', 'value'))
+
+    instructors = CustomUser.objects.filter(
+        Q(is_instructor=True) | Q(pk__in=list(rows))).values_list('pk', flat=True)
+    stats = [
+        InstructorStats(instructor_id=pk, **rows.get(pk, dict.fromkeys(INSTRUCTOR_COUNTERS, 0)))
+        for pk in instructors
+    ]
+
+    with transaction.atomic():
+        InstructorStats.objects.exclude(instructor_id__in=[row.pk for row in stats]).delete()
+        InstructorStats.objects.bulk_create(
+            stats, batch_size=500, update_conflicts=True,
+            unique_fields=['instructor'], update_fields=[*INSTRUCTOR_COUNTERS, 'updated_at'])
+    return len(stats)
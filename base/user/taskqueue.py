@@ -0,0 +1,134 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def task(func):
+    """Register ``func`` so it can be dispatched with ``func.delay(...)``,
+    or ``func.delay_for(seconds, ...)`` to run it no sooner than that.
+
+    Arguments must be JSON serializable (pass ids, not model instances),
+    because the database backend stores them in a JSON column.
+    """
+    name = f'{func.__module__}.{func.__name__}'
+    _registry[name] = func
+    func.task_name = name
+    func.delay = lambda *args, **kwargs: enqueue(name, *args, **kwargs)
+    func.delay_for = lambda countdown, *args, **kwargs: enqueue_in(countdown, name, *args, **kwargs)
+    return func
+
+
+def get_task(name):
+    if name not in _registry:
+        # Importing the defining module runs the @task decorator.
+        import_module(name.rsplit('.', 1)[0])
+    return _registry[name]
+
+
+def run_task(name, args=(), kwargs=None):
+    close_old_connections()
+    try:
+        return get_task(name)(*args, **(kwargs or {}))
+    finally:
+        close_old_connections()
+
+
+# ----------------------------------- Backends -----------------------------------
+
+
+class ImmediateBackend:
+    """Runs tasks inline once the surrounding transaction commits.
+
+    Countdowns are ignored.
+    """
+
+    transactional = False
+
+    def __init__(self, **options):
+        pass
+
+    def submit(self, name, args, kwargs, countdown=0):
+        get_task(name)(*args, **kwargs)
+
+
+class ThreadPoolBackend:
+    """Runs tasks on an in-process thread pool. Meant for dev and tests."""
+
+    transactional = False
+
+    def __init__(self, max_workers=4, **options):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='task')
+
+    def submit(self, name, args, kwargs, countdown=0):
+        if countdown > 0:
+            timer = threading.Timer(countdown, self.submit, (name, args, kwargs))
+            timer.daemon = True
+            timer.start()
+            return
+        future = self.executor.submit(run_task, name, args, kwargs)
+        future.add_done_callback(self._log_failure(name))
+
+    def _log_failure(self, name):
+        def callback(future):
+            exc = future.exception()
+            if exc is not None:
+                logger.error('Task %s failed', name, exc_info=exc)
+        return callback
+
+
+class DatabaseBackend:
+    """Stores tasks in the ``Task`` table for the ``run_tasks`` worker.
+
+    Rows are written inside the caller's transaction, so a task is only
+    visible to the worker if the write that produced it commits.
+    """
+
+    transactional = True
+
+    def __init__(self, **options):
+        pass
+
+    def submit(self, name, args, kwargs, countdown=0):
+        from .models import Task
+
+        Task.objects.create(name=name, args=list(args), kwargs=kwargs,
+                            run_after=timezone.now() + timedelta(seconds=countdown))
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = getattr(settings, 'TASKS', {})
+                backend_class = import_string(
+                    config.get('BACKEND', 'user.taskqueue.ThreadPoolBackend'))
+                _backend = backend_class(**config.get('OPTIONS', {}))
+    return _backend
+
+
+def enqueue(name, *args, **kwargs):
+    enqueue_in(0, name, *args, **kwargs)
+
+
+def enqueue_in(countdown, name, *args, **kwargs):
+    """Run task ``name`` once the transaction commits, ``countdown`` seconds later."""
+    backend = get_backend()
+    if backend.transactional:
+        backend.submit(name, args, kwargs, countdown)
+    else:
+        transaction.on_commit(lambda: backend.submit(name, args, kwargs, countdown))
@@ -0,0 +1,58 @@
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+from .models import CustomUser, InstructorProfile, StudentProfile
+from . import recommendations
+from .stats import adjust_instructor_stats, apply_review_deltas, cart_instructor_ids
+from .taskqueue import task
+
+
+@task
+def create_user_profile(user_id):
+    user = CustomUser.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+
+    if user.is_instructor:
+        InstructorProfile.objects.get_or_create(user=user)
+    elif user.is_student:
+        StudentProfile.objects.get_or_create(user=user)
+
+
+@task
+def assign_user_roles(user_id):
+    user = CustomUser.objects.filter(pk=user_id).first()
+    if user is None:
+        return
+
+    if user.is_student:
+        student_group, _ = Group.objects.get_or_create(name='Student')
+        student_group.user_set.add(user)
+
+    if user.is_instructor:
+        instructor_group, _ = Group.objects.get_or_create(name='Instructor')
+        instructor_group.user_set.add(user)
+
+
+@task
+def update_instructor_stats(instructor_id, **deltas):
+    adjust_instructor_stats(instructor_id, **deltas)
+
+
+@task
+def update_review_stats(deltas):
+    apply_review_deltas(deltas)
+
+
+@task
+def record_cart_completed(cart_id):
+    for instructor_id in cart_instructor_ids(cart_id):
+        adjust_instructor_stats(instructor_id, students=1)
+
+
+@task
+def refresh_recommendations(course_id):
+    # Cleared before reading, so changes committed from now on schedule
+    # another refresh instead of being folded into this one.
+    cache.delete(recommendations.refresh_key(course_id))
+    recommendations.refresh_course(course_id)
@@ -0,0 +1,101 @@
+"""
+Per-partner tenants sharing one database and one set of workers.
+
+``TenantMiddleware`` activates a tenant for each request, taken from the
+``Host`` header when a tenant owns that domain, otherwise from the
+``tenant`` claim of the JWT, otherwise ``settings.DEFAULT_TENANT``. While a
+tenant is active the ``objects`` managers of tenant-owned models only see
+its rows and new rows are assigned to it. Outside a request (task workers,
+management commands) nothing is active and queries are unscoped.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.http.request import split_domain_port
+
+_current = contextvars.ContextVar('tenant', default=None)
+
+
+def current_tenant():
+    return _current.get()
+
+
+def current_tenant_id():
+    tenant = _current.get()
+    return tenant.pk if tenant is not None else None
+
+
+@contextmanager
+def use_tenant(tenant):
+    token = _current.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current.reset(token)
+
+
+def default_tenant_id():
+    """Field default for ``tenant`` FKs: the active tenant, else the default one."""
+    tenant = _current.get()
+    if tenant is None:
+        try:
+            tenant = registry.get(slug=settings.DEFAULT_TENANT)
+        except DatabaseError:
+            # Not migrated yet; system checks instantiate the user model.
+            return None
+    return tenant.pk if tenant is not None else None
+
+
+class TenantRegistry:
+    """In-process copy of the (small, rarely changing) tenant table."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._by_key = {}
+
+    def get(self, pk=None, slug=None, domain=None):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= settings.TENANT_REFRESH_SECONDS:
+            self.load()
+        if pk is not None:
+            return self._by_key.get(('pk', pk))
+        if slug is not None:
+            return self._by_key.get(('slug', slug))
+        return self._by_key.get(('domain', domain.lower()))
+
+    def load(self):
+        from .models import Tenant
+
+        by_key = {}
+        for tenant in Tenant.objects.all():
+            by_key[('pk', tenant.pk)] = tenant
+            by_key[('slug', tenant.slug)] = tenant
+            if tenant.domain:
+                by_key[('domain', tenant.domain.lower())] = tenant
+        with self._lock:
+            self._by_key = by_key
+            self._loaded_at = time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+registry = TenantRegistry()
+
+
+def resolve_tenant(request):
+    from .identity import token_claims
+
+    domain, _ = split_domain_port(request.get_host())
+    tenant = registry.get(domain=domain) if domain else None
+    if tenant is None:
+        claims = token_claims(request)
+        if claims is not None and claims.get('tenant') is not None:
+            tenant = registry.get(pk=claims['tenant'])
+    return tenant or registry.get(slug=settings.DEFAULT_TENANT)
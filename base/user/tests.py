@@ -1,3 +1,1173 @@
-from django.test import TestCase
+import asyncio
+import json
+import marshal
+import os
+import subprocess
+import sys
+from importlib import import_module
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from base.database import database_config
+
+from . import fast_serializers, leaderboard, middleware, profiling, recommendations, tasks
+from .archive import archive_carts
+from .changes import read_changes
+from .checkout import checkout_cart
+from .enrollments import owned_course_ids
+from .identity import request_user_id
+from .renderers import FastJSONRenderer
+from .models import (
+    ArchivedCart, Blog, Cart, Cartitems, Category, ChangeEvent, Course, CoursePopularity, CourseRecommendation,
+    CustomUser, Enrollment, InstructorProfile, InstructorStats, Order, RequestProfile, Review, StudentProfile, Tag,
+    Task, Tenant, WatchList, Watchitems,
+)
+from .serializers import (
+    CartCourseSerializer, CartSerializer, CourseRecommendationSerializer, InstructorSerializer, ReviewSerializer,
+    UserSerializer,
+)
+from .taskqueue import ImmediateBackend, task
+from .tenancy import registry, use_tenant
+from .websocket import with_websockets
+
+calls = []
+
+
+@task
+def record_call(value):
+    calls.append(value)
+
+
+class TaskWorkerTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def run_worker(self, *args):
+        call_command('run_tasks', '--once', *args, stderr=StringIO())
+
+    def test_runs_pending_task(self):
+        job = Task.objects.create(name=record_call.task_name, args=[1])
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Task.DONE)
+        self.assertIsNone(job.claimed_at)
+        self.assertEqual(calls, [1])
+
+    def test_requeues_task_with_expired_lease(self):
+        job = Task.objects.create(name=record_call.task_name, args=[2], status=Task.RUNNING,
+                                  claimed_at=timezone.now() - timedelta(hours=1))
+        self.run_worker('--lease', '60')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Task.DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(calls, [2])
+
+    def test_leaves_task_with_live_lease(self):
+        job = Task.objects.create(name=record_call.task_name, args=[3], status=Task.RUNNING,
+                                  claimed_at=timezone.now())
+        self.run_worker('--lease', '60')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Task.RUNNING)
+        self.assertEqual(calls, [])
+
+    def test_fails_task_that_keeps_losing_its_worker(self):
+        job = Task.objects.create(name=record_call.task_name, args=[4], status=Task.RUNNING,
+                                  attempts=4, claimed_at=timezone.now() - timedelta(hours=1))
+        self.run_worker('--lease', '60', '--max-attempts', '5')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Task.FAILED)
+        self.assertEqual(calls, [])
+
+
+class SignupTests(TestCase):
+    def test_profile_and_group_exist_right_after_signup(self):
+        instructor = CustomUser.objects.create_user(
+            'i@example.com', 'pw', username='i', name='I', is_instructor=True)
+        student = CustomUser.objects.create_user(
+            's@example.com', 'pw', username='s', name='S', is_student=True)
+
+        self.assertTrue(InstructorProfile.objects.filter(user=instructor).exists())
+        self.assertTrue(StudentProfile.objects.filter(user=student).exists())
+        self.assertTrue(instructor.groups.filter(name='Instructor').exists())
+        self.assertTrue(student.groups.filter(name='Student').exists())
+
+
+class DatabaseConfigTests(SimpleTestCase):
+    def test_sqlite_wal_is_opt_in(self):
+        self.assertNotIn('journal_mode', database_config(Path('/tmp'), env={})['PRAGMAS'])
+        pragmas = database_config(Path('/tmp'), env={'SQLITE_WAL': '1'})['PRAGMAS']
+        self.assertEqual(pragmas['journal_mode'], 'WAL')
+        self.assertEqual(pragmas['synchronous'], 'NORMAL')
+
+
+class RequestIdentityTests(TestCase):
+    def test_replica_routing_runs_after_sessions(self):
+        self.assertLess(settings.MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware'),
+                        settings.MIDDLEWARE.index('user.middleware.ReplicaRoutingMiddleware'))
+
+    def test_session_user_is_identified(self):
+        user = CustomUser.objects.create_user('a@example.com', 'pw', username='a', name='A')
+        self.client.force_login(user)
+        request = RequestFactory().get('/')
+        request.COOKIES = {name: morsel.value for name, morsel in self.client.cookies.items()}
+        SessionMiddleware(lambda request: None).process_request(request)
+        self.assertEqual(str(request_user_id(request)), str(user.pk))
+
+
+class EnrollmentCacheTests(TestCase):
+    def test_enrollment_saved_outside_checkout_updates_owned_set(self):
+        instructor = CustomUser.objects.create_user('i@example.com', 'pw', username='i', name='I')
+        student = CustomUser.objects.create_user('s@example.com', 'pw', username='s', name='S')
+        course = Course.objects.create(title='c', instructor=instructor, price=1, duration_in_hours=1)
+        self.assertEqual(owned_course_ids(student), set())
+
+        order = Order.objects.create(user=student, idempotency_key='admin', total_price=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.create(order=order, user=student, course=course, price=0)
+        self.assertEqual(owned_course_ids(student), {course.pk})
+
+
+class BulkReviewTests(TestCase):
+    def setUp(self):
+        instructor = CustomUser.objects.create_user('i@example.com', 'pw', username='i', name='I')
+        self.student = CustomUser.objects.create_user('s@example.com', 'pw', username='s', name='S')
+        self.courses = [Course.objects.create(title=f'c{n}', instructor=instructor, price=1,
+                                              duration_in_hours=1) for n in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def post(self, rating):
+        rows = [{'course_id': course.pk, 'rating': rating, 'comment': 'ok'} for course in self.courses]
+        return self.client.post('/api/reviews/bulk/', rows, format='json')
+
+    def test_created_then_updated(self):
+        response = self.post(4)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 2, 'updated': 0})
+
+        response = self.post(5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'created': 0, 'updated': 2})
+
+    def test_staff_review_for_unknown_user_is_rejected(self):
+        staff = CustomUser.objects.create_user('staff@example.com', 'pw', is_staff=True)
+        self.client.force_authenticate(staff)
+        row = {'course_id': self.courses[0].pk, 'rating': 4, 'comment': 'ok'}
+        response = self.client.post('/api/reviews/', {**row, 'user_id': 999999}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('user_id', response.json())
+        response = self.client.post('/api/reviews/bulk/', [{**row, 'user_id': 999999}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/reviews/', {**row, 'user_id': self.student.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Review.objects.filter(user=self.student, course=self.courses[0]).exists())
+
+
+@override_settings(ALLOWED_HOSTS=['testserver', 'a.example.com', 'b.example.com'])
+class CourseDetailTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = CustomUser.objects.create_user(
+            'i@example.com', 'pw', username='i', name='I', is_instructor=True)
+        self.course = Course.objects.create(title='c', instructor=self.instructor, price=1, duration_in_hours=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def test_instructor_is_read_only(self):
+        response = self.client.patch(f'/api/courses/{self.course.pk}/', {'instructor': 'x'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['instructor'], 'I')
+
+    def test_put_accepts_the_detail_payload(self):
+        data = self.client.get(f'/api/courses/{self.course.pk}/').json()
+        data.pop('image')
+        data['title'] = 'renamed'
+        response = self.client.put(f'/api/courses/{self.course.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Course.objects.get(pk=self.course.pk).title, 'renamed')
+
+    def test_cached_next_link_follows_the_host(self):
+        for n in range(21):
+            user = CustomUser.objects.create_user(f'r{n}@example.com', 'pw', username=f'r{n}', name='R')
+            Review.objects.create(user=user, course=self.course, rating=5, comment='ok')
+
+        url = f'/api/courses/{self.course.pk}/'
+        first = self.client.get(url, HTTP_HOST='a.example.com').json()['reviews']['next']
+        second = self.client.get(url, HTTP_HOST='b.example.com').json()['reviews']['next']
+        self.assertTrue(first.startswith('http://a.example.com/'))
+        self.assertTrue(second.startswith('http://b.example.com/'))
+
+
+@override_settings(RECOMMENDATIONS_TOP_K=2)
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = CustomUser.objects.create_user('i@example.com', 'pw', username='i', name='I')
+        self.courses = [Course.objects.create(title=f'c{n}', instructor=instructor, price=1,
+                                              duration_in_hours=1) for n in range(5)]
+        self.users = [CustomUser.objects.create_user(f'u{n}@example.com', 'pw', username=f'u{n}', name='U')
+                      for n in range(4)]
+
+    def watch(self, user, *courses):
+        watchlist, _ = WatchList.objects.get_or_create(user=user)
+        for course in courses:
+            Watchitems.objects.create(watchlist=watchlist, course=course)
+
+    def cart(self, user, *courses):
+        cart = Cart.objects.create(user=user)
+        for course in courses:
+            Cartitems.objects.create(cart=cart, course=course)
+
+    def table(self):
+        return {(course_id, other): round(score, 9) for course_id, other, score in
+                CourseRecommendation.objects.values_list('course_id', 'recommended_id', 'score')}
+
+    def test_refresh_matches_full_rebuild(self):
+        a, b, c, d, e = self.courses
+        self.watch(self.users[0], a, b, c)
+        self.watch(self.users[1], b, c, d)
+        self.cart(self.users[2], c, d, e)
+        recommendations.build_all()
+
+        # What the signals do: refresh every course that was added.
+        self.cart(self.users[3], a, b, d)
+        self.cart(self.users[1], a)
+        for course in (a, b, d):
+            recommendations.refresh_course(course.pk)
+        refreshed = self.table()
+
+        recommendations.build_all()
+        self.assertEqual(refreshed, self.table())
+
+    def test_refresh_when_course_drops_out_of_full_lists(self):
+        a, b, c, d, e = self.courses
+        self.watch(self.users[0], a, b, c)
+        self.watch(self.users[1], a, c, d)
+        self.cart(self.users[2], b, c, d, e)
+        recommendations.build_all()
+
+        # A user of a alone lowers every score a takes part in.
+        self.cart(self.users[3], a)
+        self.watch(self.users[3], a)
+        recommendations.refresh_course(a.pk)
+        refreshed = self.table()
+
+        recommendations.build_all()
+        self.assertEqual(refreshed, self.table())
+
+    def test_endpoint(self):
+        a, b, c, d, e = self.courses
+        self.watch(self.users[0], a, b, c)
+        self.watch(self.users[1], a, b)
+        recommendations.build_all()
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        ranked = client.get(f'/api/courses/{a.pk}/recommendations/').json()
+        self.assertEqual([row['course']['id'] for row in ranked][:2], [b.pk, c.pk])
+        self.assertEqual(client.get('/api/courses/abc/recommendations/').json(), [])
+
+    def test_burst_schedules_one_trailing_refresh(self):
+        course = self.courses[0]
+        with mock.patch.object(tasks.refresh_recommendations, 'delay_for') as delay_for:
+            for _ in range(3):
+                recommendations.schedule_refresh(course.pk)
+            delay_for.assert_called_once_with(settings.RECOMMENDATIONS_REFRESH_SECONDS, course.pk)
+
+            tasks.refresh_recommendations(course.pk)
+            recommendations.schedule_refresh(course.pk)
+            self.assertEqual(delay_for.call_count, 2)
+
+
+class LoginThrottleTests(TestCase):
+    def test_forwarded_for_does_not_reset_the_limit(self):
+        limit = int(api_settings.DEFAULT_THROTTLE_RATES['login'].split('/')[0])
+        client = APIClient(REMOTE_ADDR='203.0.113.9')
+        codes = [client.post('/api/login/', {'email': 'x@example.com', 'password': 'x'}, format='json',
+                             HTTP_X_FORWARDED_FOR=f'198.51.100.{n}').status_code
+                 for n in range(limit + 1)]
+        self.assertNotIn(429, codes[:-1])
+        self.assertEqual(codes[-1], 429)
+
+
+LAZY_ADMIN_SCRIPT = """
+import sys
+import django
+django.setup()
+from django.test import Client
+from django.urls import reverse
+Client().get('/api/courses/')
+reverse('course-reviews-list', kwargs={'course_pk': 1})
+before = 'user.admin' in sys.modules
+reverse('admin:index')
+print(before, 'user.admin' in sys.modules)
+"""
+
+
+class LazyAdminTests(SimpleTestCase):
+    def test_admin_loads_on_first_admin_url(self):
+        output = subprocess.run(
+            [sys.executable, '-c', LAZY_ADMIN_SCRIPT], cwd=settings.BASE_DIR, check=True,
+            capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'base.settings'}).stdout
+        self.assertEqual(output.split(), ['False', 'True'])
+
+
+class CourseSearchTests(TestCase):
+    def test_search_goes_through_the_deferred_filter_backend(self):
+        instructor = CustomUser.objects.create_user('i@example.com', 'pw', username='i', name='I')
+        student = CustomUser.objects.create_user('s@example.com', 'pw', username='s', name='S',
+                                                 is_student=True)
+        for title in ('django basics', 'painting'):
+            Course.objects.create(title=title, instructor=instructor, price=1, duration_in_hours=1)
+        client = APIClient()
+        client.force_authenticate(student)
+        response = client.get('/api/courses/', {'search': 'djan'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['title'] for row in response.json()['results']], ['django basics'])
+
+
+class AdminTests(TestCase):
+    def test_changelists_render_users_without_username(self):
+        admin_user = CustomUser.objects.create_superuser('root@example.com', 'pw')
+        Course.objects.create(title='c', instructor=admin_user, price=1, duration_in_hours=1)
+        InstructorProfile.objects.create(user=admin_user)
+        self.client.force_login(admin_user)
+        for url in ('/admin/user/course/', '/admin/user/instructorprofile/', '/admin/user/customuser/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertContains(response, 'root@example.com')
+
+    def test_carts_and_watchlists_with_and_without_users(self):
+        admin_user = CustomUser.objects.create_superuser('root@example.com', 'pw')
+        course = Course.objects.create(title='c', instructor=admin_user, price=1, duration_in_hours=1)
+        for user in (admin_user, None):
+            cart = Cart.objects.create(user=user)
+            Cartitems.objects.create(cart=cart, course=course)
+            watchlist = WatchList.objects.create(user=user)
+            Watchitems.objects.create(watchlist=watchlist, course=course)
+        Cartitems.objects.create(cart=None, course=course)
+        self.assertEqual(str(Cart.objects.get(user=admin_user)), 'root@example.com Cart')
+        self.assertEqual(str(Watchitems.objects.get(watchlist__user=admin_user)), 'root@example.com items')
+
+        self.client.force_login(admin_user)
+        for url in ('/admin/user/cart/', '/admin/user/cartitems/', '/admin/user/watchlist/',
+                    '/admin/user/watchitems/'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertContains(response, 'root@example.com')
+            self.assertNotContains(response, 'None')
+
+
+class CompressionTests(SimpleTestCase):
+    def compress(self, content_type):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        body = b'{"token": "x"}' * 200
+        fake_brotli = mock.Mock(compress=lambda content, quality: b'br')
+        with mock.patch.object(middleware, 'brotli', fake_brotli):
+            response = middleware.CompressionMiddleware(
+                lambda request: HttpResponse(body, content_type=content_type))(request)
+        return response['Content-Encoding']
+
+    def test_brotli_only_for_json(self):
+        self.assertEqual(self.compress('application/json'), 'br')
+        # Pages that may carry a CSRF token keep gzip's BREACH padding.
+        self.assertEqual(self.compress('text/html; charset=utf-8'), 'gzip')
+
+
+class FastSerializerTests(TestCase):
+    """Each Fast*Serializer must render exactly what its DRF serializer does."""
+
+    @classmethod
+    def setUpTestData(cls):
+        instructor = CustomUser.objects.create_user(
+            'teacher@example.com', 'pw', username='teacher', name='Teacher', is_instructor=True)
+        students = [CustomUser.objects.create_user(
+            f's{n}@example.com', 'pw', username=f's{n}', name=f'Student {n}' if n % 2 else None,
+            is_student=True, is_instructor=n == 3) for n in range(4)]
+        courses = [Course.objects.create(
+            title=f'Course {n}', instructor=instructor, price=f'{n}.50', duration_in_hours=n,
+            image='courses/cover.png' if n % 2 else '') for n in range(4)]
+        for n, student in enumerate(students):
+            Review.objects.create(user=student, course=courses[n % 2], rating=n + 1, comment=f'Review {n}')
+        for rank, other in enumerate(courses[1:], start=1):
+            CourseRecommendation.objects.create(course=courses[0], recommended=other, score=1 / rank, rank=rank)
+
+    def assert_same(self, slow_class, fast_class, queryset):
+        context = {'request': APIRequestFactory().get('/api/users/')}
+        slow = slow_class(queryset.all(), many=True, context=context).data
+        fast = fast_class(queryset.all(), context=context).data
+        self.assertTrue(fast)
+        self.assertEqual(JSONRenderer().render(slow), JSONRenderer().render(fast))
+        self.assertEqual(FastJSONRenderer().render(slow), FastJSONRenderer().render(fast))
+
+    def test_users(self):
+        self.assert_same(UserSerializer, fast_serializers.FastUserSerializer,
+                         CustomUser.objects.filter(is_student=True).order_by('pk'))
+
+    def test_instructors(self):
+        self.assert_same(InstructorSerializer, fast_serializers.FastInstructorSerializer,
+                         CustomUser.objects.filter(is_instructor=True).order_by('pk'))
+
+    def test_reviews(self):
+        self.assert_same(ReviewSerializer, fast_serializers.FastReviewSerializer,
+                         Review.objects.select_related('user', 'course').order_by('pk'))
+
+    def test_cart_courses(self):
+        self.assert_same(CartCourseSerializer, fast_serializers.FastCartCourseSerializer,
+                         Course.objects.order_by('pk'))
+
+    def test_recommendations(self):
+        self.assert_same(CourseRecommendationSerializer, fast_serializers.FastCourseRecommendationSerializer,
+                         CourseRecommendation.objects.select_related('recommended').order_by('pk'))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver', 'other.example.com'])
+class TenantIsolationTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.other = Tenant.objects.create(slug='other', name='Other', domain='other.example.com')
+        self.instructor = CustomUser.objects.create_user(
+            'i@example.com', 'pw', username='i', name='I', is_instructor=True)
+        course = Course.objects.create(title='c', instructor=self.instructor, price=1, duration_in_hours=1)
+        Review.objects.create(user=self.instructor, course=course, rating=5, comment='ok')
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def tearDown(self):
+        registry.clear()
+
+    def test_reviews_and_profiles_stay_in_their_tenant(self):
+        for url in ('/api/reviews/', '/api/instructor-profile/'):
+            self.assertEqual(self.client.get(url).json()['count'], 1, url)
+            self.assertEqual(self.client.get(url, HTTP_HOST='other.example.com').json()['count'], 0, url)
+
+    def test_profiles_do_not_expose_password_hashes(self):
+        profile = self.client.get('/api/instructor-profile/').json()['results'][0]
+        self.assertNotIn('password', profile['user'])
+
+    def test_email_taken_in_another_tenant_fails_validation(self):
+        with use_tenant(self.other):
+            with self.assertRaises(ValidationError):
+                CustomUser(email='i@example.com', password='x').validate_unique()
+
+
+class CartArchiveTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('s@example.com', 'pw', username='s')
+        self.course = Course.objects.create(title='c', instructor=self.user, price=1, duration_in_hours=1)
+
+    def checkout(self, days_ago):
+        cart = Cart.objects.open_or_create_for(self.user)
+        Cartitems.objects.create(cart=cart, course=self.course)
+        long_ago = timezone.now() - timedelta(days=days_ago)
+        Cart.objects.filter(pk=cart.pk).update(created=long_ago - timedelta(days=365), updated=long_ago)
+        with mock.patch('user.checkout.timezone.now', return_value=long_ago):
+            checkout_cart(self.user, f'key-{days_ago}')
+        return cart
+
+    def test_completed_carts_age_from_checkout(self):
+        recent = self.checkout(days_ago=1)
+        Enrollment.objects.all().delete()
+        old = self.checkout(days_ago=settings.CART_ARCHIVE_COMPLETED_DAYS + 1)
+        moved = archive_carts()
+        self.assertEqual(moved['completed'], 1)
+        self.assertTrue(Cart.objects.filter(pk=recent.pk).exists())
+        self.assertFalse(Cart.objects.filter(pk=old.pk).exists())
+        self.assertIsNotNone(ArchivedCart.objects.get(pk=old.pk).completed_at)
+
+    def test_one_open_cart_per_user(self):
+        cart = Cart.objects.open_or_create_for(self.user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cart.objects.create(user=self.user)
+        # The lookup raced with another request that opened a cart first.
+        with mock.patch('user.models.CartQuerySet.open_for', side_effect=[None, cart]):
+            self.assertEqual(Cart.objects.open_or_create_for(self.user), cart)
+        self.assertEqual(Cart.objects.filter(user=self.user, completed=False).count(), 1)
+
+
+class ChangeStreamTests(TestCase):
+    def setUp(self):
+        self.other = Tenant.objects.create(slug='other', name='Other')
+        self.user = CustomUser.objects.create_user('s@example.com', 'pw', username='s')
+        with use_tenant(self.other):
+            self.course = Course.objects.create(title='c', instructor=self.user, price=1, duration_in_hours=1)
+
+    def event(self, pk):
+        return ChangeEvent.objects.create(id=pk, model='course', object_id=str(pk), op=ChangeEvent.UPDATE)
+
+    def test_late_commit_is_not_skipped(self):
+        after = read_changes(0)[-1]['position']
+        self.event(1000)
+        first = read_changes(after)
+        self.assertEqual([event['id'] for event in first], [1000])
+        # Inserted (id allocated) before 1000 but committed after it was read.
+        self.event(999)
+        self.assertEqual([event['id'] for event in read_changes(first[-1]['position'])], [999])
+
+    def test_events_carry_the_course_tenant_outside_requests(self):
+        course = Course.all_tenants.get(pk=self.course.pk)
+        Review.objects.create(user=self.user, course=course, rating=4, comment='ok')
+        watchlist = WatchList.objects.create(user=self.user)
+        Watchitems.objects.create(watchlist=watchlist, course_id=self.course.pk)
+        events = read_changes(0, models=['review', 'watchitem'])
+        self.assertEqual([event['tenant_id'] for event in events], [self.other.pk, self.other.pk])
+
+    def test_archived_cart_items_are_archive_events(self):
+        cart = Cart.objects.create(user=self.user, tenant=self.other)
+        Cartitems.objects.create(cart=cart, course=self.course)
+        Cart.all_tenants.filter(pk=cart.pk).update(updated=timezone.now() - timedelta(days=365))
+        archive_carts()
+        ops = [event['op'] for event in read_changes(0, models=['cartitem'])]
+        self.assertEqual(ops, [ChangeEvent.CREATE, ChangeEvent.ARCHIVE])
+
+
+class RealtimeSyncTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('s@example.com', 'pw', username='s', is_student=True)
+        self.course = Course.objects.create(title='c', instructor=self.user, price=1, duration_in_hours=1)
+        self.cart = Cart.objects.open_or_create_for(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    async def connect(self, subprotocols):
+        scope = {'type': 'websocket', 'path': '/ws/sync/', 'subprotocols': subprotocols, 'headers': []}
+        communicator = ApplicationCommunicator(with_websockets(None), scope)
+        await communicator.send_input({'type': 'websocket.connect'})
+        return communicator, await communicator.receive_output(1)
+
+    def test_rejects_missing_and_invalid_tokens(self):
+        async def scenario():
+            for subprotocols in ([], ['jwt', 'not-a-token']):
+                communicator, message = await self.connect(subprotocols)
+                self.assertEqual(message, {'type': 'websocket.close', 'code': 4401})
+                await communicator.wait(1)
+        async_to_sync(scenario)()
+
+    def test_pushes_cart_changes_to_the_user(self):
+        def add_and_remove():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/cart/add_item/', {'course_id': self.course.pk}, format='json')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.delete('/api/cart/remove_item/', {'course_id': self.course.pk}, format='json')
+
+        async def scenario():
+            communicator, message = await self.connect(['jwt', str(AccessToken.for_user(self.user))])
+            self.assertEqual(message, {'type': 'websocket.accept', 'subprotocol': 'jwt'})
+            await asyncio.sleep(0)  # let the socket subscribe
+            await sync_to_async(add_and_remove)()
+            added = json.loads((await communicator.receive_output(1))['text'])
+            removed = json.loads((await communicator.receive_output(1))['text'])
+            self.assertEqual(added['type'], 'cart.item_added')
+            self.assertEqual(removed, {
+                'type': 'cart.item_removed', 'cart': str(self.cart.pk), 'course_id': self.course.pk})
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(1)
+        async_to_sync(scenario)()
+
+    def test_bulk_and_cascading_deletes_are_not_pushed(self):
+        Cartitems.objects.create(cart=self.cart, course=self.course)
+        watchlist = WatchList.objects.create(user=self.user)
+        Watchitems.objects.create(watchlist=watchlist, course=self.course)
+        with mock.patch('user.signals.publish_on_commit') as publish:
+            Cartitems.objects.filter(cart=self.cart).delete()
+            self.course.delete()
+        publish.assert_not_called()
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILE_KEEP=2)
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.staff = CustomUser.objects.create_user('staff@example.com', 'pw', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def test_keeps_the_newest_profiles_in_the_database(self):
+        token = profiling.make_token()
+        ids = [int(self.client.get('/api/', HTTP_X_PROFILE=token)['X-Profile-Id']) for _ in range(3)]
+        listed = self.client.get('/api/profiles/').json()['results']
+        self.assertEqual([entry['id'] for entry in listed], ids[:0:-1])
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+        download = self.client.get(f'/api/profiles/{ids[-1]}/')
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(marshal.loads(download.content))
+        self.assertEqual(self.client.get(f'/api/profiles/{ids[0]}/').status_code, 404)
+
+
+class CourseReviewPaginationTests(TestCase):
+    def setUp(self):
+        instructor = CustomUser.objects.create_user('i@example.com', 'pw', username='i')
+        self.course = Course.objects.create(title='c', instructor=instructor, price=1, duration_in_hours=1)
+        for n in range(25):
+            user = CustomUser.objects.create_user(f'r{n}@example.com', 'pw', username=f'r{n}', name=f'R{n}')
+            Review.objects.create(user=user, course=self.course, rating=n % 5 + 1, comment='ok')
+        self.url = f'/api/courses/{self.course.pk}/reviews/'
+        self.client = APIClient()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            page = self.client.get(url).json()
+            ids += [review['id'] for review in page['results']]
+            url = page['next']
+        return ids
+
+    def test_pages_follow_the_ordering_without_gaps(self):
+        reviews = Review.objects.filter(course=self.course)
+        expected = {
+            'newest': reviews.order_by('-created_at', '-id'),
+            'oldest': reviews.order_by('created_at', 'id'),
+            'highest': reviews.order_by('-rating', '-created_at', '-id'),
+        }
+        for ordering, queryset in expected.items():
+            ids = self.walk(f'{self.url}?ordering={ordering}&page_size=7')
+            self.assertEqual(ids, list(queryset.values_list('pk', flat=True)), ordering)
+
+    def test_invalid_cursors_and_courses_are_404(self):
+        def cursor(payload):
+            return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        for value in ('not-base64!', cursor(['newest', ['garbage', 'x']]), cursor(['nope', [1, 2]]),
+                      cursor(['newest', [1]]), cursor([['newest'], [1, 2]])):
+            self.assertEqual(self.client.get(self.url, {'cursor': value}).status_code, 404, value)
+        self.assertEqual(self.client.get(self.url, {'ordering': 'nope'}).status_code, 404)
+        self.assertEqual(self.client.get('/api/courses/abc/reviews/').status_code, 404)
+        self.assertEqual(self.client.get('/api/courses/999999/reviews/').status_code, 404)
+
+
+class InstructorStatsTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('user.taskqueue.get_backend', return_value=ImmediateBackend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.instructor = CustomUser.objects.create_user('i@example.com', 'pw', username='i', is_instructor=True)
+        self.students = [CustomUser.objects.create_user(f's{n}@example.com', 'pw', username=f's{n}')
+                         for n in range(2)]
+
+    def stats(self):
+        return {row.pop('instructor_id'): row for row in InstructorStats.objects.values(
+            'instructor_id', 'course_count', 'review_count', 'rating_total', 'students')}
+
+    def rebuilt(self):
+        call_command('rebuild_instructor_stats', stdout=StringIO())
+        return self.stats()
+
+    def test_signals_keep_counters_equal_to_a_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            courses = [Course.objects.create(title=f'c{n}', instructor=self.instructor, price=1,
+                                             duration_in_hours=1) for n in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Review.objects.create(user=self.students[0], course=courses[0], rating=4, comment='ok')
+            Review.objects.create(user=self.students[1], course=courses[0], rating=2, comment='ok')
+        with self.captureOnCommitCallbacks(execute=True):
+            first.rating = 5
+            first.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            courses[2].delete()
+        for student in self.students:
+            cart = Cart.objects.open_or_create_for(student)
+            Cartitems.objects.create(cart=cart, course=courses[0])
+            Cartitems.objects.create(cart=cart, course=courses[1])
+            with self.captureOnCommitCallbacks(execute=True):
+                checkout_cart(student, 'key')
+
+        incremental = self.stats()
+        self.assertEqual(incremental[self.instructor.pk],
+                         {'course_count': 2, 'review_count': 2, 'rating_total': 7, 'students': 2})
+        self.assertEqual(incremental, self.rebuilt())
+
+    def test_rebuild_fixes_drifted_rows(self):
+        Course.objects.create(title='c', instructor=self.instructor, price=1, duration_in_hours=1)
+        InstructorStats.objects.update(course_count=40)
+        self.assertEqual(self.rebuilt()[self.instructor.pk]['course_count'], 1)
+
+    def test_migration_backfills_existing_instructors(self):
+        course = Course.objects.create(title='c', instructor=self.instructor, price=1, duration_in_hours=1)
+        Review.objects.create(user=self.students[0], course=course, rating=3, comment='ok')
+        expected = self.rebuilt()
+        InstructorStats.objects.all().delete()
+        migration = import_module('user.migrations.0026_backfill_instructor_stats')
+        migration.backfill_instructor_stats(django_apps, None)
+        self.assertEqual(self.stats(), expected)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver', 'a.example.com', 'b.example.com'])
+class BlogFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUser.objects.create_user('a@example.com', 'pw', username='a', name='A')
+        self.posts = [Blog.objects.create(title=f'p{n}', content='x' * 500, author=self.author) for n in range(12)]
+        self.client = APIClient()
+
+    def test_feed_pages_through_excerpts(self):
+        first = self.client.get('/api/blog/').json()
+        self.assertEqual(len(first['results']), 10)
+        self.assertEqual(len(first['results'][0]['excerpt']), settings.BLOG_EXCERPT_LENGTH)
+        self.assertNotIn('content', first['results'][0])
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+
+    def test_cached_next_link_follows_the_host(self):
+        first = self.client.get('/api/blog/', HTTP_HOST='a.example.com').json()['next']
+        second = self.client.get('/api/blog/', HTTP_HOST='b.example.com').json()['next']
+        self.assertTrue(first.startswith('http://a.example.com/api/blog/?cursor='))
+        self.assertTrue(second.startswith('http://b.example.com/api/blog/?cursor='))
+
+    def test_save_and_delete_invalidate_the_feed(self):
+        self.client.get('/api/blog/')
+        post = self.posts[-1]
+        post.title = 'renamed'
+        post.save()
+        self.assertEqual(self.client.get('/api/blog/').json()['results'][0]['title'], 'renamed')
+        self.assertEqual(self.client.get(f'/api/blog/{post.pk}/').json()['title'], 'renamed')
+        post.delete()
+        self.assertNotEqual(self.client.get('/api/blog/').json()['results'][0]['id'], post.pk)
+        self.assertEqual(self.client.get(f'/api/blog/{post.pk}/').status_code, 404)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('s@example.com', 'pw', username='s')
+        self.courses = [Course.objects.create(title=f'c{n}', instructor=self.user, price=n + 1,
+                                              duration_in_hours=1) for n in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, *courses):
+        cart = Cart.objects.open_or_create_for(self.user)
+        for course in courses:
+            Cartitems.objects.create(cart=cart, course=course)
+        return cart
+
+    def checkout(self, key='key-1'):
+        return self.client.post('/api/cart/checkout/', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_with_the_same_key_returns_the_original_order(self):
+        cart = self.add(*self.courses)
+        first = self.checkout()
+        self.assertEqual(first.status_code, 201, first.content)
+        retry = self.checkout()
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Enrollment.objects.filter(user=self.user).count(), 2)
+        self.assertTrue(Cart.objects.get(pk=cart.pk).completed)
+        self.assertIsNotNone(Cart.objects.open_for(self.user))
+
+    def test_concurrent_request_with_the_same_key_returns_the_winner(self):
+        self.add(self.courses[0])
+        order, created = checkout_cart(self.user, 'key-1')
+        self.assertTrue(created)
+        cart = self.add(self.courses[1])
+
+        # This request's first lookup ran before the winner committed.
+        real_filter = Order.objects.filter
+        lookups = []
+
+        def filter(*args, **kwargs):
+            lookups.append(kwargs)
+            queryset = real_filter(*args, **kwargs)
+            return queryset.none() if len(lookups) == 1 else queryset
+
+        with mock.patch.object(Order.objects, 'filter', side_effect=filter):
+            self.assertEqual(checkout_cart(self.user, 'key-1'), (order, False))
+        # The losing attempt was rolled back.
+        self.assertFalse(Cart.objects.get(pk=cart.pk).completed)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertFalse(Enrollment.objects.filter(course=self.courses[1]).exists())
+
+    def test_empty_missing_and_already_owned_carts_are_rejected(self):
+        self.assertEqual(self.client.post('/api/cart/checkout/').status_code, 400)
+        self.assertEqual(self.checkout().status_code, 400)
+        cart = self.add()
+        self.assertEqual(self.checkout().status_code, 400)
+
+        self.add(self.courses[0])
+        self.assertEqual(self.checkout('key-2').status_code, 201)
+        self.add(self.courses[0])
+        response = self.checkout('key-3')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already own', response.json()['error'])
+        self.assertTrue(Cart.objects.open_for(self.user).items.exists())
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertTrue(Cart.objects.get(pk=cart.pk).completed)
+
+
+class SignupAndLoginTests(TransactionTestCase):
+    # Logins validate on an executor thread, which cannot see a TestCase's
+    # uncommitted rows; keep the default tenant the migrations created.
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+
+    def test_signup_hashes_the_password_in_one_insert(self):
+        for url in ('/api/users/', '/api/instructor/'):
+            email = f'{url.strip("/").replace("/", "-")}@example.com'
+            with CaptureQueriesContext(connection) as queries:
+                response = APIClient().post(url, {'email': email, 'password': 'secret-pw', 'username': 'u'},
+                                            format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertNotIn('password', response.json())
+            writes = [query['sql'] for query in queries.captured_queries
+                      if query['sql'].startswith(('INSERT INTO "user_customuser" ', 'UPDATE "user_customuser" '))]
+            self.assertEqual(len(writes), 1, writes)
+            self.assertTrue(writes[0].startswith('INSERT'))
+            user = CustomUser.objects.get(email=email)
+            self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+            self.assertTrue(user.check_password('secret-pw'))
+
+    def login(self, password):
+        return self.client.post('/api/login/async/', {'email': 'l@example.com', 'password': password},
+                                content_type='application/json')
+
+    def test_async_login(self):
+        CustomUser.objects.create_user('l@example.com', 'secret-pw')
+        response = self.login('secret-pw')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(set(response.json()), {'access', 'refresh'})
+        self.assertEqual(self.login('wrong').status_code, 401)
+
+    def test_hash_from_another_hasher_verifies_and_is_upgraded(self):
+        user = CustomUser.objects.create_user('l@example.com')
+        user.password = make_password('secret-pw', hasher='scrypt')
+        user.save(update_fields=['password'])
+        self.assertEqual(self.login('secret-pw').status_code, 200)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(user.check_password('secret-pw'))
+
+
+@override_settings(LEADERBOARD_FLUSH_SECONDS=3600)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        boards = mock.patch.dict(leaderboard._boards, clear=True)
+        boards.start()
+        self.addCleanup(boards.stop)
+        self.root = Category.objects.create(name='Code', slug='code')
+        self.art = Category.objects.create(name='Art', slug='art')
+        child = Category.objects.create(name='Python', slug='python', parent=self.root)
+        instructor = CustomUser.objects.create_user('i@example.com', 'pw', username='i', name='I')
+        self.a, self.b, self.c = [
+            Course.objects.create(title=f'c{n}', instructor=instructor, price=1, duration_in_hours=1,
+                                  category=category)
+            for n, category in enumerate((child, self.root, self.art))]
+        self.now = timezone.now()
+
+    def stored(self):
+        board = leaderboard.Leaderboard()
+        return {course_id: round(board.current_score(score, self.now), 6)
+                for course_id, score in CoursePopularity.objects.values_list('course_id', 'log_score')}
+
+    def test_decay(self):
+        board = leaderboard.Leaderboard()
+        half_life = timedelta(hours=settings.LEADERBOARD_HALF_LIFE_HOURS)
+        old = leaderboard.log_event(1.0, self.now - 2 * half_life)
+        self.assertAlmostEqual(board.current_score(old, self.now), 0.25)
+        self.assertAlmostEqual(board.current_score(old, self.now + half_life), 0.125)
+
+        combined = leaderboard.logaddexp(leaderboard.log_event(3.0, self.now),
+                                         leaderboard.log_event(2.0, self.now - half_life))
+        self.assertAlmostEqual(board.current_score(combined, self.now), 4.0)
+
+    def test_ranks(self):
+        board = leaderboard.Leaderboard()
+        board.record(self.a.pk, 1.0, at=self.now)
+        board.record(self.b.pk, 3.0, at=self.now)
+        board.record(self.c.pk, 2.0, at=self.now)
+
+        self.assertEqual([board.rank(course.pk) for course in (self.a, self.b, self.c)], [3, 1, 2])
+        self.assertEqual([course_id for course_id, _ in board.top(2)], [self.b.pk, self.c.pk])
+        # Groups come from the table on reload, or from the event itself.
+        self.assertIsNone(board.rank(self.b.pk, self.root.pk))
+        board.record(self.c.pk, 0.5, at=self.now - timedelta(days=365), group=self.art.pk)
+        self.assertEqual(board.rank(self.c.pk, self.art.pk), 1)
+        board.sync()
+        # The group is the root of the course's category path.
+        self.assertEqual([course_id for course_id, _ in board.top(10, self.root.pk)], [self.b.pk, self.a.pk])
+        self.assertEqual(board.rank(self.a.pk, self.root.pk), 2)
+        self.assertIsNone(board.rank(self.c.pk, self.root.pk))
+        self.assertEqual(board.rank(self.c.pk, self.art.pk), 1)
+
+        # An event one half-life old counts for half its weight.
+        half_life = timedelta(hours=settings.LEADERBOARD_HALF_LIFE_HOURS)
+        board.record(self.c.pk, 3.0, at=self.now - half_life)
+        self.assertEqual([board.rank(course.pk) for course in (self.a, self.b, self.c)], [3, 2, 1])
+        board.record(self.a.pk, 4.0, at=self.now)
+        self.assertEqual([board.rank(course.pk) for course in (self.a, self.b, self.c)], [1, 3, 2])
+        self.assertEqual(board.rank(self.a.pk, self.root.pk), 1)
+        self.assertIsNone(board.rank(999999))
+
+    def test_sync_merges_into_table(self):
+        # Two processes: each keeps its own events until it flushes.
+        first, second = leaderboard.Leaderboard(), leaderboard.Leaderboard()
+        first.record(self.a.pk, 3.0, at=self.now)
+        second.record(self.b.pk, 1.0, at=self.now)
+        second.record(self.b.pk, 4.0, at=self.now)
+        first.record(self.a.pk, 1.0, at=self.now)
+        self.assertIsNone(first.rank(self.b.pk))
+        self.assertEqual(self.stored(), {self.a.pk: 3.0, self.b.pk: 1.0})
+
+        second.sync()
+        first.sync()
+        self.assertEqual(self.stored(), {self.a.pk: 4.0, self.b.pk: 5.0})
+        for board in (first, second):
+            board.sync()
+            self.assertEqual([board.rank(self.b.pk), board.rank(self.a.pk)], [1, 2])
+
+        # Events recorded after a sync stay on top of the reloaded table.
+        first.record(self.a.pk, 2.0, at=self.now)
+        first.sync()
+        second.sync()
+        self.assertEqual(self.stored(), {self.a.pk: 6.0, self.b.pk: 5.0})
+        self.assertEqual(second.rank(self.a.pk), 1)
+
+    def test_endpoints(self):
+        for course, weight in ((self.a, 1.0), (self.b, 3.0), (self.c, 2.0)):
+            CoursePopularity.objects.create(course=course, log_score=leaderboard.log_event(weight, self.now))
+        client = APIClient()
+        client.force_authenticate(self.a.instructor)
+
+        rows = client.get('/api/courses/trending/').json()
+        self.assertEqual([(row['rank'], row['course']['id']) for row in rows],
+                         [(1, self.b.pk), (2, self.c.pk), (3, self.a.pk)])
+        self.assertAlmostEqual(rows[0]['score'], 3.0, places=3)
+        rows = client.get('/api/courses/trending/', {'category': self.root.pk, 'limit': 1}).json()
+        self.assertEqual([row['course']['id'] for row in rows], [self.b.pk])
+        response = client.get('/api/courses/trending/', {'category': self.a.category_id})
+        self.assertEqual(response.status_code, 400)
+
+        self.assertEqual(client.get(f'/api/courses/{self.a.pk}/rank/').json(), {'rank': 3})
+        self.assertEqual(client.get('/api/courses/abc/rank/').json(), {'rank': None})
+
+        # Another worker's events show up once this one flushes.
+        other = leaderboard.Leaderboard()
+        other.record(self.a.pk, 5.0, at=self.now)
+        other.sync()
+        self.assertEqual(client.get(f'/api/courses/{self.a.pk}/rank/').json(), {'rank': 3})
+        with override_settings(LEADERBOARD_FLUSH_SECONDS=0):
+            self.assertEqual(client.get(f'/api/courses/{self.a.pk}/rank/').json(), {'rank': 1})
+            rows = client.get('/api/courses/trending/').json()
+        self.assertEqual([row['course']['id'] for row in rows], [self.a.pk, self.b.pk, self.c.pk])
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.instructor = CustomUser.objects.create_user(
+            'i@example.com', 'pw', username='i', name='I', is_instructor=True)
+        self.courses = [Course.objects.create(title=f'c{n}', instructor=self.instructor, price=n + 1,
+                                              duration_in_hours=1) for n in range(4)]
+        self.student = CustomUser.objects.create_user('s@example.com', 'pw', username='s', name='S')
+        cart = Cart.objects.create(user=self.student)
+        for course in self.courses[:2]:
+            Cartitems.objects.create(cart=cart, course=course)
+        watchlist = WatchList.objects.create(user=self.student)
+        Watchitems.objects.create(watchlist=watchlist, course=self.courses[2])
+        self.reviews = [Review.objects.create(user=user, course=course, rating=4, comment='ok')
+                        for user in (self.student, self.instructor) for course in self.courses]
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def tearDown(self):
+        registry.clear()
+
+    def batch(self, **query):
+        return self.client.post('/api/batch/', query, format='json')
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        query = {'me': True, 'courses': [self.courses[0].pk], 'reviews': [self.reviews[0].pk]}
+        self.batch(**query)
+        # Cart, cart items, watchlist, watch items, reviews, previews, courses, tags, users.
+        with self.assertNumQueries(9):
+            data = self.batch(**query).json()
+        with self.assertNumQueries(9):
+            data = self.batch(me=True, courses=[course.pk for course in self.courses],
+                              reviews=[review.pk for review in self.reviews]).json()
+
+        self.assertEqual(data['me']['user']['id'], self.student.pk)
+        self.assertEqual([item['course']['id'] for item in data['me']['cart']['items']],
+                         [course.pk for course in self.courses[:2]])
+        self.assertEqual(data['me']['cart']['total_price'], '3.00')
+        self.assertEqual(len(data['me']['watchlist']['items']), 1)
+        self.assertEqual(data['courses'][str(self.courses[1].pk)]['instructor'], 'I')
+        self.assertEqual(data['reviews'][str(self.reviews[0].pk)]['id'], self.reviews[0].pk)
+
+    def test_missing_ids_are_null(self):
+        data = self.batch(courses=[self.courses[0].pk, 999999], reviews=[999999], users=[999999]).json()
+        self.assertIsNotNone(data['courses'][str(self.courses[0].pk)])
+        self.assertIsNone(data['courses']['999999'])
+        self.assertEqual(data['reviews'], {'999999': None})
+        self.assertEqual(data['users'], {'999999': None})
+        self.assertNotIn('me', data)
+
+    def test_reviews_by_users_of_another_tenant_are_dropped(self):
+        other = Tenant.objects.create(slug='other', name='Other', domain='other.example.com')
+        with use_tenant(other):
+            outsider = CustomUser.objects.create_user('o@example.com', 'pw', username='o', name='O')
+        # The course is ours, so the review row is visible; its author is not.
+        course = self.courses[3]
+        foreign = Review.objects.create(user=outsider, course=course, rating=1, comment='spam')
+
+        data = self.batch(courses=[course.pk], reviews=[foreign.pk, self.reviews[3].pk],
+                          users=[outsider.pk]).json()
+        self.assertIsNone(data['reviews'][str(foreign.pk)])
+        self.assertIsNotNone(data['reviews'][str(self.reviews[3].pk)])
+        self.assertIsNone(data['users'][str(outsider.pk)])
+        previews = data['courses'][str(course.pk)]['reviews']
+        self.assertNotIn(foreign.pk, [review['id'] for review in previews])
+
+    @override_settings(BATCH_MAX_IDS=2)
+    def test_too_many_ids(self):
+        response = self.batch(courses=[course.pk for course in self.courses[:3]])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('courses', response.json())
+        self.assertEqual(self.batch(reviews=[review.pk for review in self.reviews[:2]]).status_code, 200)
+
+    def test_cart_items_render_their_own_course(self):
+        cart = Cart.objects.open_for(self.student)
+        data = CartSerializer(cart, context={'request': None}).data
+        self.assertEqual([item['course']['id'] for item in data['items']],
+                         [course.pk for course in self.courses[:2]])
+        self.assertEqual([item['quantity'] for item in data['items']], [1, 1])
+
+
+class CategoryCountTests(TestCase):
+    def setUp(self):
+        self.instructor = CustomUser.objects.create_user('i@example.com', 'pw', username='i', name='I')
+        self.code = Category.objects.create(name='Code', slug='code')
+        self.web = Category.objects.create(name='Web', slug='web', parent=self.code)
+        self.django = Category.objects.create(name='Django', slug='django', parent=self.web)
+        self.art = Category.objects.create(name='Art', slug='art')
+        self.courses = [self.course(category) for category in (self.django, self.web, self.art, self.code)]
+        self.python = Tag.objects.create(name='Python', slug='python')
+        self.sql = Tag.objects.create(name='SQL', slug='sql')
+
+    def course(self, category):
+        return Course.objects.create(title=category.slug, instructor=self.instructor, price=1,
+                                     duration_in_hours=1, category=category)
+
+    def counts(self):
+        return {
+            'categories': set(Category.objects.values_list('pk', 'path', 'course_count')),
+            'courses': set(Course.objects.values_list('pk', 'category_path')),
+            'tags': set(Tag.objects.values_list('pk', 'course_count')),
+        }
+
+    def assert_matches_rebuild(self):
+        counts = self.counts()
+        call_command('rebuild_categories', stdout=StringIO())
+        self.assertEqual(counts, self.counts())
+
+    def course_count(self, category):
+        return Category.objects.get(pk=category.pk).course_count
+
+    def test_create_counts_the_whole_path(self):
+        self.assertEqual([self.course_count(c) for c in (self.code, self.web, self.django, self.art)], [3, 2, 1, 1])
+        self.assert_matches_rebuild()
+
+    def test_subtree_move(self):
+        self.web.parent = self.art
+        self.web.save()
+        self.assertEqual([self.course_count(c) for c in (self.code, self.web, self.django, self.art)], [1, 2, 1, 3])
+        self.assertEqual(Course.objects.get(pk=self.courses[0].pk).category_path,
+                         f'/{self.art.pk}/{self.web.pk}/{self.django.pk}/')
+        self.assert_matches_rebuild()
+
+        with self.assertRaises(ValueError):
+            self.art.parent = self.django
+            self.art.save()
+
+    def test_recategorize_course(self):
+        course = self.courses[0]
+        course.category = self.art
+        course.save()
+        self.assertEqual([self.course_count(c) for c in (self.code, self.web, self.django, self.art)], [2, 1, 0, 2])
+        self.assert_matches_rebuild()
+
+        course.category = None
+        course.save()
+        course.title = 'renamed'
+        course.save(update_fields=['title'])
+        self.assertEqual(self.course_count(self.art), 1)
+        self.assert_matches_rebuild()
+
+    def test_delete_course_with_tags(self):
+        course = self.courses[0]
+        course.tags.add(self.python, self.sql)
+        course.delete()
+        self.assertEqual([self.course_count(c) for c in (self.code, self.web, self.django)], [2, 1, 0])
+        self.assertEqual(set(Tag.objects.values_list('course_count', flat=True)), {0})
+        self.assert_matches_rebuild()
+
+    def test_tags_from_both_sides(self):
+        a, b, c, d = self.courses
+        a.tags.add(self.python, self.sql)
+        self.python.courses.add(a, b, c)
+        self.assert_matches_rebuild()
+
+        a.tags.remove(self.python, self.sql)
+        self.sql.courses.remove(a, d)
+        self.assert_matches_rebuild()
+
+        b.tags.set([self.sql])
+        self.python.courses.clear()
+        self.assert_matches_rebuild()
+        self.assertEqual(Tag.objects.get(pk=self.sql.pk).course_count, 1)
+
+        self.sql.courses.set([a, b, c, d])
+        b.tags.clear()
+        self.assertEqual(Tag.objects.get(pk=self.sql.pk).course_count, 3)
+        self.assert_matches_rebuild()
+
+    def test_delete_category(self):
+        self.django.delete()
+        course = Course.objects.get(pk=self.courses[0].pk)
+        self.assertEqual((course.category_id, course.category_path), (None, ''))
+        self.assertEqual([self.course_count(c) for c in (self.code, self.web)], [2, 1])
+        self.assert_matches_rebuild()
+
+    def test_filters(self):
+        a, b, c, d = self.courses
+        a.tags.add(self.python, self.sql)
+        b.tags.add(self.python)
+        client = APIClient()
+        client.force_authenticate(self.instructor)
+
+        def ids(**params):
+            return {course['id'] for course in client.get('/api/courses/', params).json()['results']}
+
+        self.assertEqual(ids(category=self.code.pk), {a.pk, b.pk, d.pk})
+        self.assertEqual(ids(category=self.web.pk), {a.pk, b.pk})
+        self.assertEqual(ids(category='999999'), set())
+        self.assertEqual(ids(category='abc'), set())
+        self.assertEqual(ids(tag='python'), {a.pk, b.pk})
+        self.assertEqual(ids(tag=['python', 'sql']), {a.pk})
+        self.assertEqual(ids(tag=['python', 'missing']), set())
+        self.assertEqual(ids(category=self.web.pk, tag='sql'), {a.pk})
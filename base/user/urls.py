@@ -13,6 +13,10 @@ router.register('instructor-profile', views.InstructorProfileViewSet)
 router.register('cart', views.CartViewSet)
 router.register('watch-list', views.WatchListViewSet)
 router.register('reviews', views.ReviewViewSet)
+router.register('courses', views.CourseViewSet)
+router.register('categories', views.CategoryViewSet)
+router.register('tags', views.TagViewSet)
+router.register('blog', views.BlogViewSet)
 
 userprofile_router = routers.NestedDefaultRouter(
     router, 'user-profile', lookup='user'
@@ -28,10 +32,19 @@ instructorprofile_router.register(
     'user', views.ProfileInstructorViewSet, basename='instructor-profile-user'
 )
 
+course_router = routers.NestedDefaultRouter(
+    router, 'courses', lookup='course'
+)
+course_router.register(
+    'reviews', views.CourseReviewViewSet, basename='course-reviews'
+)
+
 urlpatterns = [
     path('', include(router.urls)),
 
     path('login/', views.MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('login/async/', views.AsyncTokenObtainPairView.as_view(),
+         name='token_obtain_pair_async'),
     path('login/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
     path('', views.endpoints),
@@ -54,5 +67,19 @@ urlpatterns = [
 
     # -------------------------------------- Course -------------------------------------
 
-    path('courses/', views.CourseCreateListApiView.as_view()),
+    path('', include(course_router.urls)),
+
+    # -------------------------------------- Batch -------------------------------------
+
+    path('batch/', views.BatchView.as_view(), name='batch'),
+
+    # -------------------------------------- Changes -------------------------------------
+
+    path('changes/', views.ChangeStreamView.as_view(), name='changes'),
+
+    # -------------------------------------- Profiles -------------------------------------
+
+    path('profiles/', views.ProfileListView.as_view(), name='profiles'),
+    path('profiles/token/', views.ProfileTokenView.as_view(), name='profile-token'),
+    path('profiles/<int:pk>/', views.ProfileDownloadView.as_view(), name='profile'),
 ]
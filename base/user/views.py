@@ -1,14 +1,28 @@
+import asyncio
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models.functions import Substr
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.views import View
 from rest_framework.response import Response
 from rest_framework import generics
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.views import APIView
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.decorators import api_view
 from rest_framework.filters import SearchFilter
-from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.viewsets import GenericViewSet, ModelViewSet, ReadOnlyModelViewSet
 from rest_framework.mixins import CreateModelMixin, RetrieveModelMixin, DestroyModelMixin, ListModelMixin, UpdateModelMixin
 from rest_framework.decorators import action
 from rest_framework import status
@@ -16,7 +30,20 @@ from rest_framework.exceptions import APIException
 from rest_framework.pagination import PageNumberPagination
 
 
+from .batch import BatchQuery, BatchQuerySerializer
+from .cache import blog_cache_key, course_cache_key
+from .changes import read_changes
+from .checkout import CheckoutError, checkout_cart
+from .enrollments import owned_course_ids
+from .filters import CatalogFilter, DjangoFilterBackend
+from .fast_serializers import (
+    FastCartCourseSerializer, FastCourseRecommendationSerializer, FastInstructorSerializer,
+    FastReviewSerializer, FastUserSerializer)
+from . import leaderboard, profiling
+from .pagination import BlogPagination, ReviewPagination, relative_url
 from .permissions import *
+from .reviews import upsert_reviews
+from .throttling import EarlyThrottleMixin, ScopedSlidingWindowThrottle
 from user.models import *
 from .serializers import *
 
@@ -28,7 +55,7 @@ def endpoints(request):
     data = [
         '/user', '/user:<username>',
         '/instructor', '/instructor:<username>',
-        '/courses', '/courses:<title>',
+        '/courses', '/courses:<title>', '/courses/<id>/reviews',
         'reviews', 'reviews:<course>'
         '/blog', '/blog:<title>',
         '/carts', '/cartitems',
@@ -36,16 +63,73 @@ def endpoints(request):
     return Response(data)
 
 
-class MyTokenObtainPairView(TokenObtainPairView):
+class MyTokenObtainPairView(EarlyThrottleMixin, TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
+    throttle_scope = 'login'
+    throttle_by_ip = True
+
+
+# Password hashing is CPU bound; hashlib releases the GIL, so a pool sized to
+# the cores lets logins verify in parallel without blocking the event loop.
+_login_executor = ThreadPoolExecutor(
+    max_workers=os.cpu_count(), thread_name_prefix='login')
+
+
+def _validate_login(serializer):
+    close_old_connections()
+    try:
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+    finally:
+        close_old_connections()
+
+
+class AsyncTokenObtainPairView(View):
+    """Token endpoint for ASGI workers that hashes in an executor."""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    throttle_scope = 'login'
+    throttle_by_ip = True
+
+    async def post(self, request):
+        throttle = ScopedSlidingWindowThrottle()
+        if not throttle.allow_request(request, self):
+            response = JsonResponse({'detail': 'Request was throttled.'}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = int(throttle.wait()) + 1
+            return response
+
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'detail': 'Invalid JSON body.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = MyTokenObtainPairSerializer(
+            data=data, context={'request': request})
+        loop = asyncio.get_running_loop()
+        try:
+            tokens = await loop.run_in_executor(_login_executor, _validate_login, serializer)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+            return JsonResponse(detail, status=exc.status_code)
+        except TokenError as exc:
+            return JsonResponse({'detail': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+
+        return JsonResponse(tokens)
 
 # ------------------------------------- User ------------------------------
 
 
-class UserListCreateApiView(generics.ListCreateAPIView):
+class UserListCreateApiView(EarlyThrottleMixin, generics.ListCreateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
     pagination_class = PageNumberPagination
+    throttle_scope = 'signup'
+    throttle_methods = ['POST']
 
     filter_backends = [DjangoFilterBackend, SearchFilter]
     search_fields = {
@@ -59,8 +143,7 @@ class UserListCreateApiView(generics.ListCreateAPIView):
 
     def list(self, request, *args, **kwargs):
         users = CustomUser.objects.filter(is_student=True)
-        serializer = UserSerializer(
-            users, many=True, context={'request': request})
+        serializer = FastUserSerializer(users, context={'request': request})
         return Response(serializer.data)
 
 
@@ -93,10 +176,12 @@ class ProfileUserViewSet(ModelViewSet, CreateModelMixin, RetrieveModelMixin, Upd
 #  ------------------------------------------ Instructor ---------------------------
 
 
-class InstructorListCreateView(generics.ListCreateAPIView):
+class InstructorListCreateView(EarlyThrottleMixin, generics.ListCreateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = InstructorSerializer
     pagination_class = PageNumberPagination
+    throttle_scope = 'signup'
+    throttle_methods = ['POST']
 
     filter_backends = [DjangoFilterBackend, SearchFilter]
     search_fields = {
@@ -110,8 +195,7 @@ class InstructorListCreateView(generics.ListCreateAPIView):
 
     def list(self, request, *args, **kwargs):
         users = CustomUser.objects.filter(is_instructor=True)
-        serializer = InstructorSerializer(
-            users, many=True, context={'request': request})
+        serializer = FastInstructorSerializer(users, context={'request': request})
         return Response(serializer.data)
 
 
@@ -128,7 +212,7 @@ class InstructorRetrieveUpdateDestroyApiView(generics.RetrieveUpdateDestroyAPIVi
 
 
 class InstructorProfileViewSet(ModelViewSet, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, DestroyModelMixin,  ListModelMixin):
-    queryset = InstructorProfile.objects.all()
+    queryset = InstructorProfile.objects.select_related('user__stats')
     serializer_class = InstructorProfileSerializer
 
 
@@ -143,39 +227,180 @@ class ProfileInstructorViewSet(ModelViewSet, CreateModelMixin, RetrieveModelMixi
 #  ------------------------------------------ Course ---------------------------
 
 
-class CourseCreateListApiView(generics.ListCreateAPIView):
-    queryset = Course.objects.all()
+class CourseViewSet(GenericViewSet, ListModelMixin, CreateModelMixin, RetrieveModelMixin, UpdateModelMixin, DestroyModelMixin):
+    queryset = Course.objects.select_related('instructor').prefetch_related(latest_reviews_prefetch(), 'tags')
     serializer_class = CourseSerializer
     permission_classes = [IsAuthenticated, IsInstructor, IsStudent]
 
-    filter_backends = [DjangoFilterBackend, SearchFilter]
+    filter_backends = [DjangoFilterBackend, SearchFilter, CatalogFilter]
     search_fields = ['instructor__username', 'title']
 
+    def get_queryset(self):
+        if self.action == 'list':
+            return super().get_queryset()
+        # Detail pages embed their own review page, no preview prefetch.
+        return Course.objects.select_related('instructor__instructorprofile').prefetch_related('tags')
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return CourseDetailSerializer
+        return super().get_serializer_class()
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs['pk']
+        if not str(pk).isdigit():
+            raise NotFound("Course not found.")
+
+        # The cached payload is shared by every viewer; only the per-user
+        # 'owned' flag is added per request.
+        key = course_cache_key(pk)
+        cached = cache.get(key)
+        if cached is None:
+            data = dict(self.get_serializer(self.get_object()).data)
+            data.pop('owned')
+            body = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+            cached = {'etag': hashlib.md5(body.encode()).hexdigest(), 'data': data}
+            cache.set(key, cached, settings.COURSE_CACHE_SECONDS)
+
+        owned = int(pk) in owned_course_ids(request.user, [int(pk)])
+        etag = f'"{cached["etag"]}-{int(owned)}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        data = {**cached['data'], 'owned': owned}
+        if data['reviews']['next']:
+            data['reviews'] = {**data['reviews'], 'next': request.build_absolute_uri(data['reviews']['next'])}
+        return Response(data, headers={'ETag': etag})
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+        except ValueError:
+            limit = 10
+
+        # Trending is ranked overall and within each top-level category.
+        category = request.query_params.get('category')
+        if category and not (category.isdigit() and Category.objects.filter(
+                pk=category, parent__isnull=True).exists()):
+            return Response({"error": "category must be a top-level category id"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        ranked = leaderboard.current().top(limit, int(category) if category else None)
+        rows = FastCartCourseSerializer.values(
+            Course.objects.filter(pk__in=[course_id for course_id, _ in ranked]))
+        courses = {
+            course['id']: course
+            for course in FastCartCourseSerializer(rows, context={'request': request}).data
+        }
+        data = [
+            {
+                'rank': position,
+                'score': round(score, 4),
+                'course': courses[course_id],
+            }
+            for position, (course_id, score) in enumerate(ranked, start=1)
+            if course_id in courses
+        ]
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def rank(self, request, pk=None):
+        return Response({'rank': leaderboard.current().rank(int(pk)) if str(pk).isdigit() else None})
+
+    @action(detail=True, methods=['get'])
+    def recommendations(self, request, pk=None):
+        if not str(pk).isdigit():
+            return Response([])
+        # One indexed range scan on (course, rank) of the precomputed table.
+        try:
+            limit = int(request.query_params.get('limit', settings.RECOMMENDATIONS_TOP_K))
+        except ValueError:
+            limit = settings.RECOMMENDATIONS_TOP_K
+        limit = max(0, min(limit, settings.RECOMMENDATIONS_TOP_K))
+        rows = FastCourseRecommendationSerializer.values(
+            CourseRecommendation.objects.filter(course_id=pk))[:limit]
+        return Response(FastCourseRecommendationSerializer(rows, context={'request': request}).data)
+
     def perform_create(self, serializer):
         user = self.request.user
-        if user.groups.filter(name='Instructor').exists():
-            # Handle instructor's action
-            serializer.save(instructor=user)
-        elif user.groups.filter(name='Student').exists():
-            # Handle student's action
-            # Give an error message to students
+        if not user.groups.filter(name='Instructor').exists():
             raise PermissionDenied("You are not allowed to create courses.")
 
-        return super().perform_create(serializer)
+        serializer.save(instructor=user)
+
+    def perform_update(self, serializer):
+        self.check_owner(serializer.instance)
+        serializer.save(updated_at=timezone.now())
+
+    def perform_destroy(self, instance):
+        self.check_owner(instance)
+        instance.delete()
+
+    def check_owner(self, course):
+        user = self.request.user
+        if course.instructor_id != user.pk and not user.is_staff:
+            raise PermissionDenied("Only the course instructor can change this course.")
+
+
+class CourseReviewViewSet(GenericViewSet, ListModelMixin):
+    """Reviews of one course, keyset paginated; ``?ordering=`` picks the sort."""
+    serializer_class = ReviewSerializer
+    pagination_class = ReviewPagination
+
+    def get_queryset(self):
+        course_pk = self.kwargs['course_pk']
+        if not str(course_pk).isdigit() or not Course.objects.filter(pk=course_pk).exists():
+            raise NotFound("Course not found.")
+        return Review.objects.filter(course_id=course_pk)
+
+    def list(self, request, *args, **kwargs):
+        # values() rows need the ordering columns for the keyset cursor.
+        page = self.paginate_queryset(
+            FastReviewSerializer.values(self.get_queryset(), 'created_at'))
+        return self.get_paginated_response(
+            FastReviewSerializer(page, context=self.get_serializer_context()).data)
+
+
+class CategoryViewSet(ReadOnlyModelViewSet):
+    """The category tree with subtree course counts; ``?parent=<id>|root``."""
+    queryset = Category.objects.all()
+    serializer_class = CategorySerializer
+    pagination_class = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        parent = self.request.query_params.get('parent')
+        if parent == 'root':
+            queryset = queryset.filter(parent__isnull=True)
+        elif parent:
+            queryset = queryset.filter(parent_id=parent) if parent.isdigit() else queryset.none()
+        return queryset
+
+
+class TagViewSet(ReadOnlyModelViewSet):
+    queryset = Tag.objects.order_by('-course_count', 'slug')
+    serializer_class = TagSerializer
+
 
 #  ------------------------------------------ Cart ---------------------------
 
 
-class CartViewSet(ModelViewSet, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin):
+class CartViewSet(EarlyThrottleMixin, ModelViewSet, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin):
     queryset = Cart.objects.all()
     serializer_class = CartSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_throttles(self):
+        if self.action in ('add_item', 'remove_item'):
+            self.throttle_scope = 'cart'
+        return super().get_throttles()
+
     # Use detail=False for actions not tied to a specific cart
     @action(detail=False, methods=['post'])
     def add_item(self, request):
         user = request.user
-        cart, created = Cart.objects.get_or_create(user=user, completed=False)
+        cart = Cart.objects.open_or_create_for(user)
 
         course_id = request.data.get('course_id')
 
@@ -187,6 +412,7 @@ class CartViewSet(ModelViewSet, CreateModelMixin, RetrieveModelMixin, DestroyMod
                 raise APIException("Course is already in the cart")
 
             Cartitems.objects.create(cart=cart, course=course)
+            cart.save(update_fields=['updated'])
 
             return Response({"detail": "Item added to cart"}, status=status.HTTP_201_CREATED)
         else:
@@ -196,20 +422,37 @@ class CartViewSet(ModelViewSet, CreateModelMixin, RetrieveModelMixin, DestroyMod
     @action(detail=False, methods=['delete'])
     def remove_item(self, request):
         user = request.user  # Get the authenticated user
-        cart = Cart.objects.filter(user=user, completed=False).first()
+        cart = Cart.objects.open_for(user)
 
         course_id = request.data.get('course_id')
 
         if cart and course_id:
             try:
-                item = Cartitems.objects.get(cart=cart, course_id=course_id)
+                # Through the cart so item.cart is set for the delete receivers.
+                item = cart.items.get(course_id=course_id)
                 item.delete()
+                cart.save(update_fields=['updated'])
                 return Response({"detail": "Item removed from cart"}, status=status.HTTP_204_NO_CONTENT)
             except Cartitems.DoesNotExist:
                 return Response({"error": "Item not found in cart"}, status=status.HTTP_404_NOT_FOUND)
         else:
             return Response({"error": "Invalid request data"}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        key = request.headers.get('Idempotency-Key') or request.data.get('idempotency_key')
+        if not key:
+            return Response({"error": "An Idempotency-Key header is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            order, created = checkout_cart(request.user, key)
+        except CheckoutError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            OrderSerializer(order, context={'request': request}).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
 
 # ------------------------------------------------------ WatchList ------------------------------------
 class WatchListViewSet(ModelViewSet, CreateModelMixin, RetrieveModelMixin, DestroyModelMixin):
@@ -246,8 +489,7 @@ class WatchListViewSet(ModelViewSet, CreateModelMixin, RetrieveModelMixin, Destr
 
         if watchlist and course_id:
             try:
-                item = Watchitems.objects.get(
-                    watchlist=watchlist, course_id=course_id)
+                item = watchlist.watchitems_set.get(course_id=course_id)
                 item.delete()
                 return Response({"detail": "Item removed from Watchlist"}, status=status.HTTP_204_NO_CONTENT)
             except Watchitems.DoesNotExist:
@@ -263,15 +505,161 @@ class ReviewViewSet(ModelViewSet, CreateModelMixin, RetrieveModelMixin, DestroyM
     permission_classes = [IsAuthenticated]
 
     def create(self, request, *args, **kwargs):
-        user = request.user
-        course_id = request.data.get('course_id')
-        rating = request.data.get('rating')
-        comment = request.data.get('comment')
+        serializer = ReviewWriteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data.get('user_id') and not request.user.is_staff:
+            raise PermissionDenied("Only staff can post reviews for other users.")
 
-        if course_id:
-            course = Course.objects.get(pk=course_id)
-            Review.objects.create(user=user, course=course,
-                                  rating=rating, comment=comment)
+        created, updated = upsert_reviews(request.user, [serializer.validated_data])
+        if created:
             return Response({"detail": "Review added"}, status=status.HTTP_201_CREATED)
-        else:
-            return Response({"error": "course_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"detail": "Review updated"}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        serializer = ReviewWriteSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        if not request.user.is_staff and any(row.get('user_id') for row in serializer.validated_data):
+            raise PermissionDenied("Only staff can post reviews for other users.")
+
+        created, updated = upsert_reviews(request.user, serializer.validated_data)
+        return Response({"created": created, "updated": updated},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+# ------------------------------------------------ Blog -----------------------------------------------------
+class BlogViewSet(ModelViewSet):
+    queryset = Blog.objects.select_related('author')
+    serializer_class = BlogSerializer
+    pagination_class = BlogPagination
+    permission_classes = [IsAuthenticatedOrReadOnly]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # The feed only needs an excerpt, cut by the database.
+            queryset = queryset.defer('content').annotate(
+                excerpt=Substr('content', 1, settings.BLOG_EXCERPT_LENGTH))
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return BlogListSerializer
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        key = blog_cache_key('list', request.get_full_path())
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            # Cached host-relative; made absolute for each request below.
+            if data['next']:
+                data = {**data, 'next': relative_url(data['next'])}
+            cache.set(key, data, settings.BLOG_CACHE_SECONDS)
+        if data['next']:
+            data = {**data, 'next': request.build_absolute_uri(data['next'])}
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        key = blog_cache_key('detail', kwargs['pk'])
+        data = cache.get(key)
+        if data is None:
+            data = super().retrieve(request, *args, **kwargs).data
+            cache.set(key, data, settings.BLOG_CACHE_SECONDS)
+        return Response(data)
+
+    def perform_create(self, serializer):
+        serializer.save(author=self.request.user)
+
+    def perform_update(self, serializer):
+        self.check_author(serializer.instance)
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        self.check_author(instance)
+        instance.delete()
+
+    def check_author(self, blog):
+        user = self.request.user
+        if blog.author_id != user.pk and not user.is_staff:
+            raise PermissionDenied("Only the author can change this post.")
+
+
+# ------------------------------------------------ Changes -----------------------------------------------------
+class ChangeStreamView(APIView):
+    """Tail the change outbox: ``?after=<last position seen>&limit=&model=course,review``.
+
+    Pass the returned ``after`` back to continue. Superusers read every
+    tenant's events, other staff only their own tenant's.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = int(request.query_params.get('limit', 0)) or None
+        except ValueError:
+            raise ValidationError({"after": "after and limit must be integers."})
+        models = [name for name in request.query_params.get('model', '').split(',') if name]
+        tenant_id = None if request.user.is_superuser else request.user.tenant_id
+
+        events = read_changes(after, limit, models, tenant_id)
+        return Response({
+            "results": events,
+            "after": events[-1]['position'] if events else after,
+        })
+
+
+# ------------------------------------------------ Profiles -----------------------------------------------------
+class ProfileListView(APIView):
+    """The most recent request profiles, newest first; see user/profiling.py."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "enabled": settings.PROFILING_ENABLED,
+            "results": profiling.recent(),
+        })
+
+
+class ProfileTokenView(APIView):
+    """Issue an ``X-Profile`` header value: ``{"engine": "cprofile"}``."""
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        engine = request.data.get('engine', 'cprofile')
+        if engine not in profiling.available_engines():
+            raise ValidationError({"engine": f"Choose one of {', '.join(profiling.available_engines())}."})
+        return Response({
+            "header": "X-Profile",
+            "token": profiling.make_token(engine),
+            "expires_in": settings.PROFILE_TOKEN_MAX_AGE,
+        })
+
+
+class ProfileDownloadView(APIView):
+    """Download a profile, or read its text summary with ``?summary=1``."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        entry = profiling.get(pk)
+        if entry is None:
+            raise NotFound("No such profile; only the most recent are kept.")
+        if request.query_params.get('summary'):
+            return HttpResponse(entry['summary'], content_type='text/plain; charset=utf-8')
+
+        engine = profiling.ENGINES[entry['engine']]
+        response = HttpResponse(entry['data'], content_type=engine.content_type)
+        response['Content-Disposition'] = f'attachment; filename="profile-{pk}.{engine.extension}"'
+        return response
+
+
+# ------------------------------------------------ Batch -----------------------------------------------------
+class BatchView(APIView):
+    """Several resources in one round trip; see user/batch.py."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = BatchQuerySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(BatchQuery(request).execute(serializer.validated_data))
@@ -0,0 +1,117 @@
+"""
+``/ws/sync/``: a WebSocket that streams the user's cart and watchlist deltas.
+
+Authentication uses the same JWT access tokens as the API. Browsers cannot
+set headers on a WebSocket, so the token is offered as a subprotocol
+(``new WebSocket(url, ['jwt', token])``); other clients may send the usual
+``Authorization: JWT <token>`` header. Tokens are not read from the query
+string, which ends up in access logs. The socket is closed with code 4401
+when the token is missing or invalid, and again when it expires, and the
+client reconnects with a refreshed token.
+
+Clients should connect before loading the cart and watchlist over HTTP so
+no delta falls between the two. Messages from the client are ignored.
+"""
+
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .identity import _jwt
+from .models import CustomUser
+from .realtime import get_broker
+
+SYNC_PATH = '/ws/sync/'
+SUBPROTOCOL = 'jwt'
+
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+
+
+def raw_token(scope):
+    subprotocols = scope.get('subprotocols') or []
+    if len(subprotocols) == 2 and subprotocols[0] == SUBPROTOCOL:
+        return subprotocols[1]
+
+    for name, value in scope.get('headers', ()):
+        if name == b'authorization':
+            return _jwt.get_raw_token(value)
+    return None
+
+
+def authenticate(scope):
+    """Return the token's claims for an active user, or None."""
+    token = raw_token(scope)
+    if not token:
+        return None
+    try:
+        claims = _jwt.get_validated_token(token)
+    except (InvalidToken, TokenError):
+        return None
+
+    close_old_connections()
+    try:
+        user_id = claims[api_settings.USER_ID_CLAIM]
+        if not CustomUser.all_tenants.filter(pk=user_id, is_active=True).exists():
+            return None
+    finally:
+        close_old_connections()
+    return claims
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'websocket.disconnect':
+        pass
+
+
+async def sync_socket(scope, receive, send):
+    if (await receive())['type'] != 'websocket.connect':
+        return
+
+    claims = await sync_to_async(authenticate)(scope)
+    if claims is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+
+    accept = {'type': 'websocket.accept'}
+    if SUBPROTOCOL in (scope.get('subprotocols') or []):
+        accept['subprotocol'] = SUBPROTOCOL
+    await send(accept)
+
+    broker = get_broker()
+    subscription = broker.subscribe(claims[api_settings.USER_ID_CLAIM])
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        while True:
+            message = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait(
+                {disconnected, message}, timeout=max(claims['exp'] - time.time(), 0),
+                return_when=asyncio.FIRST_COMPLETED)
+            if message in done:
+                await send({'type': 'websocket.send', 'text': message.result()})
+                continue
+            message.cancel()
+            if not done:
+                await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+            return
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+def with_websockets(http_application):
+    """Serve ``/ws/sync/`` next to Django's ASGI application."""
+
+    async def application(scope, receive, send):
+        if scope['type'] != 'websocket':
+            return await http_application(scope, receive, send)
+        if scope['path'] == SYNC_PATH:
+            return await sync_socket(scope, receive, send)
+        await receive()
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+
+    return application